@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Compare the ways of converting a `ps.xls` export to an AMC CSV file
+
+Usage:
+
+    $ python benchmarks/bench_amc.py [STUDENTS]
+
+Generates a synthetic export (50,000 students by default) and converts
+it through vCards with `VcardAmcCsvWriter`, as `psxls2amc` used to, and
+straight from the parsed rows with `AmcCsvWriter`.  Parsing and writing
+are timed separately.
+"""
+
+import io
+import os
+import sys
+from tempfile import TemporaryDirectory
+import time
+
+from ps2vcard.parsers.html import AlbertRosterXlsParser
+from ps2vcard.synthetic import make_students, write_xls_roster
+from ps2vcard.writers import AmcCsvWriter, VcardAmcCsvWriter
+
+
+def through_vcards(path):
+    start = time.perf_counter()
+    (course, cards) = AlbertRosterXlsParser().parse(path)
+    parsed = time.perf_counter()
+    output = io.StringIO()
+    VcardAmcCsvWriter(output).write(cards)
+    return parsed - start, time.perf_counter() - parsed, output.getvalue()
+
+
+def from_records(path):
+    start = time.perf_counter()
+    (course, rows) = AlbertRosterXlsParser().parse_records(path)
+    parsed = time.perf_counter()
+    output = io.StringIO()
+    AmcCsvWriter(output).write(rows)
+    return parsed - start, time.perf_counter() - parsed, output.getvalue()
+
+
+def main(count=50000):
+    with TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, "ps.xls")
+        write_xls_roster(path, make_students(count))
+        print("%d students, %d bytes" % (count, os.path.getsize(path)))
+        results = {}
+        for (name, convert) in [("vcards", through_vcards), ("records", from_records)]:
+            (parsing, writing, output) = convert(path)
+            results[name] = output
+            total = parsing + writing
+            print(
+                "%-8s parse %7.3f s  write %7.3f s  total %7.3f s  %8.0f rows/s"
+                % (name, parsing, writing, total, count / total)
+            )
+        assert results["vcards"] == results["records"], "outputs differ"
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Compare the ways of loading a roster's students into a table
+
+Usage:
+
+    $ python benchmarks/bench_frames.py [STUDENTS]
+
+Generates a synthetic `ps.xls` export (20,000 students by default) and
+saves its vCards, one file per student.  Then it builds the same table
+four ways, and reports the time of each:
+
+* by reading the `.vcf` files back with vobject, one by one;
+* from the export, with `to_frame()`;
+* from a Parquet file written by `write_frame`;
+* from a Feather file written by `write_frame`.
+
+Needs pandas and pyarrow.
+"""
+
+import glob
+import os
+import sys
+from tempfile import TemporaryDirectory
+import time
+
+import pandas
+import vobject
+
+from ps2vcard.frames import read_frame, write_frame
+from ps2vcard.parsers.html import AlbertRosterXlsParser
+from ps2vcard.synthetic import make_students, write_xls_roster
+from ps2vcard.writers import VcardWriter
+
+
+def from_vcards(dirname):
+    rows = []
+    for path in sorted(glob.glob(os.path.join(dirname, "*.vcf"))):
+        with open(path) as f:
+            card = vobject.readOne(f.read())
+        rows.append(
+            {
+                "nnumber": card.x_nyu_nnumber.value,
+                "family_name": card.n.value.family,
+                "given_names": card.n.value.given,
+                "email": card.email.value,
+                "program": card.org.value[1],
+            }
+        )
+    return pandas.DataFrame(rows)
+
+
+def main(count=20000):
+    with TemporaryDirectory() as tempdir:
+        path = write_xls_roster(os.path.join(tempdir, "ps.xls"), make_students(count))
+        parser = AlbertRosterXlsParser()
+        vcard_dir = os.path.join(tempdir, "vcards")
+        with VcardWriter(vcard_dir) as writer:
+            for card in parser.iter_students(path):
+                writer.write(card, card.x_nyu_nnumber.value + ".vcf")
+        frame = parser.to_frame(path)
+        for name in ["roster.parquet", "roster.feather"]:
+            write_frame(frame, os.path.join(tempdir, name))
+        print("%d students" % count)
+        for (name, load) in [
+            ("vcf files", lambda: from_vcards(vcard_dir)),
+            ("to_frame", lambda: AlbertRosterXlsParser().to_frame(path)),
+            (
+                "parquet",
+                lambda: read_frame(os.path.join(tempdir, "roster.parquet")),
+            ),
+            (
+                "feather",
+                lambda: read_frame(os.path.join(tempdir, "roster.feather")),
+            ),
+        ]:
+            start = time.perf_counter()
+            loaded = load()
+            elapsed = time.perf_counter() - start
+            assert list(loaded["nnumber"]) == list(frame["nnumber"]), name
+            print("%-10s %9.3f s  %10.0f students/s" % (name, elapsed, count / elapsed))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Compare the state machine engines of `AlbertRosterHtmlParser`
+
+Usage:
+
+    $ python benchmarks/bench_fsm.py [STUDENTS]
+
+Generates a synthetic roster (5,000 students by default), tokenizes it
+with each engine and reports the time taken.
+"""
+
+import os
+import sys
+from tempfile import TemporaryDirectory
+import time
+
+from ps2vcard.parsers.html import AlbertRosterHtmlParser
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+def time_engine(engine, data, base_dir):
+    parser = AlbertRosterHtmlParser(engine=engine)
+    parser.base_dir = base_dir
+    start = time.perf_counter()
+    parser.feed(data)
+    parser.close()
+    return time.perf_counter() - start, parser.student_records
+
+
+def main(count=5000):
+    with TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, "Access Class Rosters.html")
+        write_html_roster(path, make_students(count), photo_size=0)
+        with open(path) as f:
+            data = f.read()
+        print("%d students, %d bytes" % (count, len(data)))
+        results = {}
+        for engine in AlbertRosterHtmlParser.engines:
+            elapsed, records = time_engine(engine, data, tempdir)
+            results[engine] = records
+            print("%-8s %8.3f s  %10.0f students/s" % (engine, elapsed, count / elapsed))
+        assert results["table"] == results["machine"], "engines disagree"
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
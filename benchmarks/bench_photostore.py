@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Compare embedding photos with embedding them from a photo store, and with
+referring to them by URI
+
+Usage:
+
+    $ python benchmarks/bench_photostore.py [TERMS] [STUDENTS]
+
+Writes an archive of roster pages, one per term (4 by default), each with
+the same 200 students and a photo of about 20 kB for each, and converts it
+with `ps2vcard.batch.run_batch` in each photo mode, with the prescan on.
+Reports the time of each conversion, the time spent on the cards once
+parsed (storing and encoding photos, serializing and writing), and the
+bytes of vCards written.  The photo store is used twice: the first run fills it, and the
+second finds every photo and its encoding there.
+"""
+
+from glob import glob
+import os
+import sys
+from tempfile import TemporaryDirectory
+import time
+
+from ps2vcard import timings
+from ps2vcard.batch import find_rosters, run_batch
+from ps2vcard.synthetic import make_photo, make_students, write_html_roster
+
+
+def write_archive(dirname, terms, count):
+    students = make_students(count)
+    photo = make_photo(20000)
+    for term in range(terms):
+        path = os.path.join(dirname, "term%d" % term, "roster.html")
+        os.makedirs(os.path.dirname(path))
+        write_html_roster(path, students, photo_size=0)
+        # a photo of each student's own, the same every term
+        for (index, student) in enumerate(students):
+            filename = os.path.join(
+                os.path.dirname(path), "roster_files", "photo%d.jpg" % index
+            )
+            with open(filename, "wb") as f:
+                f.write(photo + student["id"].encode())
+
+
+# the stages after parsing
+CARD_STAGES = ["build", "photo store", "photos", "serialize", "write"]
+
+
+def convert(archive, outdir, mode, store):
+    with timings.collecting() as collector:
+        start = time.perf_counter()
+        results = run_batch(
+            find_rosters([archive]), outdir, prescan=True, photo_mode=mode,
+            photo_store=store,
+        )
+        elapsed = time.perf_counter() - start
+    assert all(result.error is None for result in results)
+    stages = collector.as_dict()["stages"]
+    cards = sum(stages.get(name, {}).get("seconds", 0.0) for name in CARD_STAGES)
+    size = sum(
+        os.path.getsize(path)
+        for path in glob(os.path.join(outdir, "**", "*.vcf"), recursive=True)
+    )
+    return (elapsed, cards, size)
+
+
+def main(terms=4, count=200):
+    with TemporaryDirectory() as tempdir:
+        archive = os.path.join(tempdir, "archive")
+        write_archive(archive, terms, count)
+        store = os.path.join(tempdir, "store")
+        print("%d terms of %d students" % (terms, count))
+        runs = [
+            ("embed", "embed", None),
+            ("embed, store (cold)", "embed", store),
+            ("embed, store (warm)", "embed", store),
+            ("uri", "uri", store),
+            ("none", "none", None),
+        ]
+        for (number, (label, mode, store_dir)) in enumerate(runs):
+            outdir = os.path.join(tempdir, "out%d" % number)
+            (elapsed, cards, size) = convert(archive, outdir, mode, store_dir)
+            print(
+                "  %-20s %7.3f s  cards %7.3f s  %10d bytes"
+                % (label, elapsed, cards, size)
+            )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
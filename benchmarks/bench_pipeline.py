@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Compare converting a roster one card at a time with the pipeline
+
+Usage:
+
+    $ python benchmarks/bench_pipeline.py [STUDENTS [LATENCY_MS]]
+
+Generates a synthetic roster page with photos (2,000 students by
+default) and saves its vCards with 1, 2, 4 and 8 jobs, first on the local
+disk, then with every photo read and card write delayed by LATENCY_MS
+milliseconds (5 by default), as on a network file system.  Reports the
+wall time of each run, and the time of each stage run one after the other,
+which is what the pipeline overlaps.  With more than one job, the stages
+add up to more than the wall time, and include the time spent waiting for
+the interpreter lock.
+"""
+
+import os
+import sys
+from tempfile import TemporaryDirectory
+import time
+
+from ps2vcard import photos, timings, writers
+from ps2vcard.parsers.html import AlbertRosterHtmlParser
+from ps2vcard.pipeline import CardPipeline
+from ps2vcard.synthetic import make_students, write_html_roster
+from ps2vcard.writers import VcardWriter
+
+
+def delayed(function, latency, stage):
+    def wrapper(*args, **kwargs):
+        with timings.stage(stage):
+            time.sleep(latency)
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def convert(roster_path, outdir, jobs):
+    parser = AlbertRosterHtmlParser()
+    records = parser.iter_students(roster_path, vcards=False)
+    with timings.collecting() as collector:
+        start = time.perf_counter()
+        with VcardWriter(outdir) as writer:
+            pipeline = CardPipeline(
+                lambda student: parser.student_to_vcard(student, parser.course_data),
+                writer=writer,
+                jobs=jobs,
+            )
+            count = sum(1 for card in pipeline.run(records))
+        elapsed = time.perf_counter() - start
+    stages = {
+        name: totals["seconds"]
+        for (name, totals) in collector.as_dict()["stages"].items()
+    }
+    return count, elapsed, stages
+
+
+def main(count=2000, latency_ms=5):
+    with TemporaryDirectory() as tempdir:
+        roster_path = write_html_roster(
+            os.path.join(tempdir, "roster.html"), make_students(count), photo_size=4000
+        )
+        print("%d students, %g ms latency on photo reads and card writes"
+              % (count, latency_ms))  # fmt: skip
+        for latency in [0, latency_ms / 1000]:
+            read = photos.LazyPhoto.read
+            write_atomic = writers.VcardWriter.write_atomic
+            if latency:
+                photos.LazyPhoto.read = delayed(read, latency, "photos")
+                writers.VcardWriter.write_atomic = delayed(
+                    write_atomic, latency, "write"
+                )
+            try:
+                for jobs in [1, 2, 4, 8]:
+                    outdir = os.path.join(tempdir, "out-%g-%d" % (latency, jobs))
+                    (converted, elapsed, stages) = convert(roster_path, outdir, jobs)
+                    assert converted == count
+                    print(
+                        "latency %4g ms  jobs %d  wall %7.3f s  [%s]"
+                        % (latency * 1000, jobs, elapsed, "  ".join(
+                            "%s %.2f" % item for item in stages.items()))
+                    )  # fmt: skip
+            finally:
+                photos.LazyPhoto.read = read
+                writers.VcardWriter.write_atomic = write_atomic
+
+
+if __name__ == "__main__":
+    main(*(float(arg) if i else int(arg) for (i, arg) in enumerate(sys.argv[1:])))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Compare parsing a roster page in full with parsing its prescanned regions
+
+Usage:
+
+    $ python benchmarks/bench_prescan.py [STUDENTS]
+
+Parses the saved roster page of the test data and a synthetic roster page
+(5,000 students by default) with and without the prescan of
+`ps2vcard.parsers.prescan`, and reports the best of five runs of each,
+with the share of the page left to tokenize.
+"""
+
+import os
+import sys
+from tempfile import TemporaryDirectory
+import time
+
+from ps2vcard.parsers.html import AlbertRosterHtmlParser
+from ps2vcard.parsers.prescan import key_regions
+from ps2vcard.synthetic import make_students, write_html_roster
+
+FIXTURE = os.path.join(
+    os.path.dirname(__file__), "..", "tests", "data", "Faculty Center_files",
+    "SA_LEARNING_MANAGEMENT.SS_FACULTY.html",
+)  # fmt: skip
+
+
+def time_parse(path, prescan, repeat=5):
+    best = None
+    for _ in range(repeat):
+        parser = AlbertRosterHtmlParser(prescan=prescan)
+        start = time.perf_counter()
+        (course, students) = parser.parse_records(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, (dict(course), [dict(student) for student in students])
+
+
+def compare(label, path):
+    with open(path, "rb") as f:
+        page = f.read()
+    parser = AlbertRosterHtmlParser()
+    regions = key_regions(page, parser.key_markers(), parser.key_kind)
+    kept = sum(end - start for (start, end) in regions)
+    print(
+        "%s: %d bytes, %.1f%% in key regions"
+        % (label, len(page), 100 * kept / len(page))
+    )
+    (full, expected) = time_parse(path, False)
+    (prescanned, records) = time_parse(path, True)
+    assert records == expected, "prescan disagrees with the full parse"
+    print("  full     %8.4f s" % full)
+    print("  prescan  %8.4f s  (%.1fx)" % (prescanned, full / prescanned))
+
+
+def main(count=5000):
+    compare("test data", FIXTURE)
+    with TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, "Access Class Rosters.html")
+        write_html_roster(path, make_students(count), photo_size=0)
+        compare("%d students" % count, path)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
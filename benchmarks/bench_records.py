@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Measure the memory and build time of student records
+
+Usage:
+
+    $ python benchmarks/bench_records.py [STUDENTS]
+
+Generates a synthetic roster page and `ps.xls` export (10,000 students by
+default).  For each, reports the bytes per student of the parsed record
+dictionaries and of the same students as `StudentRecord`, and the time
+per student to build the cards from each.
+"""
+
+import gc
+import os
+import sys
+from tempfile import TemporaryDirectory
+import time
+import tracemalloc
+
+from ps2vcard.parsers import unpack_progplan
+from ps2vcard.parsers.html import AlbertRosterHtmlParser, AlbertRosterXlsParser
+from ps2vcard.records import student_card
+from ps2vcard.synthetic import make_students, write_html_roster, write_xls_roster
+
+
+def traced(function, *args):
+    """Return the result of `function(*args)` and the bytes it still holds."""
+    gc.collect()
+    tracemalloc.start()
+    result = function(*args)
+    gc.collect()
+    (size, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def timed(function, items):
+    start = time.perf_counter()
+    output = [function(item) for item in items]
+    return time.perf_counter() - start, output
+
+
+def main(count=10000):
+    with TemporaryDirectory() as tempdir:
+        students = make_students(count)
+        html_path = write_html_roster(
+            os.path.join(tempdir, "Access Class Rosters.html"), students, photo_size=0
+        )
+        xls_path = write_xls_roster(os.path.join(tempdir, "ps.xls"), students)
+        print("%d students" % count)
+        for (parser_class, path) in [
+            (AlbertRosterHtmlParser, html_path),
+            (AlbertRosterXlsParser, xls_path),
+        ]:
+            ((course, dicts), dict_bytes) = traced(
+                lambda: parser_class().parse_records(path)
+            )
+            ((course, records), record_bytes) = traced(
+                lambda: parser_class().parse_students(path)
+            )
+            parser = parser_class()
+            (from_dicts, dict_cards) = timed(
+                lambda student: parser.student_to_vcard(student, course), dicts
+            )
+            (from_records, record_cards) = timed(student_card, records)
+            print(
+                "%-22s dicts %5.0f B  records %5.0f B  "
+                "build from dicts %6.1f us  from records %6.1f us"
+                % (
+                    parser_class.__name__,
+                    dict_bytes / count,
+                    record_bytes / count,
+                    from_dicts / count * 1e6,
+                    from_records / count * 1e6,
+                )
+            )
+            assert [card.serialize() for card in dict_cards] == [
+                card.serialize() for card in record_cards
+            ], "cards differ"
+        print("progplan splits: %s" % (unpack_progplan.cache_info(),))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Compare `serialize_vcard` with vobject's `card.serialize()`
+
+Usage:
+
+    $ python benchmarks/bench_serialize.py [STUDENTS] [PHOTO_BYTES]
+
+Builds the cards of a synthetic roster (2,000 students with 20 kB photos
+by default), serializes them with each serializer and reports the cards
+per second.
+"""
+
+import os
+import sys
+from tempfile import TemporaryDirectory
+import time
+
+from ps2vcard.parsers.html import AlbertRosterHtmlParser
+from ps2vcard.serializer import serialize_vcard
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+def time_serializer(serialize, cards):
+    start = time.perf_counter()
+    output = [serialize(card) for card in cards]
+    return time.perf_counter() - start, output
+
+
+def main(count=2000, photo_size=20000):
+    with TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, "Access Class Rosters.html")
+        write_html_roster(path, make_students(count), photo_size=photo_size)
+        (course, cards) = AlbertRosterHtmlParser().parse(path)
+        print("%d cards, photos of %d bytes" % (count, photo_size))
+        results = {}
+        for (name, serialize) in [
+            ("vobject", lambda card: card.serialize()),
+            ("fast", serialize_vcard),
+        ]:
+            elapsed, output = time_serializer(serialize, cards)
+            results[name] = output
+            print("%-8s %8.3f s  %10.0f cards/s" % (name, elapsed, count / elapsed))
+        assert results["fast"] == results["vobject"], "serializers disagree"
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Compare converting uploads with `ps2vcard serve` and with a process each
+
+Usage:
+
+    $ python benchmarks/bench_serve.py [UPLOADS] [STUDENTS]
+
+Converts a synthetic `ps.xls` export and roster page (40 students by
+default) 20 times each: by running `ps2vcard auto` and `psxls2amc` for
+each one, the way a tool that shells out would, and by posting them to a
+`ConversionServer` on the loopback interface.  Reports the mean time per
+upload of each, and the latencies of the server's metrics.
+"""
+
+import json
+import os
+from subprocess import DEVNULL, check_call
+import sys
+from tempfile import TemporaryDirectory
+import threading
+import time
+import urllib.request
+
+from ps2vcard.serve import ConversionServer
+from ps2vcard.synthetic import make_students, write_roster
+
+
+def post(url, data):
+    with urllib.request.urlopen(urllib.request.Request(url, data=data)) as response:
+        return response.read()
+
+
+def main(uploads=20, count=40):
+    with TemporaryDirectory() as tempdir:
+        students = make_students(count)
+        page = os.path.join(tempdir, "roster.html")
+        xls = os.path.join(tempdir, "ps.xls")
+        write_roster("html", page, students)
+        write_roster("xls", xls, students)
+        commands = [
+            ["ps2vcard", "auto", page, "--no-print", "--no-cache", "--bundle",
+             os.path.join(tempdir, "bundle.vcf")],
+            ["psxls2amc", xls, "--no-cache", "--output",
+             os.path.join(tempdir, "amc.csv")],
+        ]  # fmt: skip
+        start = time.perf_counter()
+        for _ in range(uploads):
+            for command in commands:
+                check_call(command, stdout=DEVNULL)
+        processes = (time.perf_counter() - start) / (2 * uploads)
+        with open(page, "rb") as f:
+            page_data = f.read()
+        with open(xls, "rb") as f:
+            xls_data = f.read()
+        server = ConversionServer(("127.0.0.1", 0), workers=2)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            start = time.perf_counter()
+            for _ in range(uploads):
+                post(server.url + "convert", page_data)
+                post(server.url + "convert?format=amc", xls_data)
+            served = (time.perf_counter() - start) / (2 * uploads)
+            metrics = json.loads(post(server.url + "metrics", None))
+        finally:
+            server.shutdown()
+            thread.join()
+            server.server_close()
+    print("%d uploads of %d students" % (2 * uploads, count))
+    print("  a process each  %8.4f s per upload" % processes)
+    print(
+        "  server          %8.4f s per upload  (%.1fx)"
+        % (served, processes / served)
+    )
+    print("  server latency  %s" % json.dumps(metrics["latency"]))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Time the import of `ps2vcard.cli`, which every command pays for
+
+Usage:
+
+    $ python benchmarks/bench_startup.py [RUNS]
+
+Imports `ps2vcard.cli` in a fresh interpreter with `python -X importtime`
+(five times by default) and reports the best cumulative import time of
+the module, of click, and of the module beyond click, against a budget of
+50 ms.  The modules the commands import for themselves (the parsers,
+vobject, the parse cache, the photo store...) should not show up here.
+"""
+
+from subprocess import PIPE, run
+import sys
+
+# time to import `ps2vcard.cli`, beyond click itself, in milliseconds
+IMPORT_BUDGET_MS = 50
+
+
+def import_times(code):
+    """Run `code` with `python -X importtime`; return the cumulative import
+    time of each module, in microseconds."""
+    process = run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        stdout=PIPE, stderr=PIPE, universal_newlines=True,
+    )  # fmt: skip
+    times = {}
+    for line in process.stderr.splitlines():
+        fields = line.split("|")
+        if line.startswith("import time:") and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1])
+    return times
+
+
+def main(runs=5):
+    runs = [import_times("import ps2vcard.cli") for _ in range(runs)]
+    cli = min(times["ps2vcard.cli"] for times in runs) / 1000
+    click = min(times["click"] for times in runs) / 1000
+    own = min(times["ps2vcard.cli"] - times["click"] for times in runs) / 1000
+    print("ps2vcard.cli  %7.1f ms" % cli)
+    print("click         %7.1f ms" % click)
+    print(
+        "beyond click  %7.1f ms  (budget %d ms: %s)"
+        % (own, IMPORT_BUDGET_MS, "ok" if own < IMPORT_BUDGET_MS else "over")
+    )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+"""
+Time the ps2vcard commands on synthetic rosters of several sizes
+
+Usage:
+
+    $ python benchmarks/bench_suite.py [--sizes 10,1000,10000]
+        [--photo-size BYTES] [--command NAME ...] [--output FILE]
+        [--compare OLD_FILE]
+
+For each size, writes a synthetic roster of every kind, then benchmarks
+each command twice:
+
+* stage by stage, in this process, by calling the library functions the
+  command calls (parsing, building cards, serializing, writing...);
+* end to end, by running the installed console script on the roster in a
+  fresh process, with the parse cache turned off.  The wall time includes
+  starting Python; the peak memory is that of the command's process.
+
+The results are printed as a table, and written as JSON to `--output`.
+Given the JSON of an earlier run with `--compare`, the table also shows
+how much faster or slower each command has become.
+"""
+
+import csv
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+import time
+
+import click
+
+from ps2vcard.anki import AnkiPackageWriter
+from ps2vcard.parsers.html import (
+    AlbertRosterFramesetParser,
+    AlbertRosterHtmlParser,
+    AlbertRosterXlsParser,
+)
+from ps2vcard.photos import copy_file
+from ps2vcard.serializer import serialize_vcard
+from ps2vcard.synthetic import make_students, write_roster
+from ps2vcard.writers import AmcCsvWriter, VcardWriter
+
+RESULTS_VERSION = 1
+
+# the roster file each command reads
+ROSTER_FILES = {
+    "html": "Access Class Rosters.html",
+    "frameset": "Faculty Center.html",
+    "xls": "ps.xls",
+    "csv": "ps.csv",
+}
+
+
+class Stages(object):
+    """A stopwatch for the consecutive stages of a command."""
+
+    def __init__(self):
+        self.times = {}
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.times[stage] = self.times.get(stage, 0.0) + now - self.last
+        self.last = now
+
+
+def vcard_stages(parser, infile, outdir):
+    stages = Stages()
+    (course, students) = parser.parse_records(infile)
+    stages.lap("parse")
+    cards = [parser.student_to_vcard(student, course) for student in students]
+    stages.lap("build")
+    data = [serialize_vcard(card) for card in cards]
+    stages.lap("serialize")
+    with VcardWriter(outdir) as writer:
+        for card in cards:
+            writer.write(card)
+    stages.lap("write")
+    return stages.times, len(data)
+
+
+def convert_all_stages(infile, outdir):
+    return vcard_stages(AlbertRosterHtmlParser(), infile, outdir)
+
+
+def convert_all_lxml_stages(infile, outdir):
+    return vcard_stages(AlbertRosterHtmlParser(tokenizer="lxml"), infile, outdir)
+
+
+def convert_all_from_frameset_stages(infile, outdir):
+    return vcard_stages(AlbertRosterFramesetParser(), infile, outdir)
+
+
+def convert_to_anki_stages(infile, outdir):
+    stages = Stages()
+    parser = AlbertRosterHtmlParser()
+    (course, students) = parser.parse_records(infile)
+    stages.lap("parse")
+    records = [parser.student_record(student, course) for student in students]
+    stages.lap("build")
+    for record in records:
+        if record.photo:
+            name = "%s %s.jpg" % (record.given_names, record.family_name)
+            copy_file(record.photo, os.path.join(outdir, name))
+    stages.lap("copy photos")
+    return stages.times, len(records)
+
+
+def convert_to_apkg_stages(infile, outdir):
+    stages = Stages()
+    parser = AlbertRosterHtmlParser()
+    (course, students) = parser.parse_records(infile)
+    stages.lap("parse")
+    records = [parser.student_record(student, course) for student in students]
+    stages.lap("build")
+    with AnkiPackageWriter(os.path.join(outdir, "roster.apkg"), "Roster") as writer:
+        for record in records:
+            writer.write(record)
+    stages.lap("write")
+    return stages.times, len(records)
+
+
+def convert_to_amccsv_stages(infile, outdir):
+    stages = Stages()
+    with open(infile) as f:
+        students = list(csv.DictReader(f))
+    stages.lap("parse")
+    with open(os.path.join(outdir, "amc.csv"), "w") as f:
+        AmcCsvWriter(f).write(students)
+    stages.lap("write")
+    return stages.times, len(students)
+
+
+def convert_xls_to_amccsv_stages(infile, outdir):
+    stages = Stages()
+    (course, students) = AlbertRosterXlsParser().parse_records(infile)
+    stages.lap("parse")
+    output = io.StringIO()
+    AmcCsvWriter(output).write(students)
+    with open(os.path.join(outdir, "amc.csv"), "w") as f:
+        f.write(output.getvalue())
+    stages.lap("write")
+    return stages.times, len(students)
+
+
+# name: (roster kind, stage function, command line, with {infile} and {outdir})
+COMMANDS = {
+    "convert_all": (
+        "html",
+        convert_all_stages,
+        ["ps2vcard", "roster", "--no-print", "--save", "--no-cache", "{infile}"],
+    ),
+    "convert_all_lxml": (
+        "html",
+        convert_all_lxml_stages,
+        ["ps2vcard", "roster", "--no-print", "--save", "--no-cache",
+         "--tokenizer=lxml", "{infile}"],
+    ),  # fmt: skip
+    "convert_all_from_frameset": (
+        "frameset",
+        convert_all_from_frameset_stages,
+        ["ps2vcard-old", "--no-print", "--save", "--save-dir={outdir}",
+         "--no-cache", "{infile}"],
+    ),  # fmt: skip
+    "convert_to_anki": (
+        "html",
+        convert_to_anki_stages,
+        ["ps2anki", "--save-dir={outdir}", "--no-cache", "{infile}"],
+    ),
+    "convert_to_apkg": (
+        "html",
+        convert_to_apkg_stages,
+        ["ps2anki", "--apkg={outdir}/roster.apkg", "--no-cache", "{infile}"],
+    ),
+    "convert_to_amccsv": (
+        "csv",
+        convert_to_amccsv_stages,
+        ["ps2amc", "--output={outdir}/amc.csv", "{infile}"],
+    ),
+    "convert_xls_to_amccsv": (
+        "xls",
+        convert_xls_to_amccsv_stages,
+        ["psxls2amc", "--output={outdir}/amc.csv", "--no-cache", "{infile}"],
+    ),
+}
+
+
+# Runs a command and prints its wall time and peak memory.  A child's peak
+# memory counts the memory of its parent at the time of the fork, so the
+# commands are started from this small process rather than from the
+# benchmark, which holds whole rosters.
+LAUNCHER = """
+import os, subprocess, sys, time
+start = time.perf_counter()
+process = subprocess.Popen(sys.argv[1:], stdout=subprocess.DEVNULL)
+(pid, status, usage) = os.wait4(process.pid, 0)
+print(time.perf_counter() - start, usage.ru_maxrss, os.waitstatus_to_exitcode(status))
+"""
+
+
+def run_command(args, cwd):
+    """Run `args` in `cwd`; return the wall time and peak memory in kB."""
+    with open(os.path.join(cwd, "stderr.txt"), "w+") as stderr:
+        output = subprocess.run(
+            [sys.executable, "-c", LAUNCHER] + args,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            universal_newlines=True,
+            check=True,
+        ).stdout
+        (elapsed, max_rss, returncode) = output.split()
+        if int(returncode):
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(
+                int(returncode), args, stderr=stderr.read()
+            )
+    return float(elapsed), int(max_rss)
+
+
+def run_benchmark(name, size, rosters, tempdir):
+    (kind, stage_function, command) = COMMANDS[name]
+    infile = rosters[kind]
+    outdir = os.path.join(tempdir, "%s-%d" % (name, size))
+    for suffix in ["-stages", "-command"]:
+        os.makedirs(outdir + suffix)
+    (stages, students) = stage_function(infile, outdir + "-stages")
+    args = [arg.format(infile=infile, outdir=outdir + "-command") for arg in command]
+    (wall, max_rss) = run_command(args, cwd=outdir + "-command")
+    return {
+        "command": name,
+        "students": size,
+        "parsed": students,
+        "stages": stages,
+        "stage_total": sum(stages.values()),
+        "wall": wall,
+        "max_rss_kb": max_rss,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def format_result(result, previous=None):
+    stages = "  ".join(
+        "%s %.3f" % (stage, seconds) for (stage, seconds) in result["stages"].items()
+    )
+    line = "%-26s %7d  wall %8.3f s  %7.0f MB  [%s]" % (
+        result["command"],
+        result["students"],
+        result["wall"],
+        result["max_rss_kb"] / 1024,
+        stages,
+    )
+    if previous is not None:
+        line += "  %.2fx" % (previous["wall"] / result["wall"])
+    return line
+
+
+def load_previous(path):
+    with open(path) as f:
+        results = json.load(f)
+    return {(r["command"], r["students"]): r for r in results["results"]}
+
+
+@click.command()
+@click.option(
+    "--sizes",
+    default="10,1000,10000",
+    show_default=True,
+    help="comma-separated numbers of students",
+)
+@click.option(
+    "--photo-size",
+    type=int,
+    default=2000,
+    show_default=True,
+    metavar="BYTES",
+    help="size of each student photo",
+)
+@click.option(
+    "--command",
+    "commands",
+    multiple=True,
+    type=click.Choice(list(COMMANDS)),
+    help="benchmark only this command (may be repeated)",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False),
+    default="bench-results.json",
+    show_default=True,
+    help="write the results as JSON to this file",
+)
+@click.option(
+    "--compare",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="JSON results of an earlier run to compare with",
+)
+def main(sizes, photo_size, commands, output, compare):
+    """Benchmark the ps2vcard commands on synthetic rosters."""
+    sizes = [int(size) for size in sizes.split(",")]
+    commands = list(commands) or list(COMMANDS)
+    previous = load_previous(compare) if compare else {}
+    results = []
+    for size in sizes:
+        with TemporaryDirectory() as tempdir:
+            students = make_students(size)
+            rosters = {}
+            for (kind, filename) in ROSTER_FILES.items():
+                dirname = os.path.join(tempdir, "rosters", kind)
+                os.makedirs(dirname)
+                rosters[kind] = write_roster(
+                    kind, os.path.join(dirname, filename), students, photo_size
+                )
+            for name in commands:
+                result = run_benchmark(name, size, rosters, tempdir)
+                results.append(result)
+                click.echo(format_result(result, previous.get((name, size))))
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "version": RESULTS_VERSION,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "photo_size": photo_size,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    click.echo("results written to %s" % output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Compare the engines of `AlbertRosterXlsParser`
+
+Usage:
+
+    $ python benchmarks/bench_xls.py [STUDENTS]
+
+Generates a synthetic `ps.xls` export (50,000 students by default) and
+parses it with each engine, in a fresh process each so that the peak
+memory reported (the maximum resident set size) is the engine's own.
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+import time
+
+from ps2vcard.parsers.html import AlbertRosterXlsParser
+from ps2vcard.synthetic import make_students, write_xls_roster
+
+
+def run_engine(engine, path):
+    """parse `path` with `engine` in this process and print the results"""
+    parser = AlbertRosterXlsParser(engine=engine)
+    start = time.perf_counter()
+    count = sum(1 for student in parser.iter_students(path, vcards=False))
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"students": count, "seconds": elapsed, "peak_kb": peak}))
+
+
+def main(count=50000):
+    with TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, "ps.xls")
+        write_xls_roster(path, make_students(count))
+        print("%d students, %d bytes" % (count, os.path.getsize(path)))
+        for engine in AlbertRosterXlsParser.engines:
+            output = subprocess.check_output(
+                [sys.executable, __file__, "--engine", engine, path]
+            )
+            result = json.loads(output)
+            assert result["students"] == count, "%s lost students" % engine
+            print(
+                "%-10s %8.3f s  %10.0f students/s  peak %6.0f MB"
+                % (
+                    engine,
+                    result["seconds"],
+                    count / result["seconds"],
+                    result["peak_kb"] / 1024,
+                )
+            )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--engine"]:
+        run_engine(*sys.argv[2:4])
+    else:
+        main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,3 @@
+# The photo modes of the cards (see `ps2vcard.photostore`), kept here so
+# that the command line can offer them without importing the photo store.
+PHOTO_MODES = ["embed", "uri", "none"]
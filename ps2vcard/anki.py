@@ -0,0 +1,347 @@
+"""
+Anki packages of student photos
+
+An Anki_ package (`.apkg`) is a zip archive holding a collection, which is
+an SQLite database of note types, decks, notes and cards, and the media
+files the notes refer to.  The archive names the media files `0`, `1`,
+`2`... and maps those names to the real ones in a JSON file called
+`media`.  `AnkiPackageWriter` writes a package with one note per student:
+the photo on the front of the card, the name, program and course on the
+back.  File > Import in Anki reads it; no add-on is needed.
+
+The photos are streamed from their files into the archive, uncompressed,
+since JPEG images do not compress any further.  Notes get a GUID made from
+the student's email address, so that importing a newer roster into the
+same collection updates the students' notes instead of adding them again.
+
+The collection is the older schema (version 11) that every Anki release
+since 2.1 imports.
+
+.. _Anki: https://apps.ankiweb.net/
+"""
+
+import hashlib
+from html import escape
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+from ps2vcard import timings
+from ps2vcard.writers import VcardWriter
+
+SCHEMA = """
+CREATE TABLE col (
+    id integer PRIMARY KEY, crt integer NOT NULL, mod integer NOT NULL,
+    scm integer NOT NULL, ver integer NOT NULL, dty integer NOT NULL,
+    usn integer NOT NULL, ls integer NOT NULL, conf text NOT NULL,
+    models text NOT NULL, decks text NOT NULL, dconf text NOT NULL,
+    tags text NOT NULL
+);
+CREATE TABLE notes (
+    id integer PRIMARY KEY, guid text NOT NULL, mid integer NOT NULL,
+    mod integer NOT NULL, usn integer NOT NULL, tags text NOT NULL,
+    flds text NOT NULL, sfld integer NOT NULL, csum integer NOT NULL,
+    flags integer NOT NULL, data text NOT NULL
+);
+CREATE TABLE cards (
+    id integer PRIMARY KEY, nid integer NOT NULL, did integer NOT NULL,
+    ord integer NOT NULL, mod integer NOT NULL, usn integer NOT NULL,
+    type integer NOT NULL, queue integer NOT NULL, due integer NOT NULL,
+    ivl integer NOT NULL, factor integer NOT NULL, reps integer NOT NULL,
+    lapses integer NOT NULL, left integer NOT NULL, odue integer NOT NULL,
+    odid integer NOT NULL, flags integer NOT NULL, data text NOT NULL
+);
+CREATE TABLE revlog (
+    id integer PRIMARY KEY, cid integer NOT NULL, usn integer NOT NULL,
+    ease integer NOT NULL, ivl integer NOT NULL, lastIvl integer NOT NULL,
+    factor integer NOT NULL, time integer NOT NULL, type integer NOT NULL
+);
+CREATE TABLE graves (
+    usn integer NOT NULL, oid integer NOT NULL, type integer NOT NULL
+);
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+# the note type of the students; its id is fixed so that every package
+# adds notes of the same type
+MODEL_ID = 1697040000000
+MODEL_NAME = "ps2vcard student"
+FIELDS = ["Name", "Photo", "Program", "Course"]
+FRONT = "{{Photo}}"
+BACK = """{{FrontSide}}
+
+<hr id="answer">
+
+<div class="name">{{Name}}</div>
+<div class="details">{{Program}}<br>{{Course}}</div>"""
+CSS = """.card {
+    font-family: arial;
+    font-size: 20px;
+    text-align: center;
+    color: black;
+    background-color: white;
+}
+.card img { max-height: 320px; }
+.name { font-size: 28px; }
+.details { font-size: 16px; color: grey; }"""
+
+DECK_OPTIONS = {
+    "id": 1,
+    "name": "Default",
+    "mod": 0,
+    "usn": 0,
+    "maxTaken": 60,
+    "autoplay": True,
+    "timer": 0,
+    "replayq": True,
+    "dyn": False,
+    "new": {
+        "bury": True,
+        "delays": [1, 10],
+        "initialFactor": 2500,
+        "ints": [1, 4, 7],
+        "order": 1,
+        "perDay": 20,
+        "separate": True,
+    },
+    "lapse": {
+        "delays": [10],
+        "leechAction": 0,
+        "leechFails": 8,
+        "minInt": 1,
+        "mult": 0,
+    },
+    "rev": {
+        "bury": True,
+        "ease4": 1.3,
+        "fuzz": 0.05,
+        "ivlFct": 1,
+        "maxIvl": 36500,
+        "minSpace": 1,
+        "perDay": 100,
+    },
+}
+
+
+def deck_id(name):
+    """Return the id of the deck called `name`, the same in every package."""
+    return int(hashlib.sha1(name.encode()).hexdigest()[:12], 16)
+
+
+def note_guid(record):
+    """Return the GUID of the note of a `StudentRecord`."""
+    return hashlib.sha1(("ps2vcard:" + record.email).encode()).hexdigest()[:16]
+
+
+def field_checksum(text):
+    """Return the checksum Anki keeps of the first field of a note."""
+    return int(hashlib.sha1(text.encode()).hexdigest()[:8], 16)
+
+
+class AnkiPackageWriter(object):
+    """Class to write the photos and names of students to an Anki package
+
+    Each `write` adds a note for a `StudentRecord`, with its photo, and
+    `close` (or leaving the writer as a context manager) writes the
+    collection and finishes the archive.  The package is written to a
+    temporary file next to `path` and renamed into place, so a failed
+    export leaves no half-written package behind.
+
+    The `counts` attribute tallies the students `"added"`, and those
+    `"skipped"` for want of a photo.
+    """
+
+    _name = "AnkiPackageWriter"
+
+    def __init__(self, path, deck_name, created=None):
+        self.path = path
+        self.deck_name = deck_name
+        self.deck_id = deck_id(deck_name)
+        self.created = int(time.time()) if created is None else created
+        self.counts = {"added": 0, "skipped": 0}
+        self.media = {}
+        self.media_names = set()
+        dirname = os.path.dirname(os.path.abspath(path))
+        (fd, self._temp_path) = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+        os.close(fd)
+        self._archive = zipfile.ZipFile(self._temp_path, "w")
+        self._tempdir = tempfile.TemporaryDirectory(prefix="ps2vcard-anki-")
+        self._db_path = os.path.join(self._tempdir.name, "collection.anki2")
+        self._db = sqlite3.connect(self._db_path)
+        self._db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, record, photo=None):
+        """add a note for `record`, with the photo at `photo` (by default,
+        the record's photo).
+
+        Return True, or False if the student has no photo and was skipped.
+        """
+        if photo is None:
+            photo = record.photo
+        name = "%s %s" % (record.given_names, record.family_name)
+        if not photo:
+            logging.getLogger(self._name).warning(
+                "No photo found for student %s; skipping.", name
+            )
+            self.counts["skipped"] += 1
+            return False
+        index = len(self.media)
+        media_name = self.media_name(record, photo)
+        with timings.stage("photos") as timer:
+            self._archive.write(photo, str(index), zipfile.ZIP_STORED)
+            timer.add_bytes(self._archive.getinfo(str(index)).file_size)
+        self.media[str(index)] = media_name
+        fields = [
+            escape(name),
+            '<img src="%s">' % escape(media_name),
+            escape(record.program),
+            escape(record.course),
+        ]
+        with timings.stage("write"):
+            # ids are in milliseconds, like Anki's own
+            note_id = self.created * 1000 + index
+            self._db.execute(
+                "INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                (note_id, note_guid(record), MODEL_ID, self.created, -1, "",
+                 "\x1f".join(fields), name, field_checksum(name), 0, ""),
+            )  # fmt: skip
+            self._db.execute(
+                "INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                (note_id, note_id, self.deck_id, 0, self.created, -1, 0, 0,
+                 index + 1, 0, 0, 0, 0, 0, 0, 0, 0, ""),
+            )  # fmt: skip
+        self.counts["added"] += 1
+        return True
+
+    def media_name(self, record, photo):
+        """Return a name for the photo of `record` that no other photo in
+        the package has, e.g. `"bl4156.jpg"`."""
+        extension = os.path.splitext(photo)[1].lower() or ".jpg"
+        stem = record.email.split("@")[0] or "student"
+        name = stem + extension
+        number = 1
+        while name in self.media_names:
+            number += 1
+            name = "%s-%d%s" % (stem, number, extension)
+        self.media_names.add(name)
+        return name
+
+    def collection(self):
+        """Return the values of the single row of the `col` table."""
+        now = self.created * 1000
+        deck = {
+            "id": self.deck_id,
+            "name": self.deck_name,
+            "desc": "",
+            "mod": self.created,
+            "usn": -1,
+            "conf": 1,
+            "dyn": 0,
+            "collapsed": False,
+            "extendNew": 10,
+            "extendRev": 50,
+            "newToday": [0, 0],
+            "revToday": [0, 0],
+            "lrnToday": [0, 0],
+            "timeToday": [0, 0],
+        }
+        default_deck = dict(deck, id=1, name="Default", mod=0, usn=0)
+        model = {
+            "id": MODEL_ID,
+            "name": MODEL_NAME,
+            "type": 0,
+            "mod": self.created,
+            "usn": -1,
+            "did": self.deck_id,
+            "sortf": 0,
+            "tags": [],
+            "vers": [],
+            "flds": [
+                {"name": field, "ord": i, "sticky": False, "rtl": False,
+                 "font": "Arial", "size": 20, "media": []}
+                for (i, field) in enumerate(FIELDS)
+            ],  # fmt: skip
+            "tmpls": [
+                {"name": "Face", "ord": 0, "qfmt": FRONT, "afmt": BACK,
+                 "did": None, "bqfmt": "", "bafmt": ""}
+            ],  # fmt: skip
+            # a card needs the photo
+            "req": [[0, "all", [FIELDS.index("Photo")]]],
+            "css": CSS,
+            "latexPre": "\\documentclass[12pt]{article}\n\\begin{document}\n",
+            "latexPost": "\\end{document}",
+        }
+        conf = {
+            "activeDecks": [self.deck_id],
+            "curDeck": self.deck_id,
+            "curModel": str(MODEL_ID),
+            "newSpread": 0,
+            "collapseTime": 1200,
+            "timeLim": 0,
+            "estTimes": True,
+            "dueCounts": True,
+            "nextPos": len(self.media) + 1,
+            "sortType": "noteFld",
+            "sortBackwards": False,
+            "addToCur": True,
+        }
+        return (
+            1, self.created, now, now, 11, 0, 0, 0,
+            json.dumps(conf),
+            json.dumps({str(MODEL_ID): model}),
+            json.dumps({"1": default_deck, str(self.deck_id): deck}),
+            json.dumps({"1": DECK_OPTIONS}),
+            "{}",
+        )  # fmt: skip
+
+    def close(self):
+        """write the collection and the media map, and move the package into
+        place."""
+        with timings.stage("write") as timer:
+            self._db.execute(
+                "INSERT INTO col VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)", self.collection()
+            )
+            self._db.commit()
+            self._db.close()
+            self._archive.write(
+                self._db_path, "collection.anki2", zipfile.ZIP_DEFLATED
+            )
+            self._archive.writestr("media", json.dumps(self.media))
+            self._archive.close()
+            self._tempdir.cleanup()
+            os.chmod(self._temp_path, 0o666 & ~VcardWriter.umask())
+            os.replace(self._temp_path, self.path)
+            timer.add_bytes(os.path.getsize(self.path))
+        logging.getLogger(self._name + ".close").info(
+            "Wrote %d notes to %s", self.counts["added"], self.path
+        )
+
+    def abort(self):
+        """discard the package."""
+        self._db.close()
+        self._archive.close()
+        self._tempdir.cleanup()
+        os.remove(self._temp_path)
+
+    def summary(self):
+        """describe the counts, e.g. `"38 added, 2 skipped"`."""
+        return ", ".join("%d %s" % (n, status) for (status, n) in self.counts.items())
@@ -0,0 +1,243 @@
+"""
+Batch conversion of saved Albert rosters
+
+Finds every roster under a set of directories, converts each one with the
+parser for its kind on a pool of worker processes, and writes the cards of
+each roster to a directory of its own.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import os
+import time
+import traceback
+
+from ps2vcard import timings
+from ps2vcard.photostore import PhotoStore, apply_photo_mode
+from ps2vcard.sniff import make_parser, sniff
+from ps2vcard.writers import AmcCsvWriter, VcardWriter
+
+
+logger = logging.getLogger(__name__)
+
+ROSTER_EXTENSIONS = (".html", ".htm", ".xls", ".csv")
+
+RosterResult = namedtuple(
+    "RosterResult",
+    ["path", "kind", "outdir", "students", "written", "seconds", "error", "timings"],
+    defaults=[None],
+)
+
+
+def find_rosters(dirnames):
+    """Find the rosters in the directory trees `dirnames`.
+
+    Return a sorted list of `(path, kind, relpath)` tuples, where `relpath`
+    names the roster relative to the parent of its tree.  Directories
+    ending in `_files`, which hold the frames and photos of a saved page,
+    are not searched.
+    """
+    rosters = []
+    for dirname in dirnames:
+        dirname = os.path.normpath(dirname)
+        parent = os.path.dirname(os.path.abspath(dirname))
+        for root, subdirs, filenames in os.walk(dirname):
+            subdirs[:] = sorted(d for d in subdirs if not d.endswith("_files"))
+            for filename in sorted(filenames):
+                path = os.path.join(root, filename)
+                extension = os.path.splitext(filename)[1].lower()
+                if extension not in ROSTER_EXTENSIONS:
+                    continue
+                kind = sniff(path)
+                if kind is not None:
+                    relpath = os.path.relpath(os.path.abspath(path), parent)
+                    rosters.append((path, kind, relpath))
+    return sorted(rosters, key=lambda roster: roster[2])
+
+
+def roster_outdir(outdir, relpath):
+    """Return the directory under `outdir` that the cards of the roster
+    named `relpath` (see `find_rosters`) are written to.
+
+    The directory keeps the extension of the roster, so that `ps.xls` and
+    `ps.csv` in the same folder are not written over each other.
+    """
+    return os.path.join(outdir, relpath)
+
+
+def convert_roster(
+    path,
+    kind,
+    outdir,
+    engine="table",
+    prescan=False,
+    tokenizer="stdlib",
+    collect_timings=False,
+    photo_mode="embed",
+    photo_store=None,
+):
+    """Convert one roster and write its vCards to `outdir`.
+
+    Rosters from the spreadsheet export (or a CSV copy of it) also get an
+    `amc.csv` file, written from the parsed rows.  Errors are reported in
+    the result instead of being raised, so that one bad roster does not
+    stop a batch.  With `collect_timings`, the result holds the stage
+    timings of the conversion.  `photo_mode` and the photo store directory
+    `photo_store` are as in `write_cards`.
+    """
+    if collect_timings:
+        with timings.collecting() as collector:
+            result = convert_roster(
+                path, kind, outdir, engine, prescan, tokenizer,
+                photo_mode=photo_mode, photo_store=photo_store,
+            )  # fmt: skip
+        return result._replace(timings=collector.as_dict()["stages"])
+    start = time.perf_counter()
+    try:
+        parser = make_parser(
+            kind, engine=engine, prescan=prescan, tokenizer=tokenizer
+        )
+        (course, students) = parser.parse_records(path)
+        os.makedirs(outdir, exist_ok=True)
+        # each card is built as it is written, and not kept
+        cards = (parser.student_to_vcard(student, course) for student in students)
+        writer = write_cards(cards, outdir, photo_mode, photo_store)
+        if kind in ("xls", "csv"):
+            with open(os.path.join(outdir, "amc.csv"), "w", newline="") as f:
+                AmcCsvWriter(f).write(students)
+    except Exception:
+        logger.debug("failed to convert %s", path, exc_info=True)
+        error = traceback.format_exc(limit=1).strip().splitlines()[-1]
+        return RosterResult(
+            path, kind, outdir, 0, None, time.perf_counter() - start, error
+        )
+    return RosterResult(
+        path,
+        kind,
+        outdir,
+        len(students),
+        writer.summary(),
+        time.perf_counter() - start,
+        None,
+    )
+
+
+def write_cards(cards, outdir, photo_mode="embed", photo_store=None):
+    """Write `cards` to the directory `outdir`, and return the `VcardWriter`.
+
+    The photos are embedded, referred to or left out according to
+    `photo_mode` (see `ps2vcard.photostore`), through the photo store in
+    the directory `photo_store`, if given.  The "uri" mode always uses a
+    store, by default the default one.
+    """
+    store = None
+    if photo_store is not None or photo_mode == "uri":
+        store = PhotoStore(photo_store)
+    try:
+        with VcardWriter(dirname=outdir) as writer:
+            for card in cards:
+                writer.write(apply_photo_mode(card, photo_mode, store))
+    finally:
+        if store is not None:
+            store.close()
+    return writer
+
+
+def run_batch(
+    rosters,
+    outdir,
+    jobs=1,
+    engine="table",
+    prescan=False,
+    tokenizer="stdlib",
+    collect_timings=False,
+    photo_mode="embed",
+    photo_store=None,
+):
+    """Convert `rosters`, as returned by `find_rosters`, on `jobs` processes.
+
+    Each roster is written to its `roster_outdir` under `outdir`.  Return the list of `RosterResult`s, in the order of
+    `rosters` whatever the number of jobs.  `photo_mode` and `photo_store`
+    are as in `write_cards`.
+    """
+    tasks = [
+        (
+            path,
+            kind,
+            roster_outdir(outdir, relpath),
+            engine,
+            prescan,
+            tokenizer,
+            collect_timings,
+            photo_mode,
+            photo_store,
+        )
+        for (path, kind, relpath) in rosters
+    ]
+    if jobs == 1 or len(tasks) < 2:
+        return [convert_roster(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(convert_roster, *zip(*tasks)))
+
+
+def read_roster(path, kind, engine="table", prescan=False, tokenizer="stdlib"):
+    """Return the `RosterResult` of reading the roster at `path`, and its
+    `StudentRecord`s (an empty list if it could not be read)."""
+    start = time.perf_counter()
+    try:
+        parser = make_parser(kind, engine=engine, prescan=prescan, tokenizer=tokenizer)
+        (course, records) = parser.parse_students(path)
+    except Exception:
+        logger.debug("failed to read %s", path, exc_info=True)
+        error = traceback.format_exc(limit=1).strip().splitlines()[-1]
+        return (
+            RosterResult(path, kind, None, 0, None, time.perf_counter() - start, error),
+            [],
+        )
+    return (
+        RosterResult(
+            path, kind, None, len(records), "merged", time.perf_counter() - start, None
+        ),
+        records,
+    )
+
+
+def merge_batch(
+    rosters, outdir, jobs=1, engine="table", prescan=False, tokenizer="stdlib",
+    photo_mode="embed", photo_store=None,
+):  # fmt: skip
+    """Read `rosters`, as returned by `find_rosters`, on `jobs` processes,
+    and write one vCard per student to `outdir`, with all the student's
+    courses (see `ps2vcard.merge`).  `photo_mode` and `photo_store` are as
+    in `write_cards`.
+
+    Return the list of `RosterResult`s, in the order of `rosters`, the
+    `StudentIndex` of the students, and the summary of the writer.
+    """
+    from ps2vcard.merge import StudentIndex
+
+    tasks = [
+        (path, kind, engine, prescan, tokenizer) for (path, kind, relpath) in rosters
+    ]
+    index = StudentIndex()
+    results = []
+    executor = None
+    if jobs == 1 or len(tasks) < 2:
+        reads = (read_roster(*task) for task in tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        reads = executor.map(read_roster, *zip(*tasks))
+    try:
+        # in the order of the rosters, so that the cards do not depend on
+        # the number of jobs
+        for (result, records) in reads:
+            results.append(result._replace(outdir=outdir))
+            with timings.stage("merge"):
+                index.update(records)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    os.makedirs(outdir, exist_ok=True)
+    writer = write_cards(index.cards(), outdir, photo_mode, photo_store)
+    return (results, index, writer.summary())
@@ -0,0 +1,194 @@
+"""
+Persistent cache of parsed rosters
+
+Parsing a saved roster page means tokenizing hundreds of kilobytes of
+HTML, and it gives the same records every time the same file is converted.
+A `ParseCache` stores the `(course, students)` records of each roster in a
+directory, by default `~/.cache/ps2vcard`, so that converting it again skips
+parsing entirely.
+
+Entries are content-addressed: the key is a hash of the roster file, the
+name of the parser, its options, `PARSER_VERSION` and the directory the
+roster was named in (the paths of the photos in the records start with
+it).  Each entry also records the hash
+of every other file the records depend on (the roster frame of a frameset,
+the student photos).  If one of those changed, the entry is discarded.
+The cache is kept under a size limit by evicting the least recently used
+entries.
+
+The records of a roster are stored, and loaded, all at once, so a roster
+converted through the cache is held in memory whole; the commands only
+use the cache when asked to (`--cache`).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+
+from ps2vcard.parsers import PARSER_VERSION
+from ps2vcard.timings import timed
+
+
+logger = logging.getLogger(__name__)
+
+
+def default_cache_dir():
+    """Return the cache directory, from `$PS2VCARD_CACHE_DIR` or the XDG
+    base directory specification."""
+    if os.environ.get("PS2VCARD_CACHE_DIR"):
+        return os.environ["PS2VCARD_CACHE_DIR"]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "ps2vcard")
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of the file at `path`."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache(object):
+    """Size-bounded, least-recently-used cache of parsed rosters."""
+
+    suffix = ".pickle"
+
+    def __init__(self, dirname=None, max_bytes=256 * 1024 * 1024):
+        if dirname is None:
+            dirname = default_cache_dir()
+        self.dirname = dirname
+        self.max_bytes = max_bytes
+
+    def key(self, parser, path):
+        """Return the cache key of the roster at `path` parsed by `parser`."""
+        stamp = json.dumps(
+            [
+                type(parser).__name__,
+                PARSER_VERSION,
+                getattr(parser, "options", {}),
+                os.path.dirname(path),
+            ],
+            sort_keys=True,
+        )
+        return hashlib.sha256(stamp.encode() + file_digest(path).encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.dirname, key[:2], key + self.suffix)
+
+    @timed("cache")
+    def load(self, parser, path):
+        """Return the cached `(course, students)` for `path`, or None."""
+        entry_path = self.entry_path(self.key(parser, path))
+        try:
+            with open(entry_path, "rb") as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("discarding unreadable cache entry %s", entry_path)
+            self.discard(entry_path)
+            return None
+        for dependency, digest in entry["dependencies"].items():
+            try:
+                current = file_digest(dependency)
+            except OSError:
+                current = None
+            if current != digest:
+                logger.info("%s changed; discarding cache entry", dependency)
+                self.discard(entry_path)
+                return None
+        # mark the entry as recently used
+        os.utime(entry_path)
+        logger.info("parse cache hit for %s", path)
+        return (entry["course"], entry["students"])
+
+    @timed("cache")
+    def store(self, parser, path, course, students):
+        """Store the records parsed from `path`."""
+        entry = {
+            "course": dict(course) if course is not None else None,
+            "students": [dict(student) for student in students],
+            "dependencies": {
+                dependency: file_digest(dependency)
+                for dependency in parser.dependencies(students)
+            },
+        }
+        entry_path = self.entry_path(self.key(parser, path))
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        (fd, temp_path) = tempfile.mkstemp(dir=os.path.dirname(entry_path))
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, entry_path)
+        self.evict()
+
+    def parse(self, parser, path):
+        """Return `parser.parse_records(path)`, from the cache if possible."""
+        cached = self.load(parser, path)
+        if cached is not None:
+            return cached
+        (course, students) = parser.parse_records(path)
+        self.store(parser, path, course, students)
+        return (course, students)
+
+    def iter_records(self, parser, path):
+        """Yield the student records of `path` as
+        `parser.iter_students(path, vcards=False)` does.
+
+        On a cache hit, `parser.course_data` is filled in from the cache.
+        """
+        cached = self.load(parser, path)
+        if cached is not None:
+            (course, students) = cached
+            parser.course_data.update(course)
+            yield from students
+            return
+        students = []
+        for student in parser.iter_students(path, vcards=False):
+            students.append(student)
+            yield student
+        self.store(parser, path, parser.course_data, students)
+
+    def entries(self):
+        """Return a list of `(path, size, mtime)` of the cache entries."""
+        entries = []
+        if not os.path.isdir(self.dirname):
+            return entries
+        for subdir in os.scandir(self.dirname):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.name.endswith(self.suffix):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in
+        `max_bytes`."""
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for (path, size, mtime) in entries)
+        for (path, size, mtime) in entries:
+            if total <= self.max_bytes:
+                break
+            logger.debug("evicting %s", path)
+            self.discard(path)
+            total -= size
+
+    def clear(self):
+        """Remove every entry; return how many there were."""
+        entries = self.entries()
+        for (path, size, mtime) in entries:
+            self.discard(path)
+        return len(entries)
+
+    def discard(self, entry_path):
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+
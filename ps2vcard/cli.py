@@ -9,34 +9,266 @@ installation instructions.
 .. _vobject: http://eventable.github.io/vobject/
 """
 
+from contextlib import contextmanager, nullcontext
 import csv
+import functools
 import logging
 import os
 import sys
+import time
 
 import click
 from logdecorator import log_on_start, log_on_end
 
-from .parsers.html import (
-    AlbertRosterFramesetParser,
-    AlbertRosterHtmlParser,
-    AlbertRosterXlsParser,
-)
-from .writers import AmcCsvWriter, VcardWriter, VcardAmcCsvWriter
+# The parsers, the photo code and the batch runner import BeautifulSoup,
+# lxml, transitions, vobject and multiprocessing, which take far longer to
+# import than a small roster takes to convert.  Each command imports the
+# ones it uses, so that, e.g., `ps2amc` only needs the csv module.
+from . import PHOTO_MODES, timings
+from .parsers import HTML_ENGINES, HTML_TOKENIZERS, XLS_ENGINES
 
 
 FORMAT = "%(levelname)s:%(name)s#%(lineno)d|%(funcName)s: %(message)s"
-logging.basicConfig(format=FORMAT)
 logger = logging.getLogger()
 
 
 def _set_loglevel(*args):
     "Callback for a Click Option to set the logging level"
     (_, _, value) = args
+    # Logging is set up when a command runs, not when this module is
+    # imported, so that importing it leaves the logging of its host alone.
+    logging.basicConfig(format=FORMAT)
     if value is not None:
         logging.getLogger().setLevel(value)
 
 
+def _output_cards(
+    records, build, pprint, save, save_dir, bundle, jobs=1, photo_mode="embed",
+    photo_store=None,
+):  # fmt: skip
+    "Build vCards from `records`; print, save and bundle them as a command asks"
+    from .photostore import apply_photo_mode
+    from .pipeline import CardPipeline
+    from .writers import VcardBundleWriter, VcardWriter
+
+    if photo_mode != "embed" or photo_store is not None:
+        build_card = build
+
+        def build(record):
+            return apply_photo_mode(build_card(record), photo_mode, photo_store)
+
+    bundle_writer = VcardBundleWriter(bundle) if bundle else None
+    if bundle_writer and bundle.name == "<stdout>":
+        pprint = False
+    with VcardWriter(dirname=save_dir) as writer:
+        pipeline = CardPipeline(
+            build,
+            writer=writer if save else None,
+            serialize=bundle_writer is not None,
+            jobs=jobs,
+        )
+        # the cards come in roster order, whatever the number of jobs
+        for (card, data) in pipeline.run(records):
+            logger.debug("student: %s", repr(card))
+            if pprint:
+                with timings.stage("print"):
+                    card.prettyPrint()
+            if bundle_writer:
+                bundle_writer.write_data(data)
+    if bundle_writer:
+        bundle_writer.close()
+    if save:
+        click.echo("vCards: %s" % writer.summary(), err=True)
+
+
+_cache_option = click.option(
+    "--cache/--no-cache",
+    "use_cache",
+    default=False,
+    help="reuse parsed rosters from the parse cache, and store them there; "
+    "the whole roster is then kept in memory (default: off)",
+)
+
+
+def _parser_options(command=None, cache=True):
+    """Add the --engine, --prescan and --tokenizer options of the roster
+    parsers to a Click command, and --cache unless `cache` is false"""
+    if command is None:
+        return functools.partial(_parser_options, cache=cache)
+    options = [
+        click.option(
+            "--engine",
+            type=click.Choice(HTML_ENGINES),
+            default="table",
+            show_default=True,
+            help="state machine engine for the HTML parser",
+        ),
+        click.option(
+            "--prescan",
+            is_flag=True,
+            default=False,
+            help="tokenize only the parts of a roster page that hold roster "
+            "data, found by a byte search of the page (faster on large pages)",
+        ),
+        click.option(
+            "--tokenizer",
+            type=click.Choice(HTML_TOKENIZERS),
+            default="stdlib",
+            show_default=True,
+            help="HTML tokenizer of the roster parser (lxml is faster, if "
+            "installed)",
+        ),
+    ]
+    if cache:
+        options.append(_cache_option)
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+def _photo_options(command):
+    "Add the options of the photo processing stage to a Click command"
+    options = [
+        click.option(
+            "--photo-size",
+            type=click.IntRange(min=1),
+            default=None,
+            metavar="PIXELS",
+            help="shrink photos to at most PIXELS on a side and recompress "
+            "them (needs Pillow)",
+        ),
+        click.option(
+            "--photo-quality",
+            type=click.IntRange(1, 95),
+            default=85,
+            show_default=True,
+            help="JPEG quality of processed photos",
+        ),
+        click.option(
+            "--photo-jobs",
+            type=click.IntRange(min=1),
+            default=None,
+            help="threads for processing photos (default: number of CPUs)",
+        ),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+def _photo_mode_options(command):
+    "Add the --photo-mode and --photo-store options to a Click command"
+    options = [
+        click.option(
+            "--photo-mode",
+            type=click.Choice(PHOTO_MODES),
+            default="embed",
+            show_default=True,
+            help="embed photos in the vCards, refer to them in the photo "
+            "store by URI, or leave them out",
+        ),
+        click.option(
+            "--photo-store",
+            type=click.Path(file_okay=False),
+            default=None,
+            metavar="DIR",
+            help="keep each distinct photo, and its base64 encoding, once in "
+            "DIR (default with --photo-mode=uri: $PS2VCARD_PHOTO_STORE or "
+            "~/.local/share/ps2vcard/photos)",
+        ),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+def _timing_options(command):
+    "Add the --timings, --timings-json and --profile-out options to a Click command"
+
+    @functools.wraps(command)
+    def wrapper(*args, show_timings, timings_json, profile_out, **kwargs):
+        with _instrumentation(show_timings, timings_json, profile_out):
+            return command(*args, **kwargs)
+
+    options = [
+        click.option(
+            "--timings",
+            "show_timings",
+            is_flag=True,
+            default=False,
+            help="print the time, calls and bytes of each stage of the "
+            "conversion to standard error",
+        ),
+        click.option(
+            "--timings-json",
+            type=click.File("w"),
+            default=None,
+            metavar="FILE",
+            help="write the stage timings as JSON to FILE ('-' for standard "
+            "output)",
+        ),
+        click.option(
+            "--profile-out",
+            type=click.Path(dir_okay=False),
+            default=None,
+            metavar="FILE",
+            help="profile the command with cProfile and save the statistics "
+            "to FILE (see the pstats module)",
+        ),
+    ]
+    for option in reversed(options):
+        wrapper = option(wrapper)
+    return wrapper
+
+
+@contextmanager
+def _instrumentation(show_timings, timings_json, profile_out):
+    "Collect stage timings and a profile around a command, as asked"
+    if show_timings or timings_json:
+        collecting = timings.collecting()
+    else:
+        collecting = nullcontext()
+    profiler = None
+    if profile_out:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    with collecting as collector:
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(profile_out)
+            if show_timings:
+                click.echo(collector.table(), err=True)
+            if timings_json:
+                timings_json.write(collector.to_json() + "\n")
+
+
+def _photo_store(photo_mode, photo_store):
+    "Return the `PhotoStore` for the photo mode options, or a null context"
+    if photo_store is None and photo_mode != "uri":
+        return nullcontext()
+    from .photostore import PhotoStore
+
+    return PhotoStore(photo_store)
+
+
+def _photo_processor(photo_size, photo_quality, photo_jobs):
+    "Return a `PhotoProcessor` for the photo options, or `None`"
+    if photo_size is None:
+        return None
+    from .photos import PhotoProcessor
+
+    try:
+        return PhotoProcessor(photo_size, photo_quality, photo_jobs)
+    except ImportError as e:
+        raise click.UsageError(str(e))
+
+
 @click.command()
 @click.option(
     "-d",
@@ -59,11 +291,55 @@ def _set_loglevel(*args):
     callback=_set_loglevel,
 )
 @click.option("--save", is_flag=True, default=False, help="save vCards")
+@click.option(
+    "--save-dir",
+    "save_dir",
+    type=click.Path(),
+    default=os.getcwd(),
+    help="save vCards to this directory " + "(default: current directory)",
+)
 @click.option("--print/--no-print", "pprint", default=True, help="pretty-print vCards")
+@click.option(
+    "--bundle",
+    type=click.File("wb"),
+    default=None,
+    metavar="FILE",
+    help="also write all vCards to the single file FILE ('-' for standard "
+    "output, which turns off pretty-printing)",
+)
+@_parser_options
+@_photo_options
+@_photo_mode_options
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="threads that build, serialize and save cards while the roster "
+    "is parsed on a thread of its own (1: one card after the other)",
+)
 @click.argument("infile", metavar="FILE", default="Access Class Rosters.html")
+@_timing_options
 @log_on_start(logging.DEBUG, "{callable.__name__:s} begin")
 @log_on_end(logging.DEBUG, "{callable.__name__:s} end")
-def convert_all(infile, save, pprint):
+def convert_all(
+    infile,
+    save,
+    save_dir,
+    pprint,
+    bundle,
+    engine,
+    prescan,
+    tokenizer,
+    use_cache,
+    photo_size,
+    photo_quality,
+    photo_jobs,
+    photo_mode,
+    photo_store,
+    jobs,
+):
     """
     Process a roster downloaded from Albert and generate vCards
 
@@ -85,21 +361,69 @@ def convert_all(infile, save, pprint):
         "Access Class Rosters.html"
 
     Then run this script on that file.  You won't get any vCards saved without
-    the --save option, though.
+    the --save option, though; they go to the --save-dir directory.  A page
+    saved with its frames (e.g. "Faculty Center.html") works too.
+
+    To collect all the cards in one file, use the --bundle option.
+
+    Large photos can be shrunk with the --photo-size option.  With
+    --photo-mode=uri, the cards refer to the photos in a photo store
+    instead of embedding them.
+
+    With photos and cards on a slow or network file system, --jobs 4 or so
+    reads photos and writes cards while the rest of the roster is parsed.
 
     Then you can import the cards into your address book.
 
     """
-    parser = AlbertRosterHtmlParser()
-    (course, students) = parser.parse(infile)
+    from .sniff import sniff
+
+    if os.path.isfile(infile) and sniff(infile) == "frameset":
+        # the page saved with its frames, as `ps2vcard-old` reads it
+        from .parsers.html import AlbertRosterFramesetParser
+
+        parser = AlbertRosterFramesetParser(
+            engine=engine, prescan=prescan, tokenizer=tokenizer
+        )
+        if use_cache:
+            from .cache import ParseCache
+
+            (course, records) = ParseCache().parse(parser, infile)
+        else:
+            (course, records) = parser.parse_records(infile)
+    else:
+        from .parsers.html import AlbertRosterHtmlParser
+
+        parser = AlbertRosterHtmlParser(
+            engine=engine, prescan=prescan, tokenizer=tokenizer
+        )
+        # filled in as the roster is read
+        course = parser.course_data
+        if use_cache:
+            from .cache import ParseCache
+
+            records = ParseCache().iter_records(parser, infile)
+        else:
+            records = parser.iter_students(infile, vcards=False)
+    processor = _photo_processor(photo_size, photo_quality, photo_jobs)
+    if processor:
+        records = processor.process_students(records)
+    # Cards are printed and saved while the rest of the roster is parsed.
+    with processor or nullcontext(), _photo_store(photo_mode, photo_store) as store:
+        _output_cards(
+            records,
+            lambda student: parser.student_to_vcard(student, course),
+            pprint,
+            save,
+            save_dir,
+            bundle,
+            jobs,
+            photo_mode,
+            store,
+        )
     logger.debug("course: %s", repr(course))
-    logger.debug("students: %s", repr(students))
-    writer = VcardWriter(dirname=os.getcwd())
-    for card in students:
-        if pprint:
-            card.prettyPrint()
-        if save:
-            writer.write(card)
+    if processor:
+        click.echo(processor.summary(), err=True)
 
 
 @click.command()
@@ -123,6 +447,14 @@ def convert_all(infile, save, pprint):
     expose_value=False,
     callback=_set_loglevel,
 )
+@click.option(
+    "--bundle",
+    type=click.File("wb"),
+    default=None,
+    metavar="FILE",
+    help="also write all vCards to the single file FILE ('-' for standard "
+    "output, which turns off pretty-printing)",
+)
 @click.option("--save", is_flag=True, default=False, help="save vCards")
 @click.option(
     "--save-dir",
@@ -138,15 +470,40 @@ def convert_all(infile, save, pprint):
     default=True,
     help="pretty-print vCards to standard output",
 )
+@_parser_options
+@_photo_mode_options
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="threads that build, serialize and save cards while the roster "
+    "is parsed on a thread of its own (1: one card after the other)",
+)
 @click.argument(
     "infile",
     metavar="FILE",
     type=click.Path(exists=True),
     default="Access Class Rosters.html",
 )
+@_timing_options
 @log_on_start(logging.DEBUG, "{callable.__name__:s} begin")
 @log_on_end(logging.DEBUG, "{callable.__name__:s} end")
-def convert_all_from_frameset(infile, verbose, debug, save, save_dir, pprint):
+def convert_all_from_frameset(
+    infile,
+    bundle,
+    save,
+    save_dir,
+    pprint,
+    engine,
+    prescan,
+    tokenizer,
+    use_cache,
+    photo_mode,
+    photo_store,
+    jobs,
+):
     """Process a roster downloaded from Albert and generate vCards
 
     To create the source file:
@@ -166,26 +523,37 @@ def convert_all_from_frameset(infile, verbose, debug, save, save_dir, pprint):
 
       * Run this script on that html file.
 
-    To save vCards, use the --save option.
+    To save vCards, use the --save option.  To collect them in one file,
+    use the --bundle option.
 
     Then you can import the cards into your address book.
     """
-    loglevel = (
-        logging.DEBUG if debug else (logging.INFO if verbose else logging.WARNING)
+    from .parsers.html import AlbertRosterFramesetParser
+
+    parser = AlbertRosterFramesetParser(
+        engine=engine, prescan=prescan, tokenizer=tokenizer
     )
-    logging.basicConfig(level=loglevel)
-    parser = AlbertRosterFramesetParser()
-    (course, students) = parser.parse(infile)
-    # logging.debug('students: %s',repr(students))
+    if use_cache:
+        from .cache import ParseCache
+
+        (course, students) = ParseCache().parse(parser, infile)
+    else:
+        (course, students) = parser.parse_records(infile)
     # course info
     logger.debug("course: %s", repr(course))
     logger.debug("students: %s", repr(students))
-    writer = VcardWriter(dirname=save_dir)
-    for card in students:
-        if pprint:
-            card.prettyPrint()
-        if save:
-            writer.write(card)
+    with _photo_store(photo_mode, photo_store) as store:
+        _output_cards(
+            students,
+            lambda student: parser.student_to_vcard(student, course),
+            pprint,
+            save,
+            save_dir,
+            bundle,
+            jobs,
+            photo_mode,
+            store,
+        )
 
 
 @click.command()
@@ -216,20 +584,53 @@ def convert_all_from_frameset(infile, verbose, debug, save, save_dir, pprint):
     default=os.getcwd(),
     help="save images to this directory " + "(default: current directory)",
 )
+@click.option(
+    "--apkg",
+    type=click.Path(dir_okay=False),
+    default=None,
+    metavar="FILE",
+    help="write an Anki package to FILE instead of image files",
+)
+@click.option(
+    "--deck",
+    default=None,
+    metavar="NAME",
+    help="name of the deck in the Anki package (default: the course)",
+)
+@_parser_options
 @click.argument(
     "infile",
     metavar="FILE",
     type=click.Path(exists=True),
     default="Access Class Rosters.html",
 )
+@_photo_options
+@_timing_options
 @log_on_start(logging.DEBUG, "{callable.__name__:s} begin")
 @log_on_end(logging.DEBUG, "{callable.__name__:s} end")
-def convert_to_anki(infile, verbose, debug, save_dir):
-    """Process a roster downloaded from Albert and generate a set
-    of image files with student names.  These files can be imported to Anki
-    for making flashcards.
+def convert_to_anki(
+    infile,
+    save_dir,
+    apkg,
+    deck,
+    engine,
+    prescan,
+    tokenizer,
+    use_cache,
+    photo_size,
+    photo_quality,
+    photo_jobs,
+):
+    """Process a roster downloaded from Albert and generate flashcards of
+    the students' photos and names for Anki.
+
+    With the --apkg option, write an Anki package, with a card for each
+    student: the photo on the front, the name, program and course on the
+    back.  In Anki, choose File > Import and pick the package.  Importing a
+    later roster of the same course updates the students' cards.
 
-    To import:
+    Otherwise, save each photo as an image file named after the student.
+    To import those:
 
     0. Get Anki
     1. Install the Media Import add-on:
@@ -239,25 +640,53 @@ def convert_to_anki(infile, verbose, debug, save_dir):
     3. Rename "Media Import" to something useful
     4. Study.
 
+    Students without a photo are skipped.  Large photos can be shrunk with
+    the --photo-size option.
     """
-    # SOMEDAY: export an .apkg file or similar that can be imported easily.
-    loglevel = (
-        logging.DEBUG if debug else (logging.INFO if verbose else logging.WARNING)
-    )
-    logging.basicConfig(level=loglevel)
+    from .parsers.html import AlbertRosterHtmlParser
+    from .photos import copy_file
+
     log = logging.getLogger("convert_to_anki")
-    parser = AlbertRosterHtmlParser()
-    if not os.path.exists(save_dir):
-        os.mkdir(save_dir)
-    (course, students) = parser.parse(infile)
-    for card in students:
-        filename = os.path.join(save_dir, card.fn.value + ".jpg")
-        with open(filename, "wb") as f:
-            image = card.photo.value
-            if not image == "":
-                f.write(card.photo.value)
-            else:
-                log.warn("No photo found for student %s; skipping." % card.fn.value)
+    parser = AlbertRosterHtmlParser(
+        engine=engine, prescan=prescan, tokenizer=tokenizer
+    )
+    if use_cache:
+        from .cache import ParseCache
+
+        (course, students) = ParseCache().parse(parser, infile)
+    else:
+        (course, students) = parser.parse_records(infile)
+    processor = _photo_processor(photo_size, photo_quality, photo_jobs)
+    if processor:
+        students = processor.process_students(students)
+    # No vCards are built, and the photos are not read: they are linked or
+    # copied by the kernel, or streamed into the package.
+    records = (parser.student_record(student, course) for student in students)
+    with processor or nullcontext():
+        if apkg:
+            from .anki import AnkiPackageWriter
+
+            if not deck:
+                parts = [course.get("code"), course.get("term")]
+                deck = ", ".join(part for part in parts if part) or "Students"
+            with AnkiPackageWriter(apkg, deck) as writer:
+                for record in records:
+                    writer.write(record)
+            click.echo("%s: %s" % (apkg, writer.summary()), err=True)
+        else:
+            if not os.path.exists(save_dir):
+                os.mkdir(save_dir)
+            for record in records:
+                name = "%s %s" % (record.given_names, record.family_name)
+                if not record.photo:
+                    log.warning("No photo found for student %s; skipping.", name)
+                    continue
+                with timings.stage("photos") as timer:
+                    timer.add_bytes(
+                        copy_file(record.photo, os.path.join(save_dir, name + ".jpg"))
+                    )
+    if processor:
+        click.echo(processor.summary(), err=True)
 
 
 @click.command()
@@ -284,17 +713,18 @@ def convert_to_anki(infile, verbose, debug, save_dir):
 @click.option(
     "--output",
     "outfile",
-    type=click.File("wb"),
-    default=sys.stdout,
+    type=click.File("w"),
+    default="-",
     metavar="FILE",
     help="write to FILE (default: stdout)",
 )
 @click.argument(
     "infile", metavar="FILE", type=click.Path(exists=True), default="ps.csv"
 )
+@_timing_options
 @log_on_start(logging.DEBUG, "{callable.__name__:s} begin")
 @log_on_end(logging.DEBUG, "{callable.__name__:s} end")
-def convert_to_amccsv(infile, verbose, debug, outfile):
+def convert_to_amccsv(infile, outfile):
     """Process a CSV roster downloaded from Albert and generate a CSV file
     suitable for importing to auto-multiple-choice.
 
@@ -303,12 +733,10 @@ def convert_to_amccsv(infile, verbose, debug, outfile):
 
     See `convert_xls_to_amccsv`.
     """
-    loglevel = (
-        logging.DEBUG if debug else (logging.INFO if verbose else logging.WARNING)
-    )
-    logger.setLevel(loglevel)
+    from .writers import AmcCsvWriter
+
     with open(infile) as f:
-        students = csv.DictReader(f)
+        students = timings.timed_iter("parse rows", csv.DictReader(f))
         writer = AmcCsvWriter(outfile)
         writer.write(students)
 
@@ -337,21 +765,543 @@ def convert_to_amccsv(infile, verbose, debug, outfile):
 @click.option(
     "--output",
     "outfile",
-    type=click.File("wb"),
-    default=sys.stdout,
+    type=click.File("w"),
+    default="-",
     metavar="FILE",
     help="write to FILE (default: stdout)",
 )
+@_cache_option
+@click.option(
+    "--engine",
+    type=click.Choice(XLS_ENGINES),
+    default="iterparse",
+    show_default=True,
+    help="parser for the spreadsheet export",
+)
 @click.argument(
     "infile", metavar="FILE", type=click.Path(exists=True), default="ps.csv"
 )
+@_timing_options
 @log_on_start(logging.DEBUG, "{callable.__name__:s} begin")
 @log_on_end(logging.DEBUG, "{callable.__name__:s} end")
-def convert_xls_to_amccsv(infile, loglevel, outfile):
+def convert_xls_to_amccsv(infile, outfile, use_cache, engine):
     """Process an XLS roster downloaded from Albert and generate a CSV file
     suitable for importing to auto-multiple-choice.
 
     """
-    parser = AlbertRosterXlsParser()
-    (course, students) = parser.parse(infile)
-    VcardAmcCsvWriter(outfile).write(students)
+    from .parsers.html import AlbertRosterXlsParser
+    from .writers import AmcCsvWriter
+
+    parser = AlbertRosterXlsParser(engine=engine)
+    if use_cache:
+        from .cache import ParseCache
+
+        (course, students) = ParseCache().parse(parser, infile)
+    else:
+        # rows are converted as they are read
+        students = parser.iter_students(infile, vcards=False)
+    # The AMC columns come straight from the rows, without building vCards.
+    AmcCsvWriter(outfile).write(students)
+
+
+@click.command()
+@click.option(
+    "-d",
+    "--debug",
+    help="Show debugging statements",
+    is_flag=True,
+    flag_value=logging.DEBUG,
+    default=None,
+    expose_value=False,
+    callback=_set_loglevel,
+)
+@click.option(
+    "-v",
+    "--verbose",
+    help="Be verbose",
+    is_flag=True,
+    flag_value=logging.INFO,
+    default=None,
+    expose_value=False,
+    callback=_set_loglevel,
+)
+@click.option(
+    "--bundle",
+    type=click.File("wb"),
+    default=None,
+    metavar="FILE",
+    help="also write all vCards to the single file FILE ('-' for standard "
+    "output, which turns off pretty-printing)",
+)
+@click.option("--save", is_flag=True, default=False, help="save vCards")
+@click.option(
+    "--save-dir",
+    "save_dir",
+    type=click.Path(),
+    default=os.getcwd(),
+    help="save vCards to this directory " + "(default: current directory)",
+)
+@click.option(
+    "--print/--no-print",
+    "pprint",
+    is_flag=True,
+    default=True,
+    help="pretty-print vCards to standard output",
+)
+@click.option(
+    "--amc",
+    type=click.File("w"),
+    default=None,
+    metavar="FILE",
+    help="also write a CSV file for auto-multiple-choice to FILE "
+    "(spreadsheet and CSV rosters only)",
+)
+@click.option(
+    "--frame",
+    type=click.Path(dir_okay=False),
+    default=None,
+    metavar="FILE",
+    help="also write the students as a table to FILE, in Parquet (.parquet) "
+    "or Feather (.feather) format; needs pandas and pyarrow",
+)
+@_parser_options
+@_photo_mode_options
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="threads that build, serialize and save cards while the roster "
+    "is parsed on a thread of its own (1: one card after the other)",
+)
+@click.argument("infile", metavar="FILE", type=click.Path(exists=True))
+@_timing_options
+@log_on_start(logging.DEBUG, "{callable.__name__:s} begin")
+@log_on_end(logging.DEBUG, "{callable.__name__:s} end")
+def convert_auto(
+    infile,
+    bundle,
+    save,
+    save_dir,
+    pprint,
+    amc,
+    frame,
+    engine,
+    prescan,
+    tokenizer,
+    use_cache,
+    photo_mode,
+    photo_store,
+    jobs,
+):
+    """Process any roster downloaded from Albert and generate vCards
+
+    FILE may be the saved frameset page, the roster page itself, the
+    `ps.xls` spreadsheet export, or a CSV copy of that export.  Its kind is
+    recognized from the first few kilobytes, before anything is parsed.
+
+    The output options are those of the other commands.
+    """
+    from .frames import frame_format, write_frame
+    from .sniff import make_parser, sniff
+    from .writers import AmcCsvWriter
+
+    kind = sniff(infile)
+    if kind is None:
+        raise click.UsageError("cannot tell what kind of roster %s is" % infile)
+    if amc and kind not in ("xls", "csv"):
+        raise click.UsageError(
+            "--amc needs a spreadsheet or CSV roster; %s is a %s roster"
+            % (infile, kind)
+        )
+    if frame:
+        try:
+            frame_format(frame)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--frame")
+    logger.info("%s is a %s roster", infile, kind)
+    parser = make_parser(kind, engine=engine, prescan=prescan, tokenizer=tokenizer)
+    if use_cache:
+        from .cache import ParseCache
+
+        (course, students) = ParseCache().parse(parser, infile)
+    else:
+        (course, students) = parser.parse_records(infile)
+    if amc:
+        AmcCsvWriter(amc).write(students)
+    if frame:
+        write_frame(parser.student_frame(course, students), frame)
+    with _photo_store(photo_mode, photo_store) as store:
+        _output_cards(
+            students,
+            lambda student: parser.student_to_vcard(student, course),
+            pprint,
+            save,
+            save_dir,
+            bundle,
+            jobs,
+            photo_mode,
+            store,
+        )
+
+
+@click.command()
+@click.option(
+    "-d",
+    "--debug",
+    help="Show debugging statements",
+    is_flag=True,
+    flag_value=logging.DEBUG,
+    default=None,
+    expose_value=False,
+    callback=_set_loglevel,
+)
+@click.option(
+    "-v",
+    "--verbose",
+    help="Be verbose",
+    is_flag=True,
+    flag_value=logging.INFO,
+    default=None,
+    expose_value=False,
+    callback=_set_loglevel,
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    show_default=True,
+    help="number of worker processes",
+)
+@click.option(
+    "--output-dir",
+    "output_dir",
+    type=click.Path(file_okay=False),
+    default=os.getcwd(),
+    help="write each roster's output under this directory "
+    + "(default: current directory)",
+)
+@_parser_options(cache=False)
+@click.option(
+    "--watch",
+    is_flag=True,
+    default=False,
+    help="keep running, and convert each roster saved or changed under "
+    "DIR... once it has stopped changing",
+)
+@click.option(
+    "--settle",
+    type=click.FloatRange(min=0),
+    default=2.0,
+    show_default=True,
+    metavar="SECONDS",
+    help="with --watch, wait until a roster has not changed for SECONDS",
+)
+@click.option(
+    "--poll",
+    is_flag=True,
+    default=False,
+    help="with --watch, look for changes every second instead of using "
+    "inotify",
+)
+@click.option(
+    "--merge",
+    is_flag=True,
+    default=False,
+    help="write one vCard per student, listing all of the student's courses, "
+    "to the output directory",
+)
+@_photo_mode_options
+@click.argument(
+    "dirnames",
+    metavar="DIR...",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, file_okay=False),
+)
+@_timing_options
+@log_on_start(logging.DEBUG, "{callable.__name__:s} begin")
+@log_on_end(logging.DEBUG, "{callable.__name__:s} end")
+def convert_batch(
+    dirnames, jobs, output_dir, engine, prescan, tokenizer, watch, settle, poll, merge,
+    photo_mode, photo_store,
+):  # fmt: skip
+    """Convert every roster found under the directories DIR...
+
+    Roster pages, framesets of roster pages, and `ps.xls` exports are
+    recognized.  The vCards of each roster are written to a directory under
+    the output directory named after the roster file, e.g.
+    `Spring/MATH-UA 122/Access Class Rosters.html/`.  Spreadsheet exports also
+    get an `amc.csv` file for auto-multiple-choice.
+
+    The output does not depend on the number of jobs.
+
+    With --watch, only the rosters that changed since the last watch are
+    converted, and then the command keeps running, converting each roster
+    as it is saved or changed, until interrupted.  Adding a section does
+    not convert the others again.
+
+    With --merge, the rosters are combined instead: each student gets one
+    vCard in the output directory, listing every course the student is on
+    a roster of.  Students are matched by N-number, EMPLID or email.
+    """
+    from .batch import find_rosters, merge_batch, run_batch
+
+    if watch:
+        from .watch import RosterWatch
+
+        with RosterWatch(
+            dirnames, output_dir, engine=engine, prescan=prescan,
+            tokenizer=tokenizer, settle=settle, poll=poll, photo_mode=photo_mode,
+            photo_store=photo_store,
+        ) as roster_watch:  # fmt: skip
+            click.echo("watching %s; press Ctrl-C to stop" % ", ".join(dirnames))
+            try:
+                roster_watch.run(_echo_result)
+            except KeyboardInterrupt:
+                click.echo("stopped watching")
+        return
+    rosters = find_rosters(dirnames)
+    if merge:
+        start = time.perf_counter()
+        (results, index, summary) = merge_batch(
+            rosters, output_dir, jobs=jobs, engine=engine, prescan=prescan,
+            tokenizer=tokenizer, photo_mode=photo_mode, photo_store=photo_store,
+        )  # fmt: skip
+        elapsed = time.perf_counter() - start
+        failures = 0
+        for result in results:
+            _echo_result(result)
+            failures += result.error is not None
+        click.echo(
+            "%d rosters, %d failed, %d records of %d students in %.2f s: %s"
+            % (len(results), failures, index.records, len(index), elapsed, summary)
+        )
+        if failures:
+            sys.exit(1)
+        return
+    collector = timings.current()
+    start = time.perf_counter()
+    results = run_batch(
+        rosters, output_dir, jobs=jobs, engine=engine, prescan=prescan,
+        tokenizer=tokenizer, collect_timings=collector is not None,
+        photo_mode=photo_mode, photo_store=photo_store,
+    )  # fmt: skip
+    elapsed = time.perf_counter() - start
+    if collector is not None:
+        # summed over the jobs, so the stages may add up to more than the
+        # wall time
+        for result in results:
+            collector.merge(result.timings or {})
+    students = 0
+    failures = 0
+    for result in results:
+        _echo_result(result)
+        if result.error is None:
+            students += result.students
+        else:
+            failures += 1
+    click.echo(
+        "%d rosters, %d failed, %d students in %.2f s "
+        "(%.1f rosters/s, %.0f students/s, %d jobs)"
+        % (
+            len(results),
+            failures,
+            students,
+            elapsed,
+            len(results) / elapsed if elapsed else 0,
+            students / elapsed if elapsed else 0,
+            jobs,
+        )
+    )
+    if failures:
+        sys.exit(1)
+
+
+@click.command()
+@click.option(
+    "-d",
+    "--debug",
+    help="Show debugging statements",
+    is_flag=True,
+    flag_value=logging.DEBUG,
+    default=None,
+    expose_value=False,
+    callback=_set_loglevel,
+)
+@click.option(
+    "-v",
+    "--verbose",
+    help="Be verbose",
+    is_flag=True,
+    flag_value=logging.INFO,
+    default=None,
+    expose_value=False,
+    callback=_set_loglevel,
+)
+@click.option(
+    "--host",
+    default="127.0.0.1",
+    show_default=True,
+    help="address to listen on",
+)
+@click.option(
+    "--port",
+    type=click.IntRange(0, 65535),
+    default=8750,
+    show_default=True,
+    help="port to listen on (0: any free port)",
+)
+@click.option(
+    "-j",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="worker processes that convert rosters (default: number of CPUs)",
+)
+@click.option(
+    "--max-concurrent",
+    type=click.IntRange(min=1),
+    default=None,
+    help="conversions running or waiting at once; more are turned away "
+    "(default: twice the number of workers)",
+)
+@click.option(
+    "--max-upload",
+    type=click.IntRange(min=1),
+    default=64,
+    show_default=True,
+    metavar="MB",
+    help="largest upload accepted, in megabytes",
+)
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    default=60.0,
+    show_default=True,
+    metavar="SECONDS",
+    help="longest a conversion may take",
+)
+@_parser_options(cache=False)
+@log_on_start(logging.DEBUG, "{callable.__name__:s} begin")
+@log_on_end(logging.DEBUG, "{callable.__name__:s} end")
+def serve_conversions(
+    host, port, workers, max_concurrent, max_upload, timeout, engine, prescan,
+    tokenizer,
+):  # fmt: skip
+    """Convert uploaded rosters over HTTP
+
+    Starts a local HTTP server whose worker processes have the parsers
+    loaded and ready, so that a tool converting many uploads does not pay
+    for starting `ps2vcard` each time.  POST a roster (a page, a saved page
+    zipped with its `_files` directory, a `ps.xls` export or a CSV export)
+    to /convert to get its vCards back; add `?format=zip` for a zip of one
+    file per card, or `?format=amc` for an auto-multiple-choice CSV file.
+    GET /metrics for the request counts and timings.
+
+    See `ps2vcard.serve` for the details.
+    """
+    from .serve import ConversionServer
+
+    server = ConversionServer(
+        (host, port), workers=workers, max_concurrent=max_concurrent,
+        max_upload=max_upload * 1024 * 1024, timeout=timeout, engine=engine,
+        prescan=prescan, tokenizer=tokenizer,
+    )  # fmt: skip
+    click.echo(
+        "serving on %s with %d workers; press Ctrl-C to stop"
+        % (server.url, server.workers)
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        click.echo("stopped serving")
+    finally:
+        server.server_close()
+
+
+def _echo_result(result):
+    "Print a line about the `RosterResult` of a batch conversion"
+    if result.error is None:
+        click.echo(
+            "ok      %s (%s): %d students (%s) -> %s"
+            % (result.path, result.kind, result.students, result.written,
+               result.outdir)
+        )
+    else:
+        click.echo("FAILED  %s (%s): %s" % (result.path, result.kind, result.error))
+
+
+class DefaultGroup(click.Group):
+    """A command group that falls back on a default subcommand.
+
+    If the first argument is not the name of a subcommand, the default one
+    runs, so that `ps2vcard FILE` works as it always has.
+    """
+
+    def __init__(self, *args, default_command=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        if not args or (args[0] not in self.commands and args[0] != "--help"):
+            args.insert(0, self.default_command)
+        return super().parse_args(ctx, args)
+
+
+@click.group()
+def cache():
+    """Manage the parse cache"""
+
+
+@cache.command()
+def clear():
+    """Remove every entry from the parse cache"""
+    from .cache import ParseCache
+
+    parse_cache = ParseCache()
+    count = parse_cache.clear()
+    click.echo("removed %d entries from %s" % (count, parse_cache.dirname))
+
+
+@cache.command()
+def info():
+    """Show the location and size of the parse cache"""
+    from .cache import ParseCache
+
+    parse_cache = ParseCache()
+    entries = parse_cache.entries()
+    click.echo(
+        "%s: %d entries, %d bytes (limit %d)"
+        % (
+            parse_cache.dirname,
+            len(entries),
+            sum(size for (path, size, mtime) in entries),
+            parse_cache.max_bytes,
+        )
+    )
+
+
+@click.group(cls=DefaultGroup, default_command="roster")
+def main():
+    """Convert Albert rosters to vCards
+
+    Without a command, FILE is converted as by `ps2vcard roster FILE`.
+
+    The older scripts run the same commands: `ps2vcard-old` is
+    `ps2vcard frameset`, `ps2anki` is `ps2vcard anki`, `ps2amc` is
+    `ps2vcard amc` and `psxls2amc` is `ps2vcard xls2amc`.
+    """
+
+
+main.add_command(convert_all, name="roster")
+main.add_command(convert_all_from_frameset, name="frameset")
+main.add_command(convert_to_anki, name="anki")
+main.add_command(convert_to_amccsv, name="amc")
+main.add_command(convert_xls_to_amccsv, name="xls2amc")
+main.add_command(convert_auto, name="auto")
+main.add_command(convert_batch, name="batch")
+main.add_command(serve_conversions, name="serve")
+main.add_command(cache)
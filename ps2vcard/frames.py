@@ -0,0 +1,157 @@
+"""
+Rosters as data frames
+
+Reading students back out of thousands of `.vcf` files is slow.  The
+`to_frame` method of each roster parser returns the students as a
+`pandas.DataFrame` instead, with one row per student and the columns of
+`FRAME_COLUMNS`.  Names, email addresses, N-numbers and programs are split
+with vectorized string operations on whole columns, not student by
+student.  The values that repeat within a section are categorical.
+
+`write_frame` saves a frame as Parquet or Feather, and `read_frame` loads
+it back; a few columnar files load tens of thousands of students in
+milliseconds.  pandas_ (and pyarrow_ for the files) are optional.
+
+.. _pandas: https://pandas.pydata.org/
+.. _pyarrow: https://arrow.apache.org/docs/python/
+"""
+
+from ps2vcard.timings import timed
+
+FRAME_COLUMNS = [
+    "nnumber",
+    "family_name",
+    "given_names",
+    "email",
+    "netid",
+    "org",
+    "program",
+    "plan",
+    "level",
+    "course",
+    "photo",
+]
+CATEGORIES = ["org", "program", "plan", "level", "course"]
+STRINGS = ["nnumber", "family_name", "given_names", "email", "netid", "photo"]
+
+FRAME_FORMATS = {".parquet": "parquet", ".pq": "parquet", ".feather": "feather"}
+
+# the fields of the roster page and of `ps.xls` the frame is made from
+HTML_FIELDS = {"name": "name", "email": "email", "progplan": "progplan",
+               "level": "level", "photo": "photo"}  # fmt: skip
+XLS_FIELDS = {"Campus ID": "nnumber", "Name": "name", "Email Address": "email",
+              "Program and Plan": "progplan", "Level": "level",
+              "Subject": "subject", "Catalog": "catalog",
+              "Section": "section"}  # fmt: skip
+
+
+def import_pandas():
+    try:
+        import pandas
+    except ImportError:
+        raise ImportError(
+            "data frames need pandas: try `pip install pandas pyarrow`"
+        ) from None
+    return pandas
+
+
+def raw_frame(students, fields):
+    """Return a frame of the `fields` of the student dictionaries, renamed
+    to their values."""
+    pandas = import_pandas()
+    columns = {
+        name: [student.get(field) for student in students]
+        for (field, name) in fields.items()
+    }
+    # the "string" type keeps missing values missing; "str" makes them "nan"
+    return pandas.DataFrame(columns, dtype="string")
+
+
+def split_columns(raw, org, course):
+    """Return the student frame made from the columns of `raw`.
+
+    `org` and `course` are Series, or values for every row.
+    """
+    pandas = import_pandas()
+    if raw.empty:
+        return typed(pandas.DataFrame(columns=FRAME_COLUMNS))
+    names = raw["name"].str.split(",", n=1, expand=True)
+    progplans = raw["progplan"].str.split(r" - \n+", n=1, regex=True, expand=True)
+    nnumbers = raw["nnumber"] if "nnumber" in raw else None
+    if nnumbers is not None:
+        nnumbers = nnumbers.str.strip().str.upper()
+    frame = pandas.DataFrame(
+        {
+            "nnumber": nnumbers,
+            "family_name": names[0],
+            "given_names": names[1] if 1 in names else None,
+            "email": raw["email"],
+            "netid": raw["email"].str.partition("@")[0],
+            "org": org,
+            "program": progplans[0],
+            "plan": progplans[1] if 1 in progplans else None,
+            "level": raw["level"],
+            "course": course,
+            "photo": raw["photo"] if "photo" in raw else None,
+        },
+        index=pandas.RangeIndex(len(raw)),
+        columns=FRAME_COLUMNS,
+    )
+    return typed(frame)
+
+
+def typed(frame):
+    """Give the columns of a student frame their types."""
+    # Categories of plain objects, which is what Parquet and Feather give
+    # back, rather than of strings.
+    return frame.astype(
+        {
+            **{column: "string" for column in STRINGS},
+            **{column: "object" for column in CATEGORIES},
+        }
+    ).astype({column: "category" for column in CATEGORIES})
+
+
+@timed("frame")
+def html_frame(course, students):
+    """Return the frame of the student dictionaries of a roster page."""
+    raw = raw_frame(students, HTML_FIELDS)
+    return split_columns(raw, course["org"], course["code"] + ", " + course["term"])
+
+
+@timed("frame")
+def xls_frame(students):
+    """Return the frame of the rows of a `ps.xls` export."""
+    from ps2vcard.records import ORG
+
+    raw = raw_frame(students, XLS_FIELDS)
+    catalogs = raw["catalog"].str.strip().astype("int64").astype("string")
+    sections = raw["section"].str.strip().astype("int64").astype("string")
+    course = raw["subject"] + " " + catalogs + " - " + sections.str.zfill(3)
+    return split_columns(raw, ORG, course)
+
+
+def frame_format(path):
+    """Return the format of a frame file, from the suffix of `path`."""
+    for (suffix, name) in FRAME_FORMATS.items():
+        if path.lower().endswith(suffix):
+            return name
+    raise ValueError(
+        "unknown frame format: %s (use %s)" % (path, ", ".join(FRAME_FORMATS))
+    )
+
+
+def write_frame(frame, path):
+    """Write `frame` to `path` as Parquet or Feather, by its suffix."""
+    if frame_format(path) == "parquet":
+        frame.to_parquet(path, index=False)
+    else:
+        frame.reset_index(drop=True).to_feather(path)
+
+
+def read_frame(path):
+    """Read a frame written by `write_frame`."""
+    pandas = import_pandas()
+    if frame_format(path) == "parquet":
+        return pandas.read_parquet(path)
+    return pandas.read_feather(path)
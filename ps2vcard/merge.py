@@ -0,0 +1,106 @@
+"""
+One card per student across many rosters
+
+A student enrolled in two sections is on two rosters, and gets two cards
+with the same name and file name, each with one course; saved to the same
+directory, the second replaces the first.  A `StudentIndex` gathers the
+records of every roster of a run into one `MergedStudent` per student, and
+makes a card listing all of the student's courses, as related names
+`item1`, `item2`, ...
+
+Students are matched by N-number (`X-NYU-NNUMBER`, from the spreadsheet
+export), by EMPLID (from the roster page), or by email address, which both
+kinds of roster list.  Each record is looked up with a few dictionary
+lookups, so merging takes time and memory linear in the number of
+records, however many rosters there are.
+"""
+
+import copy
+
+from ps2vcard.records import student_card
+
+
+def student_keys(record):
+    """Return the keys a `StudentRecord` is indexed by."""
+    keys = []
+    if record.nnumber:
+        keys.append(("nnumber", record.nnumber.strip().upper()))
+    if record.emplid:
+        keys.append(("emplid", record.emplid.strip()))
+    if record.email:
+        keys.append(("email", record.email.strip().lower()))
+    return keys
+
+
+class MergedStudent(object):
+    """The records of one student, from one or more rosters.
+
+    `record` is the first record of the student, with the fields it lacks
+    (the N-number, the EMPLID, the photo...) taken from the later ones.
+    `courses` are the student's courses, in the order they were found.
+    """
+
+    __slots__ = ("record", "_courses")
+
+    def __init__(self, record):
+        self.record = copy.copy(record)
+        self._courses = {record.course: None}
+
+    def add(self, record):
+        """merge another record of the student."""
+        for name in record.__slots__:
+            if not getattr(self.record, name) and getattr(record, name):
+                setattr(self.record, name, getattr(record, name))
+        self._courses.setdefault(record.course, None)
+
+    @property
+    def courses(self):
+        return list(self._courses)
+
+    def card(self):
+        """Return the vCard of the student, with all the courses."""
+        return student_card(self.record, courses=self.courses)
+
+
+class StudentIndex(object):
+    """An index of the students of many rosters.
+
+    `add` each `StudentRecord`; `students` is then the list of
+    `MergedStudent`s, in the order the students were first found.
+    """
+
+    def __init__(self):
+        self.students = []
+        self.records = 0
+        self._by_key = {}
+
+    def __len__(self):
+        return len(self.students)
+
+    def add(self, record):
+        """add `record` to the index, and return its `MergedStudent`."""
+        self.records += 1
+        keys = student_keys(record)
+        student = None
+        for key in keys:
+            student = self._by_key.get(key)
+            if student is not None:
+                break
+        if student is None:
+            student = MergedStudent(record)
+            self.students.append(student)
+        else:
+            student.add(record)
+        for key in keys:
+            self._by_key.setdefault(key, student)
+        return student
+
+    def update(self, records):
+        """add each of `records` to the index."""
+        for record in records:
+            self.add(record)
+
+    def cards(self):
+        """Yield the card of each student."""
+        for student in self.students:
+            yield student.card()
@@ -1,9 +1,32 @@
+from functools import lru_cache
 import re
+import sys
 
+# Stamp for parsed records stored in the parse cache.  Bump it whenever a
+# parser changes the records it produces.
+#
+# 2: roster pages are decoded with the charset they declare, and photos in
+# "win0div" cells are found
+PARSER_VERSION = 2
+
+# The state machine engines of the HTML parsers and the engines of the
+# `ps.xls` parser, kept here so that the command line can offer them
+# without importing the parsers.
+HTML_ENGINES = ["table", "machine"]
+XLS_ENGINES = ["iterparse", "soup"]
+# the tokenizers of the HTML parsers (see `ps2vcard.parsers.tokenizers`)
+HTML_TOKENIZERS = ["stdlib", "lxml"]
+
+progplan_pattern = re.compile(" - \n+")
+
+
+# A section has a few dozen distinct program strings at most, repeated for
+# every student, so each is split once and its parts are shared.
+@lru_cache(maxsize=1024)
 def unpack_progplan(progplan):
     """unpack a `progplan` string into program and plan.
 
-    >>> unpack_progplan("UA-Coll of Arts & Sci - \n\nUndecided")
-    ['UA-Coll of Arts & Sci','Undecided']
+    >>> unpack_progplan("UA-Coll of Arts & Sci - \\n\\nUndecided")
+    ('UA-Coll of Arts & Sci', 'Undecided')
     """
-    return re.split(" - \n+", progplan)
+    return tuple(sys.intern(part) for part in progplan_pattern.split(progplan))
@@ -1,39 +1,28 @@
 import csv
 
-import vobject
-
-from ps2vcard.parsers import unpack_progplan
-
-
-class AlbertRosterCsvParser(object):
-    """Class to parse CSV files downloaded from Albert"""
-
-    def student_to_vcard(student, course):
-        """convert a single student dictionary to a vCard."""
-        card = vobject.vCard()
-        course["org"] = "New York University"
-        (family_name, given_names) = student["Name"].split(",")
-        card.add("n").value = vobject.vcard.Name(family=family_name, given=given_names)
-        # full name
-        card.add("fn").value = "%s %s" % (given_names, family_name)
-        # email
-        card.add("email")
-        card.email.value = student["email"]
-        card.email.type_param = "INTERNET"
-        # student info
-        card.add("title").value = "Student"
-        (student_program, student_plan) = unpack_progplan(student["Program and Plan"])
-        card.add("org").value = [course["org"], student_program]
-        card.add("X-NYU-PROGPLAN").value = " - ".join([student_program, student_plan])
-        card.add("X-NYU-NNUMBER").value = student["Campus ID"]
-        item = "item1"
-        card.add(item + ".X-ABLABEL").value = "course"
-        card.add(item + ".X-ABRELATEDNAMES").value = "%s %d - %03d" % (
-            student["Subject"],
-            int(student["Catalog"]),
-            int(student["Section"]),
-        )
-        return card
+from ps2vcard.parsers.html import AlbertRosterXlsParser
+from ps2vcard.records import ORG
+
+
+class AlbertRosterCsvParser(AlbertRosterXlsParser):
+    """Class to parse a roster saved as CSV, with the columns of `ps.xls`
+
+    Albert itself does not offer CSV, but a `ps.xls` opened in a spreadsheet
+    can be saved as one.  Line breaks in a cell may be written as `\\n`
+    escapes, as in `tests/data/ps.csv`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # the engines of `ps.xls` do not read CSV
+        self.options = {}
+
+    def rows(self, input_path):
+        """yield the rows of a CSV roster."""
+        with open(input_path, newline="") as f:
+            for row in csv.DictReader(f):
+                row["Program and Plan"] = row["Program and Plan"].replace("\\n", "\n")
+                yield row
 
     def parse(self, input_file):
         """parse an Albert Class Roster frame CSV file
@@ -41,13 +30,9 @@ class AlbertRosterCsvParser(object):
 
         Return a tuple `(course,students)`, where `course` is a dictionary
         of course (i.e., section) properties, and `students` is a list of
-        dictionaries of student properties.
+        vCards.
         """
-        with open(input_file) as f:
-            self.student_vcards = []
-            self.course_data = {}
-            for student in csv.DictReader(f):
-                self.student_vcards.append(
-                    self.student_to_vcard(student, self.course_data)
-                )
+        students = self.parse_records(input_file)[1]
+        self.course_data = {"org": ORG}
+        self.student_vcards = [self.student_to_vcard(student) for student in students]
         return (self.course_data, self.student_vcards)
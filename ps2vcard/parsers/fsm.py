@@ -0,0 +1,127 @@
+"""
+Table-driven finite state machine engine
+
+The `transitions`_ library resolves triggers, conditions and callbacks by
+name, builds an event object and runs its hooks every time an event fires.
+The roster parsers fire an event for every attribute of every tag, and their
+machines never change once the class is defined, so most of that work is
+repeated for nothing.
+
+A `TransitionTable` takes the same transition specifications that
+`transitions.Machine.add_transition` accepts, compiles them once into a
+table indexed by trigger and source state, and then binds the callbacks of a
+model object to it.  Triggering an event is a dictionary lookup followed by
+direct calls to the bound callbacks.
+
+A failed trigger raises `transitions.core.MachineError`, as the machine
+would.  `transitions` itself is only imported then, so the table engine
+does not pay for importing it; `MachineError` is also available from this
+module.
+
+.. _transitions: https://github.com/pytransitions/transitions
+"""
+
+
+def __getattr__(name):
+    if name == "MachineError":
+        from transitions.core import MachineError
+
+        return MachineError
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+class TransitionTable(object):
+    """A compiled table of state transitions.
+
+    `transitions` is a list of dictionaries with the keys `trigger`,
+    `source`, `dest`, and optionally `conditions`, `prepare`, `before`,
+    and `after`, with the same meanings as in `transitions.Machine`.
+    Callbacks and conditions are given as method names of the model.
+    """
+
+    callback_keys = ("prepare", "conditions", "before", "after")
+
+    def __init__(self, states, transitions):
+        self.states = list(states)
+        # trigger -> source -> list of (prepare, conditions, before, dest, after)
+        self.table = {}
+        for transition in transitions:
+            self.add_transition(**transition)
+
+    def add_transition(self, trigger, source, dest, **callbacks):
+        unknown = set(callbacks) - set(self.callback_keys)
+        if unknown:
+            raise ValueError("unsupported transition keys: %s" % sorted(unknown))
+        if dest not in self.states:
+            raise ValueError("unknown destination state: %s" % dest)
+        row = [_as_tuple(callbacks.get(key)) for key in self.callback_keys]
+        row.insert(3, dest)
+        sources = [source] if isinstance(source, str) else source
+        for source in sources:
+            if source not in self.states:
+                raise ValueError("unknown source state: %s" % source)
+            self.table.setdefault(trigger, {}).setdefault(source, []).append(
+                tuple(row)
+            )
+
+    def bind(self, model, initial):
+        """Install the trigger methods of this table on `model`.
+
+        The current state is kept in `model.state`, as `transitions` does.
+        """
+        model.state = initial
+        for trigger, sources in self.table.items():
+            bound = {
+                source: [_bind_row(model, row) for row in rows]
+                for source, rows in sources.items()
+            }
+            setattr(model, trigger, _make_trigger(model, trigger, bound))
+        return model
+
+
+def _as_tuple(names):
+    if names is None:
+        return ()
+    if isinstance(names, str):
+        return (names,)
+    return tuple(names)
+
+
+def _bind_row(model, row):
+    (prepare, conditions, before, dest, after) = row
+    return (
+        [getattr(model, name) for name in prepare],
+        [getattr(model, name) for name in conditions],
+        [getattr(model, name) for name in before],
+        dest,
+        [getattr(model, name) for name in after],
+    )
+
+
+def _make_trigger(model, trigger, bound):
+    def fire(*args):
+        try:
+            rows = bound[model.state]
+        except KeyError:
+            from transitions.core import MachineError
+
+            raise MachineError(
+                "Can't trigger event %s from state %s!" % (trigger, model.state)
+            )
+        for prepare, conditions, before, dest, after in rows:
+            for callback in prepare:
+                callback(*args)
+            for condition in conditions:
+                if not condition(*args):
+                    break
+            else:
+                for callback in before:
+                    callback(*args)
+                model.state = dest
+                for callback in after:
+                    callback(*args)
+                return True
+        return False
+
+    fire.__name__ = trigger
+    return fire
@@ -1,29 +1,44 @@
 import re
 import os
+import sys
 from collections import defaultdict
 
 from html.parser import HTMLParser
 from html.entities import entitydefs
 
-from bs4 import BeautifulSoup
-from transitions import Machine
-from transitions.core import MachineError
-import vobject
-
+# BeautifulSoup, lxml and transitions are imported by the engines that use
+# them, so that a command pays only for the parser it runs.
 
 import logging
 from logdecorator import log_on_start, log_on_end
 
-from ps2vcard.parsers import unpack_progplan
+from ps2vcard import timings
+from ps2vcard.frames import html_frame, xls_frame
+from ps2vcard.parsers import HTML_ENGINES, XLS_ENGINES, fsm
+from ps2vcard.parsers.fsm import TransitionTable
+from ps2vcard.parsers.prescan import file_encoding, iter_regions
+from ps2vcard.parsers.tokenizers import make_tokenizer
+from ps2vcard.records import StudentRecord, student_card
 
 
 logger = logging.getLogger(__name__)
 
 
 class AlbertRosterFramesetParser(HTMLParser):
-    def __init__(self):
+    # The frameset is read in chunks of this many characters, until the
+    # TargetContent frame turns up.
+    chunk_size = 4 * 1024
+
+    def __init__(self, engine="table", prescan=False, tokenizer="stdlib"):
         HTMLParser.__init__(self)
         self.roster_frame = None
+        # The frameset is small, and is read only up to the TargetContent
+        # frame, so the stdlib tokenizer reads it; `tokenizer` is for the
+        # roster page.
+        self.subparser = AlbertRosterHtmlParser(
+            engine=engine, prescan=prescan, tokenizer=tokenizer
+        )
+        self.options = self.subparser.options
 
     def handle_starttag(self, tag, attrs):
         logger.debug("tag: %s" % tag)
@@ -38,31 +53,84 @@ class AlbertRosterFramesetParser(HTMLParser):
             and attr_dict["name"] == "TargetContent"
         ):
             self.roster_frame = os.path.join(self.base_dir, attr_dict["src"])
-            self.subparser = AlbertRosterHtmlParser()
-            self.subparser.base_dir = os.path.dirname(self.roster_frame)
-            self.subparser.parse(self.roster_frame)
 
-    def parse(self, infile):
+    def parse_records(self, infile):
         """parse an Albert Class Roster frameset HTML file
         for course and student information
 
         First looks for the TargetContent frame, then parses that with
-        a AlbertRosterHtmlParser.
+        a AlbertRosterHtmlParser.  The rest of the frameset is not read.
 
         Return a tuple `(course,students)`, where `course` is a dictionary
         of course (i.e., section) properties, and `students` is a list of
-        vCards.
+        dictionaries of student properties.
         """
         logger.debug("file: %s", infile)
         self.base_dir = os.path.dirname(infile)
-        with open(infile, "r") as f:
-            data = f.read()
-            # log.debug('data: %s',data)
-            self.feed(data)
-        return (self.subparser.course_data, self.subparser.student_vcards)
+        with open(infile, "r", encoding=file_encoding(infile), errors="replace") as f:
+            chunks = iter(lambda: f.read(self.chunk_size), "")
+            for data in timings.timed_iter("read", chunks, size=len):
+                with timings.stage("tokenize"):
+                    self.feed(data)
+                if self.roster_frame:
+                    break
+        if self.roster_frame:
+            self.subparser.parse_records(self.roster_frame)
+        else:
+            logger.warning("no TargetContent frame in %s", infile)
+        return (
+            self.subparser.course_data,
+            list(self.subparser.student_records.values()),
+        )
+
+    def parse(self, infile):
+        """parse an Albert Class Roster frameset HTML file
+        for course and student information
+
+        Return a tuple `(course,students)`, where `course` is a dictionary
+        of course (i.e., section) properties, and `students` is a list of
+        vCards.
+        """
+        (course, students) = self.parse_records(infile)
+        self.student_vcards = [
+            self.student_to_vcard(student, course) for student in students
+        ]
+        return (course, self.student_vcards)
+
+    def parse_students(self, infile):
+        """parse an Albert Class Roster frameset HTML file
+
+        Return a tuple `(course,students)`, where `students` is a list of
+        `StudentRecord`.
+        """
+        (course, students) = self.parse_records(infile)
+        return (course, [self.student_record(student, course) for student in students])
+
+    def to_frame(self, infile):
+        """parse an Albert Class Roster frameset HTML file into a
+        `pandas.DataFrame` of students (see `ps2vcard.frames`)."""
+        return self.student_frame(*self.parse_records(infile))
+
+    def student_frame(self, course, students):
+        """convert student dictionaries to a `pandas.DataFrame`."""
+        return self.subparser.student_frame(course, students)
+
+    def student_record(self, student, course):
+        """convert a single student dictionary to a `StudentRecord`."""
+        return self.subparser.student_record(student, course)
+
+    def student_to_vcard(self, student, course):
+        """convert a single student record to a vCard object."""
+        return self.subparser.student_to_vcard(student, course)
+
+    def dependencies(self, students):
+        """list the files other than the frameset that `students` came from"""
+        if self.roster_frame is None:
+            return []
+        return [self.roster_frame] + self.subparser.dependencies(students)
 
 
-class AlbertRosterHtmlParser(HTMLParser, Machine):
+class AlbertRosterHtmlParser(HTMLParser):
     student_keys_dict = {
         "CLASS_ROSTER_VW_EMPLID": "id",
         "SCC_PRFPRIMNMVW_NAME": "name",
@@ -82,25 +150,95 @@ class AlbertRosterHtmlParser(HTMLParser, Machine):
         "MTG_DATE$0": "dates",
     }
     photo_key = "win10divEMPL_PHOTO_EMPLOYEE_PHOTO"
-
-    def __init__(self):
+    # older pages, like the one in tests/data, number the photo cells "win0"
+    photo_keys = frozenset([photo_key, "win0divEMPL_PHOTO_EMPLOYEE_PHOTO"])
+    # student values shared by many students of a section
+    interned_keys = frozenset(["progplan", "level", "status"])
+
+    states = [
+        "seeking_key",
+        "found_course_key",
+        "found_student_key",
+        "seeking_student_data",
+        "seeking_course_data",
+        "seeking_student_image",
+    ]
+    engines = HTML_ENGINES
+    chunk_size = 64 * 1024
+    attr_value_pattern = re.compile(r"([^$]*)\$(\d+)$")
+
+    def __init__(self, engine="table", prescan=False, tokenizer="stdlib"):
         self.course_data = defaultdict(dict)
         self.student_records = defaultdict(dict)
         HTMLParser.__init__(self)
+        # the options, for the keys of the parse cache
+        self.options = dict(engine=engine, prescan=prescan, tokenizer=tokenizer)
+        # With `prescan`, only the elements holding keys are tokenized (see
+        # `ps2vcard.parsers.prescan`).
+        self.prescan = prescan
         # parsing state variables
         self.current_key = ""
         self.current_index = 0
         self.data = ""
         self.data_dest = ""
-        states = [
-            "seeking_key",
-            "found_course_key",
-            "found_student_key",
-            "seeking_student_data",
-            "seeking_course_data",
-            "seeking_student_image",
-        ]
-        Machine.__init__(self, states=states, initial="seeking_key")
+        self.open_index = None
+        self.finished_indexes = []
+        # Both engines run the same transitions and callbacks.  The
+        # "machine" engine is `transitions.Machine`, which resolves every
+        # trigger dynamically.  The "table" engine is compiled once per class.
+        if engine == "machine":
+            from transitions import Machine
+
+            self.machine = Machine(
+                model=self,
+                states=self.states,
+                transitions=self.roster_transitions(),
+                initial="seeking_key",
+            )
+        elif engine == "table":
+            self.machine = self.transition_table().bind(self, initial="seeking_key")
+        else:
+            raise ValueError("unknown engine: %s" % engine)
+        # With timings on, the handlers (which run the state machine) are
+        # timed apart from the tokenizing done by `feed`.
+        timings.instrument(
+            self,
+            ["handle_starttag", "handle_data", "handle_entityref", "handle_endtag"],
+            "fsm",
+        )
+        # `HTMLParser` tokenizes what is fed to it, unless another tokenizer
+        # is chosen; either calls the handlers above.
+        self.tokenizer = make_tokenizer(tokenizer, self)
+
+    def feed(self, data):
+        if self.tokenizer is None:
+            HTMLParser.feed(self, data)
+        else:
+            self.tokenizer.feed(data)
+
+    def close(self):
+        if self.tokenizer is None:
+            HTMLParser.close(self)
+        else:
+            self.tokenizer.finish()
+
+    @classmethod
+    def transition_table(cls):
+        """Return the compiled `TransitionTable` for this class."""
+        if "_transition_table" not in cls.__dict__:
+            cls._transition_table = TransitionTable(
+                cls.states, cls.roster_transitions()
+            )
+        return cls._transition_table
+
+    @classmethod
+    def roster_transitions(cls):
+        """Return the transitions of the roster state machine.
+
+        Each transition is a dictionary of keyword arguments to
+        `transitions.Machine.add_transition`.
+        """
+        transitions = []
         # The transition and callbacks below create a flow equivalent to this:
         #
         # If, while in the state 'seeking_key', a starttag (HTML `element`)
@@ -133,78 +271,94 @@ class AlbertRosterHtmlParser(HTMLParser, Machine):
         #
         #  The actual transition function can't be overridden, but the
         #  callbacks can, and they do all the work.
-        self.add_transition(
-            source="seeking_key",
-            trigger="machine_handle_attr",
-            prepare="unpack_element",
-            conditions="attr_is_course_key",
-            before=["store_key", "handle_course_key"],
-            dest="found_course_key",
-            after="cleanup_unpack_element",
+        transitions.append(
+            dict(
+                source="seeking_key",
+                trigger="machine_handle_attr",
+                prepare="unpack_element",
+                conditions="attr_is_course_key",
+                before=["store_key", "handle_course_key"],
+                dest="found_course_key",
+                after="cleanup_unpack_element",
+            )
         )
-        self.add_transition(
-            source="seeking_key",
-            trigger="machine_handle_attr",
-            conditions="attr_is_student_key",
-            before="handle_student_key",
-            dest="found_student_key",
-            after="cleanup_unpack_element",
+        transitions.append(
+            dict(
+                source="seeking_key",
+                trigger="machine_handle_attr",
+                conditions="attr_is_student_key",
+                before="handle_student_key",
+                dest="found_student_key",
+                after="cleanup_unpack_element",
+            )
         )
-        self.add_transition(
-            source="seeking_key",
-            trigger="machine_handle_attr",
-            conditions="found_photo_key",
-            before="handle_photo_key",
-            dest="seeking_student_image",
-            after="cleanup_unpack_element",
+        transitions.append(
+            dict(
+                source="seeking_key",
+                trigger="machine_handle_attr",
+                conditions="found_photo_key",
+                before="handle_photo_key",
+                dest="seeking_student_image",
+                after="cleanup_unpack_element",
+            )
         )
-        self.add_transition(
-            source="seeking_student_image",
-            trigger="machine_handle_attr",
-            prepare="unpack_element",
-            conditions="found_img_src",
-            before="handle_img_src",
-            dest="seeking_key",
-            after="cleanup_unpack_element",
+        transitions.append(
+            dict(
+                source="seeking_student_image",
+                trigger="machine_handle_attr",
+                prepare="unpack_element",
+                conditions="found_img_src",
+                before="handle_img_src",
+                dest="seeking_key",
+                after="cleanup_unpack_element",
+            )
         )
         for source in ["seeking_course_data", "seeking_student_data"]:
-            self.add_transition(
-                source=source,
-                trigger="machine_handle_data",
-                before="buffer_data",
-                dest=source,
+            transitions.append(
+                dict(
+                    source=source,
+                    trigger="machine_handle_data",
+                    before="buffer_data",
+                    dest=source,
+                )
             )
-            self.add_transition(
-                source=source,
-                trigger="machine_handle_entityref",
-                before="buffer_translated_entityref",
-                dest=source,
+            transitions.append(
+                dict(
+                    source=source,
+                    trigger="machine_handle_entityref",
+                    before="buffer_translated_entityref",
+                    dest=source,
+                )
             )
         # one key needs some additional handling
-        self.add_transition(
-            source="seeking_course_data",
-            trigger="machine_handle_endtag",
-            conditions="key_is_course_description",
-            before=["capture_course_data", "unpack_course_description"],
-            after="reset_buffers",
-            dest="seeking_key",
-        )
-        for subject in ["course", "student"]:
-            source = "seeking_%s_data" % subject
-            self.add_transition(
-                source=source,
+        transitions.append(
+            dict(
+                source="seeking_course_data",
                 trigger="machine_handle_endtag",
-                before="capture_%s_data" % subject,
+                conditions="key_is_course_description",
+                before=["capture_course_data", "unpack_course_description"],
                 after="reset_buffers",
                 dest="seeking_key",
             )
+        )
+        for subject in ["course", "student"]:
+            source = "seeking_%s_data" % subject
+            transitions.append(
+                dict(
+                    source=source,
+                    trigger="machine_handle_endtag",
+                    before="capture_%s_data" % subject,
+                    after="reset_buffers",
+                    dest="seeking_key",
+                )
+            )
             source = "found_%s_key" % subject
             dest = "seeking_%s_data" % subject
-            self.add_transition(
-                source=source, trigger="machine_handle_attr", dest=source
+            transitions.append(
+                dict(source=source, trigger="machine_handle_attr", dest=source)
             )
-            self.add_transition(
-                source=source, trigger="finish_handling_attrs", dest=dest
+            transitions.append(
+                dict(source=source, trigger="finish_handling_attrs", dest=dest)
             )
         # Ignore character data, entity references,
         # or end tags until we find a key.
@@ -217,15 +371,22 @@ class AlbertRosterHtmlParser(HTMLParser, Machine):
             "machine_handle_endtag",
             "finish_handling_attrs",
         ]:
-            self.add_transition(trigger, "seeking_key", "seeking_key")
-        self.add_transition(
-            "finish_handling_attrs", "seeking_student_image", "seeking_student_image"
+            transitions.append(
+                dict(trigger=trigger, source="seeking_key", dest="seeking_key")
+            )
+        transitions.append(
+            dict(
+                trigger="finish_handling_attrs",
+                source="seeking_student_image",
+                dest="seeking_student_image",
+            )
         )
+        return transitions
 
     def unpack_element(self, tag, attr):
         self.tag_name = tag
         self.attr_name, self.attr_value = attr
-        self.attr_value_match = re.match("([^$]*)\$(\d+)$", self.attr_value)
+        self.attr_value_match = self.attr_value_pattern.match(self.attr_value)
 
     def cleanup_unpack_element(self, tag, attr):
         del (self.tag_name, self.attr_name, self.attr_value, self.attr_value_match)
@@ -250,20 +411,67 @@ class AlbertRosterHtmlParser(HTMLParser, Machine):
     def handle_student_key(self, tag, attr):
         self.current_key = self.student_keys_dict[self.attr_value_match.group(1)]
         self.current_index = int(self.attr_value_match.group(2))
+        self.open_student(self.current_index)
 
     def found_photo_key(self, tag, attr):
         return (
             self.attr_name == "id"
             and self.attr_value_match
-            and self.attr_value_match.group(1) == self.photo_key
+            and self.attr_value_match.group(1) in self.photo_keys
         )
 
     def handle_photo_key(self, tag, attr):
         self.current_index = int(self.attr_value_match.group(2))
+        self.open_student(self.current_index)
+
+    def open_student(self, index):
+        """Note that a key for student `index` was found.
+
+        Albert lists the students in order, so the first key of a new
+        student means the previous one is finished.
+        """
+        if index == self.open_index:
+            return
+        if self.open_index is not None:
+            self.finished_indexes.append(self.open_index)
+        self.open_index = index
 
     def found_img_src(self, tag, attr):
         return self.tag_name == "img" and self.attr_name == "src"
 
+    def key_kind(self, value):
+        """Tell the prescan what an element with the id `value` holds:
+        `"data"`, `"image"`, or None if `value` is not a key."""
+        if value in self.course_keys_dict:
+            return "data"
+        match = self.attr_value_pattern.match(value)
+        if match is None:
+            return None
+        if match.group(1) in self.student_keys_dict:
+            return "data"
+        if match.group(1) in self.photo_keys:
+            return "image"
+        return None
+
+    @classmethod
+    def key_markers(cls):
+        """Return the bytes every key starts with, for the prescan."""
+        keys = list(cls.course_keys_dict) + list(cls.student_keys_dict)
+        return [key.encode() for key in keys + sorted(cls.photo_keys)]
+
+    def read_chunks(self, file):
+        """Yield the text of an Albert Class Roster HTML file to tokenize,
+        `chunk_size` characters at a time, or only its key regions if
+        `prescan` is on.  The file is decoded with the encoding it declares.
+        """
+        if self.prescan:
+            yield from iter_regions(
+                file, self.key_markers(), self.key_kind, self.chunk_size
+            )
+            return
+        with open(file, "r", encoding=file_encoding(file), errors="replace") as f:
+            yield from iter(lambda: f.read(self.chunk_size), "")
+
     def handle_img_src(self, tag, attr):
         self.student_records[self.current_index]["photo"] = os.path.join(
             self.base_dir, self.attr_value
@@ -276,7 +484,7 @@ class AlbertRosterHtmlParser(HTMLParser, Machine):
         for attr in attrs:
             try:
                 self.machine_handle_attr(tag, attr)
-            except MachineError:
+            except fsm.MachineError:
                 log.error("current_key: %s" % self.current_key)
                 log.error("tag: %s" % tag)
                 log.error("attrs: %s" % attrs)
@@ -312,7 +520,10 @@ class AlbertRosterHtmlParser(HTMLParser, Machine):
         self.course_data[self.current_key] = self.data
 
     def capture_student_data(self):
-        self.student_records[self.current_index][self.current_key] = self.data
+        data = self.data
+        if self.current_key in self.interned_keys:
+            data = sys.intern(data)
+        self.student_records[self.current_index][self.current_key] = data
 
     def key_is_course_description(self):
         return (
@@ -340,7 +551,7 @@ class AlbertRosterHtmlParser(HTMLParser, Machine):
         self.current_key = ""
         self.data = ""
 
-    def parse(self, file):
+    def parse_records(self, file):
         """parse an Albert Class Roster HTML file
         for course and student information
 
@@ -349,66 +560,174 @@ class AlbertRosterHtmlParser(HTMLParser, Machine):
         dictionaries of student properties.
         """
         self.base_dir = os.path.dirname(file)
-        with open(file, "r") as f:
-            data = f.read()
-            self.feed(data)
+        if self.prescan:
+            for data in timings.timed_iter("read", self.read_chunks(file), size=len):
+                with timings.stage("tokenize"):
+                    self.feed(data)
+        else:
+            with open(file, "r", encoding=file_encoding(file), errors="replace") as f:
+                with timings.stage("read") as timer:
+                    data = f.read()
+                    timer.add_bytes(len(data))
+            with timings.stage("tokenize"):
+                self.feed(data)
+        with timings.stage("tokenize"):
+            self.close()
+        return (self.course_data, list(self.student_records.values()))
+
+    def parse(self, file):
+        """parse an Albert Class Roster HTML file
+        for course and student information
+
+        Return a tuple `(course,students)`, where `course` is a dictionary
+        of course (i.e., section) properties, and `students` is a list of
+        vCards.
+        """
+        (course, students) = self.parse_records(file)
         self.student_vcards = []
-        for index, student in self.student_records.items():
-            self.student_vcards.append(self.student_to_vcard(student, self.course_data))
+        for student in students:
+            self.student_vcards.append(self.student_to_vcard(student, course))
         return (self.course_data, self.student_vcards)
 
+    def parse_students(self, file):
+        """parse an Albert Class Roster HTML file
+
+        Return a tuple `(course,students)`, where `students` is a list of
+        `StudentRecord`.
+        """
+        (course, students) = self.parse_records(file)
+        return (course, [self.student_record(student, course) for student in students])
+
+    def to_frame(self, file):
+        """parse an Albert Class Roster HTML file into a `pandas.DataFrame`
+        of students (see `ps2vcard.frames`)."""
+        return self.student_frame(*self.parse_records(file))
+
+    def student_frame(self, course, students):
+        """convert student dictionaries to a `pandas.DataFrame`."""
+        return html_frame(course, students)
+
+    def dependencies(self, students):
+        """list the files other than the roster that `students` came from"""
+        return [student["photo"] for student in students if "photo" in student]
+
+    def iter_students(self, file, vcards=True):
+        """parse an Albert Class Roster HTML file incrementally
+
+        The file is fed to the parser `chunk_size` characters at a time.
+        Each student is yielded as soon as the parser has moved on to the
+        next one, and is then forgotten, so memory use does not grow with
+        the size of the roster.
+
+        Yield vCards, or student records (dictionaries of student
+        properties) if `vcards` is false.  The course properties are in
+        `course_data`.
+        """
+        self.base_dir = os.path.dirname(file)
+        for chunk in timings.timed_iter("read", self.read_chunks(file), size=len):
+            with timings.stage("tokenize"):
+                self.feed(chunk)
+            yield from self.pop_finished_students(vcards)
+        with timings.stage("tokenize"):
+            self.close()
+        if self.open_index is not None:
+            self.finished_indexes.append(self.open_index)
+            self.open_index = None
+        yield from self.pop_finished_students(vcards)
+
+    def pop_finished_students(self, vcards):
+        while self.finished_indexes:
+            student = self.student_records.pop(self.finished_indexes.pop(0), None)
+            if student is None:
+                continue
+            if vcards:
+                yield self.student_to_vcard(student, self.course_data)
+            else:
+                yield student
+
+    def student_record(self, student, course):
+        """convert a single student dictionary to a `StudentRecord`."""
+        return StudentRecord.from_html(student, course)
+
     def student_to_vcard(self, student, course):
         """convert a single student record to a vCard object."""
-        card = vobject.vCard()
-        # first and last names
-        (family_name, given_names) = student["name"].split(",")
-        card.add("n")
-        card.n.value = vobject.vcard.Name(family=family_name, given=given_names)
-        # full name
-        card.add("fn")
-        card.fn.value = "%s %s" % (given_names, family_name)
-        # email
-        card.add("email")
-        card.email.value = student["email"]
-        card.email.type_param = "INTERNET"
-        # student info
-        card.add("title").value = "Student"
-        # could be working around a bug, but a list is expected here to avoid
-        # ORG:N;e;w;Y;o;r;k;U; ... in the card.
-        # while we are at it, we will unpack progplan
-        # TODO: add to FSM
-        (student_program, student_plan) = unpack_progplan(student["progplan"])
-        card.add("org").value = [course["org"], student_program]
-        card.add("X-NYU-PROGPLAN").value = " - ".join([student_program, student_plan])
-        try:
-            card.add("photo")
-            with open(student["photo"], "rb") as f:
-                card.photo.value = f.read()
-            card.photo.encoding_param = "b"
-            card.photo.type_param = "JPEG"
-        except KeyError:
-            # no photo
-            pass
-        # course (use address book's "Related Names" fields)
-        item = "item1"
-        card.add(item + ".X-ABLABEL").value = "course"
-        card.add(item + ".X-ABRELATEDNAMES").value = (
-            course["code"] + ", " + course["term"]
-        )
-        return card
+        return student_card(self.student_record(student, course))
 
 
 class AlbertRosterXlsParser(object):
     """Class to parse the `ps.xls` file downloaded from Albert"""
 
-    @log_on_start(logging.DEBUG, "{callable.__name__:s} begin")
-    @log_on_end(logging.DEBUG, "{callable.__name__:s} end")
-    def parse(self, input_path):
-        with open(input_path) as f:
+    # The "iterparse" engine streams the rows through lxml and forgets each
+    # one once it is read.  The "soup" engine builds the whole document tree
+    # with BeautifulSoup first.  Both give the same records.
+    engines = XLS_ENGINES
+    # columns whose values are shared by many students of a section
+    interned_columns = frozenset(
+        [
+            "Notify",
+            "Photo",
+            "Units",
+            "Program and Plan",
+            "Level",
+            "Subject",
+            "Catalog",
+            "Section",
+            "Advising Alert",
+        ]
+    )
+
+    def __init__(self, engine="iterparse"):
+        if engine not in self.engines:
+            raise ValueError("unknown engine: %s" % engine)
+        self.engine = engine
+        self.options = dict(engine=engine)
+
+    def parse_records(self, input_path):
+        """parse a `ps.xls` file into a list of dictionaries, one per row,
+        keyed by the column headers.
+
+        Return a tuple `(course,students)`.  The file has no course
+        information, so `course` is None.
+        """
+        return None, list(self.iter_students(input_path, vcards=False))
+
+    def iter_students(self, input_path, vcards=True):
+        """Yield the students of a `ps.xls` file one at a time.
+
+        With `vcards` true, yield vCards; otherwise yield the row
+        dictionaries.
+        """
+        for student in timings.timed_iter("parse rows", self.rows(input_path)):
+            self.intern_row(student)
+            logger.info("student: %s", repr(student))
+            yield self.student_to_vcard(student) if vcards else student
+
+    def intern_row(self, row):
+        """replace the values of `interned_columns` in `row` by their
+        interned copies."""
+        for column in self.interned_columns:
+            value = row.get(column)
+            if isinstance(value, str):
+                row[column] = sys.intern(value)
+
+    def rows(self, input_path):
+        """return an iterable of the rows of `input_path`, with the engine of
+        the parser.  Both engines decode the file with the encoding it
+        declares."""
+        encoding = file_encoding(input_path)
+        if self.engine == "soup":
+            return self.soup_rows(input_path, encoding)
+        return self.iterparse_rows(input_path, encoding)
+
+    def soup_rows(self, input_path, encoding):
+        """parse a `ps.xls` file with BeautifulSoup into a list of rows."""
+        with open(input_path, "r", encoding=encoding, errors="replace") as f:
             html = f.read()
-        cards = []
+        from bs4 import BeautifulSoup
+
+        students = []
         bs = BeautifulSoup(html, "lxml")
-        headers = [e.contents[0] for e in bs.find_all("th")]
+        headers = [str(e.contents[0]) for e in bs.find_all("th")]
         logger.info("headers: %s", repr(headers))
         for row in bs("tr"):
             cells = row.find_all("td")
@@ -417,47 +736,87 @@ class AlbertRosterXlsParser(object):
             cell_contents = [
                 "".join(filter(lambda x: str(x) == x, cell.contents)) for cell in cells
             ]  # needs to be a list of strings
-            student = dict(zip(headers, cell_contents))
-            logger.info("student: %s", repr(student))
-            cards.append(self.student_to_vcard(student))
+            students.append(dict(zip(headers, cell_contents)))
+        return students
+
+    def iterparse_rows(self, input_path, encoding):
+        """parse a `ps.xls` file with lxml, yielding one row at a time.
+
+        The header row comes first in the file, so the headers are known
+        before the first student row ends.  Each row is removed from the
+        tree once it has been read, so memory use does not grow with the
+        size of the file.
+        """
+        from lxml import etree
+
+        # lxml skips a byte order mark itself, but does not know "utf-8-sig"
+        if encoding == "utf-8-sig":
+            encoding = "utf-8"
+        headers = []
+        rows = 0
+        events = etree.iterparse(
+            input_path, events=("end",), tag=("th", "tr"), html=True, encoding=encoding
+        )
+        for (event, element) in events:
+            if element.tag == "th":
+                headers.append(element.text or "")
+                continue
+            cells = list(element.iter("td"))
+            if cells:
+                if not rows:
+                    logger.info("headers: %s", repr(headers))
+                rows += 1
+                yield dict(zip(headers, [self.cell_text(cell) for cell in cells]))
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+    @staticmethod
+    def cell_text(cell):
+        """the text directly inside `cell`, skipping its child elements, as
+        BeautifulSoup's strings give it"""
+        from lxml import etree
+
+        parts = [cell.text or ""]
+        for child in cell:
+            if child.tag is etree.Comment:
+                parts.append(child.text or "")
+            parts.append(child.tail or "")
+        return "".join(parts)
+
+    @log_on_start(logging.DEBUG, "{callable.__name__:s} begin")
+    @log_on_end(logging.DEBUG, "{callable.__name__:s} end")
+    def parse(self, input_path):
+        (course, students) = self.parse_records(input_path)
+        cards = [self.student_to_vcard(student) for student in students]
         return None, cards
 
+    def dependencies(self, students):
+        """list the files other than the roster that `students` came from"""
+        return []
+
+    def parse_students(self, input_path):
+        """parse a `ps.xls` file into a list of `StudentRecord`.
+
+        Return a tuple `(course,students)`, with `course` None.
+        """
+        students = self.iter_students(input_path, vcards=False)
+        return None, [self.student_record(student) for student in students]
+
+    def to_frame(self, input_path):
+        """parse a `ps.xls` file into a `pandas.DataFrame` of students (see
+        `ps2vcard.frames`)."""
+        return self.student_frame(*self.parse_records(input_path))
+
+    def student_frame(self, course, students):
+        """convert row dictionaries to a `pandas.DataFrame`."""
+        return xls_frame(students)
+
+    def student_record(self, student, course=None):
+        """convert a single row dictionary to a `StudentRecord`."""
+        return StudentRecord.from_xls(student)
+
     def student_to_vcard(self, student, course=None):
         """convert a single student record to a vCard object."""
-        # This seems pretty similar to AlbertRosterHtmlParser.student_to_vcard,
-        # with some dict keys changed.
-        # Maybe refactor?
-        if course is None:
-            course = {}
-        course["org"] = "New York University"
-        card = vobject.vCard()
-        # first and last names
-        try:
-            (family_name, given_names) = student["Name"].split(",")
-        except TypeError:
-            logger.error("student['Name']: %s", student["Name"])
-            raise
-        card.add("n")
-        card.n.value = vobject.vcard.Name(family=family_name, given=given_names)
-        # full name
-        card.add("fn")
-        card.fn.value = "%s %s" % (given_names, family_name)
-        # email
-        card.add("email")
-        card.email.value = student["Email Address"]
-        card.email.type_param = "INTERNET"
-        # student info
-        card.add("title").value = "Student"
-        (student_program, student_plan) = unpack_progplan(student["Program and Plan"])
-        card.add("org").value = [course["org"], student_program]
-        card.add("X-NYU-PROGPLAN").value = " - ".join([student_program, student_plan])
-        card.add("X-NYU-NNUMBER").value = student["Campus ID"]
-        # course (use address book's "Related Names" fields)
-        item = "item1"
-        card.add(item + ".X-ABLABEL").value = "course"
-        card.add(item + ".X-ABRELATEDNAMES").value = "%s %d - %03d" % (
-            student["Subject"],
-            int(student["Catalog"]),
-            int(student["Section"]),
-        )
-        return card
+        return student_card(self.student_record(student))
+
@@ -0,0 +1,150 @@
+"""
+Finding the roster in a saved page before tokenizing it
+
+A saved PeopleSoft page is mostly inline JavaScript, style sheets and
+layout markup, which the roster parser tokenizes only to throw it away.
+Everything it keeps is in a few elements, whose `id` is one of the keys of
+the parser (`CLASS_ROSTER_VW_EMPLID$3`, `DERIVED_SSR_FC_DESCR254`, ...):
+the text up to the end tag of the element, or, for a photo, everything up
+to its `<img>` tag.
+
+`key_regions` finds those elements with plain byte searches of the page,
+memory-mapped, and `iter_regions` decodes them so that only they are fed
+to the parser.  Keys in scripts, style sheets and comments, or in
+attributes other than `id`, are passed over, as the parser would.
+
+`declared_encoding` reads the character set a page declares, the way a
+browser does, so that pages are not decoded with whatever the platform's
+default encoding happens to be.
+"""
+
+from bisect import bisect_right
+import codecs
+import mmap
+import re
+
+# How far into a page to look for its character set.  Browsers look at the
+# first 1024 bytes; PeopleSoft pages can have more than that before the
+# <meta> tag.
+SNIFF_SIZE = 4096
+DEFAULT_ENCODING = "utf-8"
+
+META_CHARSET = re.compile(
+    rb"""<meta\b[^>]*?charset\s*=\s*["']?\s*([A-Za-z0-9._:-]+)""", re.I
+)
+SKIPPED = re.compile(
+    rb"<!--.*?-->|<script\b.*?</script\s*>|<style\b.*?</style\s*>", re.I | re.S
+)
+# what comes before a key that is the value of an id attribute
+ID_ATTR = re.compile(rb"""\sid\s*=\s*["']?$""", re.I)
+ATTR_VALUE = re.compile(rb"""[^"'\s>]*["']?""")
+TAG_REST = re.compile(rb"""(?:[^>"']|"[^"]*"|'[^']*')*>""")
+END_TAG = re.compile(rb"</[A-Za-z][^>]*>")
+IMG_TAG = re.compile(rb"<img\b", re.I)
+
+
+def declared_encoding(head, default=DEFAULT_ENCODING):
+    """Return the encoding of a page that starts with the bytes `head`.
+
+    That is the encoding of its byte order mark, or the charset of its
+    `<meta>` tag, or `default`.
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    match = META_CHARSET.search(head)
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode("ascii")).name
+        except LookupError:
+            pass
+    return default
+
+
+def file_encoding(path):
+    """Return the encoding the page at `path` declares."""
+    with open(path, "rb") as f:
+        return declared_encoding(f.read(SNIFF_SIZE))
+
+
+def skipped_spans(buffer):
+    """Return the starts and the ends of the scripts, style sheets and
+    comments in `buffer`."""
+    starts = []
+    ends = []
+    for match in SKIPPED.finditer(buffer):
+        starts.append(match.start())
+        ends.append(match.end())
+    return (starts, ends)
+
+
+def key_regions(buffer, markers, kind):
+    """Return the byte ranges `(start, end)` of `buffer` that hold the
+    elements whose `id` is a key, in order.
+
+    Keys start with one of the byte strings `markers`.  `kind(value)` tells
+    what to do with an `id` value: `"data"` for an element whose text is
+    wanted, `"image"` for one that holds a photo, or None for a value that
+    is not a key.  Overlapping ranges are merged.
+    """
+    hits = set()
+    for marker in markers:
+        position = buffer.find(marker)
+        while position >= 0:
+            hits.add(position)
+            position = buffer.find(marker, position + 1)
+    (skipped_starts, skipped_ends) = skipped_spans(buffer) if hits else ([], [])
+    regions = []
+    for hit in sorted(hits):
+        i = bisect_right(skipped_starts, hit) - 1
+        if i >= 0 and hit < skipped_ends[i]:
+            continue
+        start = buffer.rfind(b"<", 0, hit)
+        if start < 0 or not ID_ATTR.search(buffer, start, hit):
+            continue
+        value = ATTR_VALUE.match(buffer, hit)
+        element = kind(value.group().rstrip(b"\"'").decode("ascii", "replace"))
+        if element is None:
+            continue
+        tag = TAG_REST.match(buffer, value.end())
+        if tag is None:
+            continue
+        if element == "image":
+            img = IMG_TAG.search(buffer, tag.end())
+            end = img and TAG_REST.match(buffer, img.end())
+        else:
+            end = END_TAG.search(buffer, tag.end())
+        if end is None:
+            continue
+        if regions and start <= regions[-1][1]:
+            regions[-1][1] = max(regions[-1][1], end.end())
+        else:
+            regions.append([start, end.end()])
+    return [tuple(region) for region in regions]
+
+
+def iter_regions(path, markers, kind, chunk_size=64 * 1024):
+    """Yield the text of the key regions (see `key_regions`) of the page at
+    `path`, decoded with the encoding the page declares, in chunks of about
+    `chunk_size` bytes.
+
+    Bytes that are not valid in that encoding are replaced.
+    """
+    with open(path, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file cannot be mapped
+            return
+        with buffer:
+            encoding = declared_encoding(buffer[:SNIFF_SIZE])
+            batch = []
+            size = 0
+            for (start, end) in key_regions(buffer, markers, kind):
+                batch.append(buffer[start:end])
+                size += end - start
+                if size >= chunk_size:
+                    yield b"".join(batch).decode(encoding, "replace")
+                    batch = []
+                    size = 0
+            if batch:
+                yield b"".join(batch).decode(encoding, "replace")
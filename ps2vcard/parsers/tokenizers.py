@@ -0,0 +1,77 @@
+"""
+Tokenizers for the HTML roster parsers
+
+The roster parsers are `html.parser.HTMLParser` subclasses.  Their `feed`
+method tokenizes HTML in pure Python and calls `handle_starttag`,
+`handle_data` and `handle_endtag`.  Those handlers fire the events of the
+roster state machine: `machine_handle_attr`, `machine_handle_data`,
+`machine_handle_endtag`, and so on.  On a page of several megabytes,
+most of the time goes into the tokenizing.
+
+`LxmlTokenizer` tokenizes with libxml2 instead, through an lxml_ parser
+target.  The target calls the parser's own handlers with the same
+arguments `HTMLParser` would, so the state machine and the records it
+builds do not change.  The tokenizers differ only where the parser never
+looks:
+
+- libxml2 reports the end of empty elements such as `<img>`, and the end
+  of elements whose end tag is implied;
+- it keeps the first of two attributes with the same name;
+- it turns carriage returns in text into line feeds.
+
+`make_tokenizer` picks a tokenizer by name.  Without lxml, the parser
+falls back to `HTMLParser`'s own.
+
+.. _lxml: https://lxml.de/
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LxmlTokenizer(object):
+    """Feed HTML to libxml2 and pass its events to the handlers of an
+    `HTMLParser`."""
+
+    def __init__(self, handler):
+        from lxml import etree
+
+        # lxml looks up `start`, `data`, `end` and `close` on its target,
+        # so the handlers are bound straight to it wherever their
+        # arguments agree.
+        starttag = handler.handle_starttag
+        self.start = lambda tag, attrib: starttag(tag, list(attrib.items()))
+        self.data = handler.handle_data
+        self.end = handler.handle_endtag
+        self._parser = etree.HTMLParser(target=self)
+        self._fed = False
+
+    def close(self):
+        # called by libxml2 once the input is done
+        return None
+
+    def feed(self, data):
+        if data:
+            self._parser.feed(data)
+            self._fed = True
+
+    def finish(self):
+        """Process any data libxml2 is still holding."""
+        # libxml2 takes a document without any data for an error
+        if self._fed:
+            self._parser.close()
+
+
+def make_tokenizer(name, handler):
+    """Return the tokenizer `name` (see `HTML_TOKENIZERS`) for the
+    `HTMLParser` `handler`, or None if `handler` tokenizes for itself."""
+    if name == "stdlib":
+        return None
+    if name == "lxml":
+        try:
+            return LxmlTokenizer(handler)
+        except ImportError:
+            logger.warning("lxml is not installed; using the stdlib tokenizer")
+            return None
+    raise ValueError("unknown tokenizer: %s" % name)
@@ -0,0 +1,272 @@
+"""
+Student photos in vCards
+
+A roster can reference thousands of photos.  Reading them all while the
+cards are built keeps every image in memory at once, even when the cards
+are never serialized.  A `LazyPhoto` holds only the path of the image, and
+`LazyPhotoBehavior` reads the bytes when the card is serialized, then lets
+them go again.
+
+A `PhotoProcessor` shrinks and recompresses photos on a pool of threads
+before they are embedded or exported.  It needs Pillow_, which is
+optional.
+
+Photos exported as files are not read at all: `copy_file` links them, or
+has the kernel copy them.
+
+A `StoredPhoto` is a photo kept in a `ps2vcard.photostore.PhotoStore`,
+whose base64 encoding is computed once and kept with it.
+
+.. _Pillow: https://python-pillow.org/
+"""
+
+import base64
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+import vobject
+
+from ps2vcard import timings
+
+
+class LazyPhoto(object):
+    """A photo file whose contents are read on demand."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return "LazyPhoto(%r)" % self.path
+
+    def __eq__(self, other):
+        return isinstance(other, LazyPhoto) and self.path == other.path
+
+    def read(self):
+        """Return the bytes of the photo."""
+        with timings.stage("photos") as timer, open(self.path, "rb") as f:
+            data = f.read()
+            timer.add_bytes(len(data))
+            return data
+
+    def base64(self):
+        """Return the base64 encoding of the photo, as text."""
+        return base64.b64encode(self.read()).decode("ascii")
+
+    def copy(self, filename):
+        """Copy the photo to `filename` without loading it into memory."""
+        with timings.stage("photos") as timer:
+            timer.add_bytes(copy_file(self.path, filename))
+
+
+class StoredPhoto(LazyPhoto):
+    """A photo of a `PhotoStore`, named by the digest of its contents."""
+
+    def __init__(self, store, digest, path):
+        super().__init__(path)
+        self.store = store
+        self.digest = digest
+
+    def __repr__(self):
+        return "StoredPhoto(%r)" % self.digest
+
+    def base64(self):
+        return self.store.base64(self.digest, self.path)
+
+
+def copy_file(source, destination, link=True):
+    """Copy the file `source` to `destination`, replacing it, and return
+    the number of bytes copied.
+
+    The bytes never pass through Python.  With `link`, `destination` is
+    made a hard link to `source` if they are on the same file system.
+    Otherwise `os.copy_file_range` copies them inside the kernel (or
+    clones them, on file systems that can), and `shutil.copyfile`, which
+    uses `sendfile` where it can, is the last resort.
+    """
+    size = os.stat(source).st_size
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return size
+    try:
+        os.unlink(destination)
+    except FileNotFoundError:
+        pass
+    if link:
+        try:
+            os.link(source, destination)
+            return size
+        except OSError:
+            pass
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(source, "rb") as src, open(destination, "wb") as dst:
+                copied = 0
+                while copied < size:
+                    count = os.copy_file_range(
+                        src.fileno(), dst.fileno(), size - copied
+                    )
+                    if not count:
+                        break
+                    copied += count
+            if copied == size:
+                return size
+        except OSError:
+            pass
+    shutil.copyfile(source, destination)
+    return size
+
+
+class LazyPhotoBehavior(vobject.vcard.Photo):
+    """vCard PHOTO behavior for `LazyPhoto` values.
+
+    The photo is read and encoded just before the line is written, and the
+    `LazyPhoto` is put back when vobject decodes the line after writing it
+    out.
+    """
+
+    @classmethod
+    def encode(cls, line):
+        if not line.encoded and isinstance(line.value, LazyPhoto):
+            line.lazy_photo = line.value
+            line.value = line.value.base64()
+            line.encoded = True
+            return
+        super().encode(line)
+
+    @classmethod
+    def decode(cls, line):
+        lazy_photo = line.__dict__.pop("lazy_photo", None)
+        if line.encoded and lazy_photo is not None:
+            line.value = lazy_photo
+            line.encoded = False
+        else:
+            super().decode(line)
+
+
+def add_photo(card, path, type_param="JPEG"):
+    """Attach the photo at `path` to `card` without reading it."""
+    if "photo" not in card.contents:
+        card.add("photo")
+    card.photo.value = LazyPhoto(path)
+    card.photo.behavior = LazyPhotoBehavior
+    card.photo.encoding_param = "b"
+    card.photo.type_param = type_param
+    return card.photo
+
+
+def photo_bytes(card):
+    """Return the bytes of the photo of `card`, or `b""` if it has none."""
+    try:
+        value = card.photo.value
+    except AttributeError:
+        return b""
+    if isinstance(value, LazyPhoto):
+        return value.read()
+    return value or b""
+
+
+class PhotoProcessor(object):
+    """Resize and recompress student photos on a pool of threads.
+
+    Photos larger than `max_size` pixels on a side are scaled down, and all
+    are re-encoded as JPEG at `quality`.  If the result is not smaller than
+    the original, the original is kept.  Processed photos are written to a
+    temporary directory that lives as long as the processor, so use it as
+    a context manager.  Pillow releases the interpreter lock while it
+    decodes, scales and encodes, so threads run in parallel.
+    """
+
+    def __init__(self, max_size=256, quality=85, jobs=None):
+        try:
+            from PIL import Image
+        except ImportError:
+            raise ImportError(
+                "photo processing needs Pillow: try `pip install Pillow`"
+            ) from None
+        self.Image = Image
+        self.max_size = max_size
+        self.quality = quality
+        self.jobs = jobs or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.jobs)
+        self.tempdir = tempfile.TemporaryDirectory(prefix="ps2vcard-photos-")
+        # the byte totals, added to by the threads of the pool
+        self.originals = 0
+        self.processed = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown()
+        self.tempdir.cleanup()
+
+    @timings.timed("photo processing")
+    def process(self, path):
+        """Return the path of the processed version of the photo at `path`."""
+        with open(path, "rb") as f:
+            original = f.read()
+        try:
+            image = self.Image.open(io.BytesIO(original))
+            image.thumbnail((self.max_size, self.max_size))
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            image.save(output, "JPEG", quality=self.quality, optimize=True)
+        except Exception as e:
+            logging.getLogger(__name__).warning("keeping photo %s: %s", path, e)
+            return path
+        data = output.getvalue()
+        with self._lock:
+            self.originals += len(original)
+            self.processed += min(len(data), len(original))
+        if len(data) >= len(original):
+            return path
+        (fd, new_path) = tempfile.mkstemp(dir=self.tempdir.name, suffix=".jpg")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return new_path
+
+    def process_students(self, students, window=None):
+        """Yield `students` in order, with their photos processed.
+
+        `students` are dictionaries with an optional `"photo"` path, like the
+        records of the roster parsers; each is copied before its photo is
+        replaced.  At most `window` photos are in flight at once, so a
+        streamed roster stays streamed.
+        """
+        if window is None:
+            window = 4 * self.jobs
+        pending = deque()
+        for student in students:
+            future = None
+            if student.get("photo"):
+                future = self.executor.submit(self.process, student["photo"])
+            pending.append((student, future))
+            if len(pending) >= window:
+                yield self._finish(*pending.popleft())
+        while pending:
+            yield self._finish(*pending.popleft())
+
+    @staticmethod
+    def _finish(student, future):
+        if future is None:
+            return student
+        student = dict(student)
+        student["photo"] = future.result()
+        return student
+
+    def summary(self):
+        """describe the savings, e.g. `"photos: 2.1 MB -> 0.4 MB"`."""
+        return "photos: %.1f MB -> %.1f MB" % (
+            self.originals / 1e6,
+            self.processed / 1e6,
+        )
@@ -0,0 +1,228 @@
+"""
+Content-addressed store of student photos
+
+The same photo is embedded again in every card of a student, in every
+roster and every term, and many students share the same placeholder
+image.  Each copy is read and base64-encoded anew, and a third larger
+than the image itself.
+
+A `PhotoStore` keeps each distinct image once, in a directory, named by
+the SHA-256 digest of its contents (by default `~/.local/share/ps2vcard/
+photos`, or `$PS2VCARD_PHOTO_STORE`).  Next to each image it keeps the
+base64 encoding, made the first time a card embeds it; later cards and
+later runs use it as it is.  An index of the files added, by path, size
+and modification time, saves hashing the photos of a roster converted
+again.
+
+`apply_photo_mode` changes the PHOTO line of a card for the photo modes
+(`PHOTO_MODES`):
+
+- "embed" keeps the photo in the card, as base64 (from the store, if any);
+- "uri" refers to the image in the store, with `PHOTO;VALUE=uri`, so the
+  cards stay small (the store must then outlast them);
+- "none" leaves the PHOTO line out.
+"""
+
+import base64
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not on POSIX
+    fcntl = None
+
+from ps2vcard import PHOTO_MODES, timings
+
+
+logger = logging.getLogger(__name__)
+
+
+def default_photo_store():
+    """Return the photo store directory, from `$PS2VCARD_PHOTO_STORE` or the
+    XDG base directory specification."""
+    if os.environ.get("PS2VCARD_PHOTO_STORE"):
+        return os.environ["PS2VCARD_PHOTO_STORE"]
+    base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "ps2vcard", "photos")
+
+
+def _write_atomically(path, data):
+    """Write the bytes `data` to `path`, all at once or not at all."""
+    (fd, temp_path) = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class PhotoStore(object):
+    """A directory of photos named by the digest of their contents.
+
+    `add` a photo file to get its digest; `path`, `uri` and `base64` look
+    the photo up by digest.  A store can be shared by threads, and by
+    processes: the files are only ever replaced whole, and each process
+    merges the entries it added into the index on disk, under a lock (on
+    POSIX systems; elsewhere, processes that close at the same moment may
+    lose each other's entries, which only costs hashing the photos again).
+    Use it as a context manager, so that the index is saved.
+    """
+
+    index_name = "index.json"
+    # encodings kept in memory, most recently used last; the rest are read
+    # again from their files
+    encodings_cached = 64
+
+    def __init__(self, dirname=None):
+        if dirname is None:
+            dirname = default_photo_store()
+        self.dirname = os.path.abspath(dirname)
+        self._lock = threading.Lock()
+        # the encodings used last, by digest
+        self._encodings = OrderedDict()
+        self._index = None
+        # the index entries added since the index was read
+        self._changes = {}
+        self.added = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def index(self):
+        """The `[size, mtime_ns, digest]` of each file added, by path."""
+        if self._index is None:
+            self._index = self._read_index()
+        return self._index
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.dirname, self.index_name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning("discarding unreadable photo store index")
+            return {}
+
+    def close(self):
+        """Merge the entries added into the index on disk."""
+        with self._lock:
+            if not self._changes:
+                return
+            os.makedirs(self.dirname, exist_ok=True)
+            index_path = os.path.join(self.dirname, self.index_name)
+            with open(index_path + ".lock", "w") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                # other processes may have saved entries since it was read
+                index = self._read_index()
+                index.update(self._changes)
+                _write_atomically(index_path, json.dumps(index).encode())
+            self._index = index
+            self._changes = {}
+
+    def path(self, digest, extension=".jpg"):
+        """Return the path of the photo with `digest`."""
+        return os.path.join(self.dirname, digest[:2], digest + extension)
+
+    def uri(self, digest, extension=".jpg"):
+        """Return the `file:` URI of the photo with `digest`."""
+        return pathlib.Path(self.path(digest, extension)).as_uri()
+
+    @timings.timed("photo store")
+    def add(self, path):
+        """Keep a copy of the photo file at `path`, unless the store has one,
+        and return its digest."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        extension = self.extension(path)
+        with self._lock:
+            entry = self.index.get(path)
+        if entry is not None and entry[:2] == stamp:
+            digest = entry[2]
+            if os.path.exists(self.path(digest, extension)):
+                return digest
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        stored = self.path(digest, extension)
+        if not os.path.exists(stored):
+            os.makedirs(os.path.dirname(stored), exist_ok=True)
+            _write_atomically(stored, data)
+            self.added += 1
+        with self._lock:
+            self.index[path] = self._changes[path] = stamp + [digest]
+        return digest
+
+    @staticmethod
+    def extension(path):
+        """Return the file name extension the store gives the photo `path`."""
+        return os.path.splitext(path)[1].lower() or ".jpg"
+
+    def base64(self, digest, path):
+        """Return the base64 encoding of the stored photo at `path`, whose
+        digest is `digest`, as text."""
+        with self._lock:
+            encoding = self._encodings.get(digest)
+            if encoding is not None:
+                self._encodings.move_to_end(digest)
+                return encoding
+        encoded_path = os.path.join(os.path.dirname(path), digest + ".b64")
+        with timings.stage("photos") as timer:
+            try:
+                with open(encoded_path, "rb") as f:
+                    encoding = f.read().decode("ascii")
+            except FileNotFoundError:
+                with open(path, "rb") as f:
+                    data = f.read()
+                encoding = base64.b64encode(data).decode("ascii")
+                _write_atomically(encoded_path, encoding.encode("ascii"))
+            timer.add_bytes(len(encoding))
+        with self._lock:
+            self._encodings[digest] = encoding
+            if len(self._encodings) > self.encodings_cached:
+                self._encodings.popitem(last=False)
+        return encoding
+
+
+def apply_photo_mode(card, mode, store=None):
+    """Embed, refer to or leave out the photo of `card`, according to `mode`
+    (see `PHOTO_MODES`), and return the card.
+
+    The photo is added to `store`, if given, which "uri" needs.
+    """
+    from ps2vcard.photos import LazyPhoto, StoredPhoto
+
+    if mode not in PHOTO_MODES:
+        raise ValueError("unknown photo mode: %s" % mode)
+    if mode == "none":
+        card.contents.pop("photo", None)
+        return card
+    lines = card.contents.get("photo")
+    if not lines or not isinstance(lines[0].value, LazyPhoto):
+        return card
+    line = lines[0]
+    if store is None:
+        if mode == "uri":
+            raise ValueError("the uri photo mode needs a photo store")
+        return card
+    source = line.value.path
+    digest = store.add(source)
+    extension = store.extension(source)
+    if mode == "uri":
+        line.value = store.uri(digest, extension)
+        line.params.pop("ENCODING", None)
+        line.value_param = "uri"
+    else:
+        line.value = StoredPhoto(store, digest, store.path(digest, extension))
+    return card
@@ -0,0 +1,169 @@
+"""
+Overlapping the stages of a conversion
+
+For every student, a conversion runs one stage after the other: the parser
+tokenizes the roster and runs its state machine, the photo is read, the
+card is built and serialized, and its file is written.  When the photos and
+the cards live on a network file system, every read and write waits on the
+network, and the waits add up.
+
+`CardPipeline` runs the stages at the same time.  The parser runs on a
+thread of its own (`threaded_iter`), and hands its records over through a
+bounded queue.  A pool of threads builds and serializes the cards, which
+reads the photos, and writes their files.  The cards come out in roster
+order (`ordered_map`), so what is printed or bundled does not depend on
+the number of threads, and two cards saved to the same file are saved in
+roster order, as they would be one at a time.  The queue and the number of
+cards in flight are bounded: a parser that runs ahead waits for the
+workers to catch up.
+
+The interpreter lock lets only one thread run Python code at a time, so
+the pipeline does not speed up a conversion whose stages all keep the
+processor busy; it pays off when they wait on files.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+
+_DONE = object()
+
+
+def threaded_iter(iterable, maxsize=64):
+    """Iterate over `iterable` on a thread of its own, and yield its items.
+
+    At most `maxsize` items wait to be yielded.  An exception raised by
+    `iterable` is raised again here.  The thread stops when the iterator
+    returned is closed.
+    """
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((_DONE, e))
+        else:
+            put((_DONE, None))
+
+    thread = threading.Thread(target=produce, name="ps2vcard-producer", daemon=True)
+    thread.start()
+    try:
+        while True:
+            (item, error) = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def ordered_map(function, items, executor, window):
+    """Yield `function(item)` for each of `items`, in order, with up to
+    `window` calls running on `executor` at once."""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class CardPipeline(object):
+    """Build, serialize and save vCards on a pool of threads.
+
+    `build` makes the card of a record.  The cards are saved with `writer`,
+    a `VcardWriter`, if one is given, and serialized if `serialize` is
+    true or there is a writer.  `jobs` threads build, serialize and write;
+    at most `window` cards (by default, four per thread) are in flight.
+    With one job, each card is built, serialized and saved in turn, on the
+    calling thread.
+    """
+
+    def __init__(self, build, writer=None, serialize=False, jobs=4, window=None):
+        self.build = build
+        self.writer = writer
+        self.serialize = serialize or writer is not None
+        self.jobs = jobs
+        self.window = window or 4 * jobs
+
+    def prepare(self, record):
+        """Return the card of `record`, its file name and its serialization."""
+        from ps2vcard.serializer import serialize_vcard
+
+        card = self.build(record)
+        filename = self.writer.card_file_name(card) if self.writer else None
+        data = serialize_vcard(card).encode() if self.serialize else None
+        return (card, filename, data)
+
+    def run(self, records):
+        """Yield `(card, data)` for each of `records`, in order, where `data`
+        is the serialized card (or None, if nothing needs it).
+
+        The files of the cards are written as the cards are yielded; all
+        have been written when the iteration ends.
+        """
+        if self.jobs == 1:
+            for record in records:
+                (card, filename, data) = self.prepare(record)
+                if self.writer is not None:
+                    self.writer.write_data(filename, data)
+                yield (card, data)
+            return
+        with ThreadPoolExecutor(
+            max_workers=self.jobs, thread_name_prefix="ps2vcard-worker"
+        ) as executor:
+            try:
+                yield from self._run(records, executor)
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    def _run(self, records, executor):
+        records = threaded_iter(records, maxsize=self.window)
+        writes = deque()
+        # the pending write of each file name, so that a card waits for the
+        # one before it with the same file name
+        last_writes = {}
+
+        def finish_write():
+            (filename, write) = writes.popleft()
+            write.result()
+            if last_writes.get(filename) is write:
+                del last_writes[filename]
+
+        try:
+            for (card, filename, data) in ordered_map(
+                self.prepare, records, executor, self.window
+            ):
+                if self.writer is not None:
+                    previous = last_writes.get(filename)
+                    if previous is not None:
+                        previous.result()
+                    write = executor.submit(self.writer.write_data, filename, data)
+                    last_writes[filename] = write
+                    writes.append((filename, write))
+                    while writes and (writes[0][1].done() or len(writes) > self.window):
+                        finish_write()
+                yield (card, data)
+            while writes:
+                finish_write()
+        finally:
+            records.close()
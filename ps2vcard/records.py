@@ -0,0 +1,162 @@
+"""
+Compact student records and the cards built from them
+
+Each roster parser reads students into dictionaries keyed by its own
+field names: `"name"` and `"progplan"` on the roster page, `"Name"` and
+`"Program and Plan"` in the `ps.xls` export.  A `StudentRecord` holds the
+fields a card is made of under one set of names, in slots rather than a
+per-student dictionary.  The values every student of a section shares
+(the organization, the program and plan, the course) are interned, so a
+roster of thousands of students keeps one copy of each.
+
+`student_card` is the one place where a record becomes a vCard, for
+every parser.
+"""
+
+import logging
+import sys
+
+import vobject
+
+from ps2vcard.parsers import unpack_progplan
+from ps2vcard.photos import add_photo
+from ps2vcard.timings import timed
+
+
+logger = logging.getLogger(__name__)
+
+ORG = "New York University"
+
+
+class StudentRecord(object):
+    """The fields of a student's card.
+
+    `photo` is the path of the student's photo.  The roster page gives
+    every card a PHOTO line, empty if the student has no photo; for those
+    cards `photo` is `""`.  It is None for cards without a PHOTO line.
+    `nnumber` is None when the roster does not list N-numbers, and `emplid`
+    (the student's PeopleSoft id, which is not on the card) when it does
+    not list those.
+    """
+
+    __slots__ = (
+        "nnumber",
+        "family_name",
+        "given_names",
+        "email",
+        "org",
+        "program",
+        "plan",
+        "course",
+        "photo",
+        "emplid",
+    )
+
+    def __init__(
+        self,
+        nnumber,
+        family_name,
+        given_names,
+        email,
+        org,
+        program,
+        plan,
+        course,
+        photo=None,
+        emplid=None,
+    ):
+        self.nnumber = nnumber
+        self.family_name = family_name
+        self.given_names = given_names
+        self.email = email
+        self.org = sys.intern(org)
+        self.program = program
+        self.plan = plan
+        self.course = sys.intern(course)
+        self.photo = photo
+        self.emplid = emplid
+
+    def __repr__(self):
+        return "StudentRecord(%s)" % ", ".join(
+            "%s=%r" % (name, getattr(self, name)) for name in self.__slots__
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, StudentRecord):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    @classmethod
+    def from_html(cls, student, course):
+        """Return the record of a student of an Albert roster page."""
+        (family_name, given_names) = student["name"].split(",")
+        (program, plan) = unpack_progplan(student["progplan"])
+        return cls(
+            None,
+            family_name,
+            given_names,
+            student["email"],
+            course["org"],
+            program,
+            plan,
+            course["code"] + ", " + course["term"],
+            student.get("photo", ""),
+            student.get("id"),
+        )
+
+    @classmethod
+    def from_xls(cls, student):
+        """Return the record of a row of a `ps.xls` export."""
+        try:
+            (family_name, given_names) = student["Name"].split(",")
+        except TypeError:
+            logger.error("student['Name']: %s", student["Name"])
+            raise
+        (program, plan) = unpack_progplan(student["Program and Plan"])
+        return cls(
+            student["Campus ID"],
+            family_name,
+            given_names,
+            student["Email Address"],
+            ORG,
+            program,
+            plan,
+            "%s %d - %03d"
+            % (student["Subject"], int(student["Catalog"]), int(student["Section"])),
+        )
+
+
+@timed("build")
+def student_card(record, courses=None):
+    """Return the vCard of a `StudentRecord`.
+
+    The card lists the course of the record, or all of `courses` if given.
+    """
+    card = vobject.vCard()
+    card.add("n").value = vobject.vcard.Name(
+        family=record.family_name, given=record.given_names
+    )
+    card.add("fn").value = "%s %s" % (record.given_names, record.family_name)
+    email = card.add("email")
+    email.value = record.email
+    email.type_param = "INTERNET"
+    card.add("title").value = "Student"
+    # a list, or ORG would be split into one letter per field
+    card.add("org").value = [record.org, record.program]
+    card.add("X-NYU-PROGPLAN").value = " - ".join([record.program, record.plan])
+    if record.nnumber is not None:
+        card.add("X-NYU-NNUMBER").value = record.nnumber
+    if record.photo is not None:
+        card.add("photo")
+        if record.photo:
+            # The photo is not read until the card is serialized.
+            add_photo(card, record.photo)
+    # course (use address book's "Related Names" fields)
+    if courses is None:
+        courses = [record.course]
+    for (number, course) in enumerate(courses, 1):
+        card.add("item%d.X-ABLABEL" % number).value = "course"
+        card.add("item%d.X-ABRELATEDNAMES" % number).value = course
+    return card
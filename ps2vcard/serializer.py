@@ -0,0 +1,151 @@
+"""
+Fast serialization of roster vCards
+
+`card.serialize()` goes through vobject's generic machinery for every
+line: it looks up behaviors, transforms native values back and forth,
+encodes and decodes, and folds lines one character at a time.  The cards
+built by the roster parsers only ever hold a few kinds of lines (text, N,
+ORG and PHOTO), so `serialize_vcard` formats those directly.  Its output
+is byte-for-byte the output of `card.serialize()`.  A card with any
+other kind of content falls back on vobject.
+"""
+
+import base64
+
+from vobject.base import ContentLine, backslashEscape, dquoteEscape
+from vobject.vcard import (
+    NAME_ORDER,
+    NameBehavior,
+    OrgBehavior,
+    Photo,
+    VCard3_0,
+    VCardTextBehavior,
+)
+
+from ps2vcard.photos import LazyPhoto
+from ps2vcard.timings import timed
+
+
+LINE_LENGTH = 75
+
+
+class Unsupported(Exception):
+    """A line the fast serializer does not know how to format."""
+
+
+def fold(line):
+    """Fold `line` the way `vobject.base.foldOneLine` does.
+
+    Lines of fewer than 75 characters are kept whole.  Longer lines are cut
+    into 75 bytes, then 74 bytes after each `CRLF SPACE`, without breaking
+    a UTF-8 sequence.
+    """
+    if len(line) < LINE_LENGTH:
+        return line + "\r\n"
+    if line.isascii():
+        chunks = [line[:LINE_LENGTH]]
+        for start in range(LINE_LENGTH, len(line), LINE_LENGTH - 1):
+            chunks.append(line[start:start + LINE_LENGTH - 1])
+        return "\r\n ".join(chunks) + "\r\n"
+    chunks = []
+    start = 0
+    counter = 0
+    for (index, char) in enumerate(line):
+        size = len(char.encode("utf-8"))
+        if counter + size > LINE_LENGTH:
+            chunks.append(line[start:index])
+            start = index
+            counter = 1
+        counter += size
+    chunks.append(line[start:])
+    return "\r\n ".join(chunks) + "\r\n"
+
+
+def format_value(line):
+    """Return the encoded value of a content line, as vobject writes it."""
+    behavior = line.behavior
+    if line.encoded or behavior is None:
+        return "{0}".format(line.value)
+    if behavior is NameBehavior:
+        if not line.isNative:
+            return "{0}".format(line.value)
+        name = line.value
+        return ";".join(
+            ",".join(backslashEscape(v) for v in _to_list(getattr(name, field)))
+            for field in NAME_ORDER
+        )
+    if behavior is OrgBehavior:
+        if not line.isNative:
+            return "{0}".format(line.value)
+        return ";".join(backslashEscape(v) for v in line.value)
+    if issubclass(behavior, VCardTextBehavior):
+        encoding = getattr(line, "encoding_param", None)
+        value = line.value
+        if not encoding or encoding.upper() != behavior.base64string:
+            if isinstance(value, str):
+                return backslashEscape(value)
+            raise Unsupported(line.name)
+        if isinstance(value, LazyPhoto):
+            return value.base64()
+        if isinstance(value, bytes):
+            return base64.b64encode(value).decode("ascii")
+    raise Unsupported(line.name)
+
+
+def format_line(line):
+    """Return a content line, folded and terminated, as vobject writes it."""
+    parts = [line.name if line.group is None else line.group + "." + line.name]
+    params = line.params
+    for key in sorted(params):
+        parts.append(";%s=%s" % (key, ",".join(dquoteEscape(p) for p in params[key])))
+    parts.append(":")
+    parts.append(format_value(line))
+    text = "".join(parts)
+    if line.behavior is not None and issubclass(line.behavior, Photo):
+        # vobject never folds photos, for the sake of Apple's Address Book
+        return text + "\r\n"
+    return fold(text)
+
+
+def _to_list(value):
+    return [value] if isinstance(value, str) else value
+
+
+def _can_format(card):
+    """Is `card` a plain vCard 3.0 that `card.serialize()` would accept?"""
+    if card.behavior is not VCard3_0 or card.group is not None:
+        return False
+    contents = card.contents
+    if "fn" not in contents:
+        return False
+    for (name, (least, most, _)) in VCard3_0.knownChildren.items():
+        if name == "VERSION":
+            continue
+        count = len(contents.get(name.lower(), ()))
+        if count < least or (most is not None and count > most):
+            return False
+    if len(contents.get("version", ())) > 1:
+        return False
+    return all(
+        isinstance(line, ContentLine) for lines in contents.values() for line in lines
+    )
+
+
+@timed("serialize", size=len)
+def serialize_vcard(card):
+    """Return `card.serialize()`, computed without vobject's generic
+    serializer when the card allows it."""
+    if not _can_format(card):
+        return card.serialize()
+    contents = card.contents
+    try:
+        lines = ["BEGIN:VCARD\r\n"]
+        if "version" not in contents:
+            lines.append("VERSION:%s\r\n" % VCard3_0.versionString)
+        for key in card.sortChildKeys():
+            for line in contents[key]:
+                lines.append(format_line(line))
+        lines.append("END:VCARD\r\n")
+    except Unsupported:
+        return card.serialize()
+    return "".join(lines)
@@ -0,0 +1,561 @@
+"""
+A local HTTP conversion service
+
+A tool that runs `ps2vcard` or `psxls2amc` for every uploaded roster pays
+for starting the interpreter and importing BeautifulSoup, lxml, vobject
+and transitions every time, which takes longer than converting a small
+roster.  `ps2vcard serve` starts a `ConversionServer` once instead.  Its
+worker processes are forked when it starts, import everything and compile
+the state machine table of the roster parser (`warm_worker`), so a
+request only pays for the conversion itself.  Each request gets parsers
+of its own: a parser keeps the students of the roster it read.
+
+The server listens on the loopback interface unless told otherwise.  It
+answers:
+
+`POST /convert`
+    Convert the roster in the body of the request: a roster page, a
+    frameset, a `ps.xls` export or a CSV export, or a zip archive of a
+    saved page with its `_files` directory.  A `multipart/form-data` body
+    may instead have a `roster` file field and a `photos` field, holding a
+    zip archive of the `_files` directory of the page.  The query string
+    may give the `format` of the response: `vcf` (all the cards in one
+    file, the default), `zip` (a zip archive of one file per card) or
+    `amc` (a CSV file for auto-multiple-choice, from spreadsheet and CSV
+    rosters only); the `kind` of roster (see `ps2vcard.sniff`), which is
+    recognized otherwise; and the `filename` of a roster sent as the body.
+
+`GET /metrics`
+    The request counts, response sizes, latencies and stage timings of
+    the server, as JSON.
+
+`GET /health`
+    `{"status": "ok"}`, with the number of workers.
+
+At most `max_concurrent` conversions run or wait for a worker at once;
+the server turns further requests away with `503 Service Unavailable`
+rather than queue them without limit.  Bodies larger than `max_upload`
+bytes are refused with `413`, and requests with no `Content-Length` or a
+malformed one with `411` or `400`, before they count against
+`max_concurrent`.  A conversion that takes longer than `timeout` seconds
+gets `504`; its worker goes on with it, and it counts against
+`max_concurrent` until the worker is done, or has gone on for
+`kill_after` seconds more and is killed and replaced.  Errors are reported as JSON, e.g.
+`{"error": "cannot tell what kind of roster roster.html is"}`.
+"""
+
+from collections import Counter, deque
+import email.parser
+import email.policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import signal
+import tempfile
+import threading
+import time
+import traceback
+import urllib.parse
+import zipfile
+
+from ps2vcard import timings
+from ps2vcard.batch import find_rosters
+from ps2vcard.sniff import KINDS, make_parser, sniff
+
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = {
+    "vcf": ("text/vcard; charset=utf-8", ".vcf"),
+    "zip": ("application/zip", ".zip"),
+    "amc": ("text/csv; charset=utf-8", ".csv"),
+}
+
+MAX_UPLOAD = 64 * 1024 * 1024
+# the most an uploaded zip archive may hold, unpacked
+MAX_UNPACKED = 256 * 1024 * 1024
+TIMEOUT = 60.0
+# how much longer a conversion that timed out may go on before its worker
+# is killed
+KILL_AFTER = 60.0
+# the latencies kept for the percentiles of the metrics
+LATENCY_WINDOW = 1000
+
+
+class ConversionError(Exception):
+    """An upload that cannot be converted; the message says why."""
+
+
+# The options of the parsers of a worker process.
+_options = {}
+# The process ids of the workers converting uploads, by ticket (see
+# `ConversionServer`), shared with the server; 0 where there is none.
+_worker_pids = None
+
+
+def warm_worker(engine="table", prescan=False, tokenizer="stdlib", pids=None):
+    """Prepare a worker process: import the parsers, vobject and the
+    serializer, and compile the state machine table, by making a parser of
+    each kind once.  `pids` is the shared array of the workers' process
+    ids, by ticket."""
+    global _worker_pids
+    import ps2vcard.serializer  # noqa: F401
+
+    _worker_pids = pids
+    _options.update(engine=engine, prescan=prescan, tokenizer=tokenizer)
+    for kind in KINDS:
+        make_parser(kind, **_options)
+
+
+def unpack_zip(data, dirname, max_size=MAX_UNPACKED):
+    """Extract the zip archive `data` into `dirname`."""
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile as e:
+        raise ConversionError("bad zip archive: %s" % e)
+    with archive:
+        if sum(info.file_size for info in archive.infolist()) > max_size:
+            raise ConversionError("zip archive too large")
+        # `extractall` keeps the members inside `dirname`
+        archive.extractall(dirname)
+
+
+def unpack_upload(dirname, filename, data, photos=None):
+    """Save an uploaded roster in `dirname`, and return its path and kind.
+
+    `data` is the roster file named `filename`, or a zip archive with a
+    roster in it; `photos` is a zip archive of the photo directory of a
+    roster page, or None.  A zipped roster brings its own photos.
+    """
+    if data[:4] == b"PK\x03\x04":
+        if photos:
+            raise ConversionError(
+                "%s is a zip archive, which holds the photos; "
+                "send no photos field with it" % filename
+            )
+        unpack_zip(data, dirname)
+        rosters = find_rosters([dirname])
+        if not rosters:
+            raise ConversionError("no roster in %s" % filename)
+        (path, kind, relpath) = rosters[0]
+        return (path, kind)
+    name = os.path.basename(filename)
+    path = os.path.join(dirname, name if name not in ("", ".", "..") else "roster")
+    # The photos go first, so that the roster replaces any file of the
+    # archive that has its name.
+    if photos:
+        unpack_zip(photos, dirname)
+    if os.path.isdir(path):
+        raise ConversionError("the photos archive has a directory named %s" % name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return (path, sniff(path))
+
+
+def render(output, parser, course, students):
+    """Return the bytes of the response in the format `output` (see
+    `OUTPUT_FORMATS`) for the records of a roster."""
+    from ps2vcard.serializer import serialize_vcard
+    from ps2vcard.writers import AmcCsvWriter, VcardWriter
+
+    if output == "amc":
+        text = io.StringIO(newline="")
+        AmcCsvWriter(text).write(students)
+        return text.getvalue().encode("utf-8")
+    cards = (parser.student_to_vcard(student, course) for student in students)
+    if output == "vcf":
+        return b"".join(serialize_vcard(card).encode() for card in cards)
+    buffer = io.BytesIO()
+    names = VcardWriter()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        used = Counter()
+        for card in cards:
+            name = names.card_file_name(card)
+            used[name] += 1
+            if used[name] > 1:
+                name = "%s_%d.vcf" % (name[: -len(".vcf")], used[name])
+            with timings.stage("write"):
+                archive.writestr(name, serialize_vcard(card))
+    return buffer.getvalue()
+
+
+def convert_upload(
+    filename, data, photos=None, output="vcf", kind=None, ticket=None
+):  # fmt: skip
+    """Convert an uploaded roster, in a worker process.
+
+    Return the bytes of the response, the number of students and the stage
+    timings of the conversion.  While it runs, the process id of the
+    worker is kept under `ticket`, so that the server can kill the worker.
+    """
+    if ticket is None or _worker_pids is None:
+        return _convert_upload(filename, data, photos, output, kind)
+    _worker_pids[ticket] = os.getpid()
+    try:
+        return _convert_upload(filename, data, photos, output, kind)
+    finally:
+        _worker_pids[ticket] = 0
+
+
+def _convert_upload(filename, data, photos, output, kind):
+    with timings.collecting() as collector:
+        with tempfile.TemporaryDirectory(prefix="ps2vcard-serve-") as dirname:
+            (path, found) = unpack_upload(dirname, filename, data, photos)
+            kind = kind or found
+            if kind is None:
+                raise ConversionError(
+                    "cannot tell what kind of roster %s is" % filename
+                )
+            if output == "amc" and kind not in ("xls", "csv"):
+                raise ConversionError(
+                    "AMC CSV needs a spreadsheet or CSV roster; %s is a %s roster"
+                    % (filename, kind)
+                )
+            parser = make_parser(kind, **_options)
+            (course, students) = parser.parse_records(path)
+            body = render(output, parser, course, students)
+    return (body, len(students), collector.as_dict()["stages"])
+
+
+def content_disposition(filename):
+    """Return the `Content-Disposition` of a response to download as
+    `filename`, a name the client chose.
+
+    The `filename` parameter gets the base name with anything but letters,
+    digits, spaces, dots, dashes and underscores replaced, so that it can
+    neither end the quoted string nor the header; a name that needed
+    replacing is also given in full, percent-encoded, as `filename*`
+    (RFC 6266).
+    """
+    filename = os.path.basename(filename.replace("\\", "/")) or "roster"
+    plain = re.sub(r"[^A-Za-z0-9 ._-]", "_", filename)
+    value = 'attachment; filename="%s"' % plain
+    if plain != filename:
+        value += "; filename*=UTF-8''%s" % urllib.parse.quote(filename, safe="")
+    return value
+
+
+def parse_form(content_type, body):
+    """Return the fields of a `multipart/form-data` body, as a dictionary of
+    `(filename, bytes)` by name."""
+    head = ("Content-Type: %s\r\n\r\n" % content_type).encode("latin-1")
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        head + body
+    )
+    if not message.is_multipart():
+        raise ConversionError("bad multipart/form-data body")
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name:
+            fields[name] = (part.get_filename(), part.get_payload(decode=True))
+    return fields
+
+
+class Metrics(object):
+    """Counts and timings of the requests of a server."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.statuses = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.students = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latencies = deque(maxlen=window)
+        # the stages of the conversions, summed over the workers
+        self.stages = timings.Timings()
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def end(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def record(self, status, bytes_in, bytes_out, seconds=None):
+        """Count a response; `seconds` is the latency of a conversion."""
+        with self.lock:
+            self.requests += 1
+            self.statuses[status] += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            if status == 503:
+                self.rejected += 1
+            elif status == 504:
+                self.timeouts += 1
+            if seconds is not None:
+                self.latencies.append(seconds)
+
+    def as_dict(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            metrics = {
+                "uptime": time.time() - self.started,
+                "requests": self.requests,
+                "statuses": {str(k): v for (k, v) in sorted(self.statuses.items())},
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "students": self.students,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+            }
+        latency = {"count": len(latencies)}
+        if latencies:
+            latency.update(
+                mean=sum(latencies) / len(latencies),
+                max=latencies[-1],
+                **{
+                    "p%d" % p: latencies[min(len(latencies) - 1,
+                                             len(latencies) * p // 100)]
+                    for p in (50, 95, 99)
+                },
+            )  # fmt: skip
+        metrics["latency"] = latency
+        metrics["stages"] = self.stages.as_dict()["stages"]
+        return metrics
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    """The requests of a `ConversionServer`."""
+
+    server_version = "ps2vcard"
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+    def reply(self, status, body, content_type, headers=(), seconds=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for (name, value) in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.metrics.record(status, self.bytes_in, len(body), seconds)
+
+    def reply_json(self, status, value, headers=(), seconds=None):
+        body = (json.dumps(value, indent=1) + "\n").encode()
+        self.reply(status, body, "application/json", headers, seconds)
+
+    def reply_error(self, status, message, headers=(), seconds=None):
+        self.reply_json(status, {"error": message}, headers, seconds)
+
+    def do_GET(self):
+        self.bytes_in = 0
+        path = urllib.parse.urlsplit(self.path).path
+        if path == "/health":
+            self.reply_json(200, {"status": "ok", "workers": self.server.workers})
+        elif path == "/metrics":
+            self.reply_json(200, self.server.metrics.as_dict())
+        else:
+            self.reply_error(404, "no such page: %s" % path)
+
+    def do_POST(self):
+        # the size of the body, once it is known to be a valid one
+        self.bytes_in = 0
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/convert":
+            self.close_connection = True
+            self.reply_error(404, "no such page: %s" % url.path)
+            return
+        server = self.server
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self.close_connection = True
+            self.reply_error(411, "a Content-Length is needed")
+            return
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            self.reply_error(400, "bad Content-Length")
+            return
+        if length > server.max_upload:
+            self.close_connection = True
+            self.reply_error(
+                413, "uploads are limited to %d bytes" % server.max_upload
+            )
+            return
+        self.bytes_in = length
+        if not server.slots.acquire(blocking=False):
+            self.close_connection = True
+            self.reply_error(
+                503, "too many conversions at once", [("Retry-After", "1")]
+            )
+            return
+        ticket = server.tickets.get_nowait()
+        server.metrics.begin()
+        try:
+            self.convert(url.query, length, ticket)
+        finally:
+            server.metrics.end()
+            server.tickets.put(ticket)
+            server.slots.release()
+
+    def convert(self, query, length, ticket):
+        start = time.perf_counter()
+        server = self.server
+        params = dict(urllib.parse.parse_qsl(query))
+        output = params.get("format", "vcf")
+        kind = params.get("kind")
+        if output not in OUTPUT_FORMATS:
+            self.close_connection = True
+            self.reply_error(400, "unknown format: %s" % output)
+            return
+        if kind is not None and kind not in KINDS:
+            self.close_connection = True
+            self.reply_error(400, "unknown kind of roster: %s" % kind)
+            return
+        data = self.rfile.read(length)
+        filename = params.get("filename", "roster")
+        photos = None
+        try:
+            content_type = self.headers.get("Content-Type", "")
+            if content_type.startswith("multipart/form-data"):
+                fields = parse_form(content_type, data)
+                if "roster" not in fields:
+                    raise ConversionError("no roster field in the form")
+                (filename, data) = fields["roster"]
+                filename = filename or "roster"
+                photos = fields.get("photos", (None, None))[1]
+            task = server.pool.apply_async(
+                convert_upload, (filename, data, photos, output, kind, ticket)
+            )
+            (body, students, stages) = task.get(server.timeout)
+        except ConversionError as e:
+            self.reply_error(422, str(e), seconds=time.perf_counter() - start)
+            return
+        except multiprocessing.TimeoutError:
+            self.close_connection = True
+            self.reply_error(
+                504, "conversion took over %g s" % server.timeout,
+                seconds=time.perf_counter() - start,
+            )  # fmt: skip
+            # The worker goes on converting the upload; its slot is only
+            # given back, by `do_POST`, once the worker is free again, or
+            # killed `kill_after` seconds on (the pool starts another).
+            # A conversion still waiting for a worker cannot be killed yet.
+            while not task.ready():
+                task.wait(server.kill_after)
+                if not task.ready() and server.kill_worker(ticket):
+                    break
+            return
+        except Exception:
+            logger.exception("failed to convert %s", filename)
+            error = traceback.format_exc(limit=1).strip().splitlines()[-1]
+            self.reply_error(500, error, seconds=time.perf_counter() - start)
+            return
+        server.metrics.stages.merge(stages)
+        with server.metrics.lock:
+            server.metrics.students += students
+        seconds = time.perf_counter() - start
+        (content_type, extension) = OUTPUT_FORMATS[output]
+        name = "amc" if output == "amc" else os.path.splitext(filename)[0]
+        server_timing = ", ".join(
+            ["total;dur=%.1f" % (seconds * 1000)]
+            + [
+                "%s;dur=%.1f" % (stage.replace(" ", "-"), totals["seconds"] * 1000)
+                for (stage, totals) in stages.items()
+            ]
+        )
+        self.reply(
+            200,
+            body,
+            content_type,
+            [
+                ("Content-Disposition", content_disposition(name + extension)),
+                ("X-Students", str(students)),
+                ("Server-Timing", server_timing),
+            ],
+            seconds=seconds,
+        )  # fmt: skip
+
+
+class ConversionServer(ThreadingHTTPServer):
+    """An HTTP server that converts rosters on a pool of `workers`
+    processes.
+
+    The workers are forked, and warmed up, before the server binds to
+    `address`.  `max_concurrent` (by default, twice the number of
+    workers), `max_upload`, `timeout` and `kill_after` limit the requests,
+    as described above; `engine`, `prescan` and `tokenizer` are the options of the
+    parsers.  Call `server_close` to stop the workers.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        workers=None,
+        max_concurrent=None,
+        max_upload=MAX_UPLOAD,
+        timeout=TIMEOUT,
+        kill_after=KILL_AFTER,
+        engine="table",
+        prescan=False,
+        tokenizer="stdlib",
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrent = max_concurrent or 2 * self.workers
+        self.max_upload = max_upload
+        self.timeout = timeout
+        self.kill_after = kill_after
+        self.slots = threading.BoundedSemaphore(self.max_concurrent)
+        # each conversion holds a ticket, under which its worker is found
+        self.tickets = queue.SimpleQueue()
+        for ticket in range(self.max_concurrent):
+            self.tickets.put(ticket)
+        self.worker_pids = multiprocessing.RawArray("q", self.max_concurrent)
+        self.metrics = Metrics()
+        self.pool = multiprocessing.Pool(
+            self.workers,
+            initializer=warm_worker,
+            initargs=(engine, prescan, tokenizer, self.worker_pids),
+        )
+        try:
+            super().__init__(address, ConversionHandler)
+        except BaseException:
+            self.pool.terminate()
+            raise
+
+    def kill_worker(self, ticket):
+        """Kill the worker converting the upload of `ticket`; return False
+        if no worker has started on it."""
+        pid = self.worker_pids[ticket]
+        if not pid:
+            return False
+        logger.warning("killing worker %d, stuck on a conversion", pid)
+        self.worker_pids[ticket] = 0
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        return True
+
+    @property
+    def url(self):
+        (host, port) = self.server_address[:2]
+        return "http://%s:%d/" % (host, port)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.terminate()
+        self.pool.join()
@@ -0,0 +1,106 @@
+"""
+Recognizing what Albert produced
+
+Albert rosters come in several shapes: the frameset page saved from the
+Faculty Center, the roster page itself, the `ps.xls` spreadsheet export
+(an HTML table in disguise), and that export saved again as CSV.
+`sniff` tells them apart from the head of the file, without parsing it,
+and `make_parser` returns the parser for each kind.
+
+PeopleSoft pages open with several kilobytes of scripts and styles, so the
+head is read a few kilobytes at a time, and only until one of the
+telltale markers below turns up.
+"""
+
+import os
+import re
+
+from ps2vcard.timings import timed
+
+
+KINDS = ["frameset", "html", "xls", "csv"]
+
+FIRST_READ = 4 * 1024
+MAX_READ = 64 * 1024
+
+# the header row of the spreadsheet export
+XLS_PATTERN = re.compile(rb"<th[^>]*>\s*(?:Notify|Campus ID)\s*</th>", re.I)
+# the page, component or field names of the class roster page
+HTML_PATTERN = re.compile(rb"SSR_CLASROST|SS_CLASS_ROSTER|CLASS_ROSTER_VW_EMPLID\$")
+# the frame that holds the roster page
+FRAMESET_PATTERN = re.compile(
+    rb"<i?frame\b[^>]*\bname\s*=\s*[\"']?TargetContent\b", re.I
+)
+CSV_HEADERS = (b"Campus ID", b"Name", b"Email Address")
+
+
+def classify(head):
+    """Return the kind of roster that starts with the bytes `head`, or None
+    if `head` does not tell."""
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if not text.startswith(b"<"):
+        first_line = text.split(b"\n", 1)[0]
+        if b"," in first_line and all(h in first_line for h in CSV_HEADERS):
+            return "csv"
+        return None
+    if XLS_PATTERN.search(head):
+        return "xls"
+    if HTML_PATTERN.search(head):
+        return "html"
+    if FRAMESET_PATTERN.search(head):
+        return "frameset"
+    return None
+
+
+@timed("sniff")
+def sniff(path, max_read=MAX_READ):
+    """Return the kind of roster stored at `path`, or None.
+
+    The kinds are `"frameset"`, `"html"`, `"xls"` and `"csv"`.  At most
+    `max_read` bytes are read.
+    """
+    if os.path.isdir(path):
+        return None
+    size = FIRST_READ
+    with open(path, "rb") as f:
+        head = f.read(size)
+        while True:
+            kind = classify(head)
+            if kind is not None:
+                return kind
+            if not head.lstrip().startswith(b"<") or len(head) >= max_read:
+                return None
+            more = f.read(min(size, max_read - len(head)))
+            if not more:
+                return None
+            head += more
+            size *= 2
+
+
+def make_parser(kind, engine="table", prescan=False, tokenizer="stdlib"):
+    """Return a parser for rosters of `kind`.
+
+    `engine` is the state machine engine of the HTML parsers, `prescan`
+    turns on their prescan (see `ps2vcard.parsers.prescan`), and
+    `tokenizer` is their tokenizer (see `ps2vcard.parsers.tokenizers`).
+    """
+    from ps2vcard.parsers.csv import AlbertRosterCsvParser
+    from ps2vcard.parsers.html import (
+        AlbertRosterFramesetParser,
+        AlbertRosterHtmlParser,
+        AlbertRosterXlsParser,
+    )
+
+    if kind == "html":
+        return AlbertRosterHtmlParser(
+            engine=engine, prescan=prescan, tokenizer=tokenizer
+        )
+    if kind == "frameset":
+        return AlbertRosterFramesetParser(
+            engine=engine, prescan=prescan, tokenizer=tokenizer
+        )
+    if kind == "xls":
+        return AlbertRosterXlsParser()
+    if kind == "csv":
+        return AlbertRosterCsvParser()
+    raise ValueError("unknown roster kind: %s" % kind)
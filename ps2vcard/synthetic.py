@@ -0,0 +1,454 @@
+"""
+Synthetic Albert rosters
+
+Generates roster pages shaped like the ones saved from Albert's
+"Access Class Rosters" page, Faculty Center framesets around them,
+spreadsheet exports shaped like its `ps.xls`, and CSV copies of those,
+with any number of students.  They are meant for benchmarks and tests:
+the fixtures under `tests/data` are too small to tell how the parsers
+scale.
+
+To write a roster from the command line:
+
+    $ python -m ps2vcard.synthetic --kind frameset --photo-size 20000 \
+        10000 "Faculty Center.html"
+"""
+
+import csv
+from html import escape
+import os
+import random
+
+import click
+
+GIVEN_NAMES = [
+    "Annie", "Antonio", "Bonnie", "Bruce", "Carlos", "Christina", "Clarence",
+    "Cynthia", "Denise", "Edward", "Emily", "Eugene", "Harry", "Jessica",
+    "Jimmy", "Joan", "Joe", "Jose", "Joshua", "Julia", "Karen", "Kathryn",
+    "Lillian", "Margaret", "Martin", "Melissa", "Michelle", "Nicholas",
+    "Nicole", "Patricia", "Paul", "Rose", "Ruby", "Ruth", "Sharon", "Steve",
+    "Virginia",
+]  # fmt: skip
+FAMILY_NAMES = [
+    "Adams", "Black", "Bradley", "Carpenter", "Carr", "Chavez", "Cunningham",
+    "Dunn", "Elliott", "Ford", "Foster", "Freeman", "Green", "Harper", "Hart",
+    "Hernandez", "Howard", "Jackson", "James", "Lane", "Lawson", "Lynch",
+    "Matthews", "Mills", "Murphy", "Parker", "Porter", "Roberts", "Rodriguez",
+    "Schmidt", "Stewart", "Stone", "Walter", "Weaver", "Williams", "Wright",
+]  # fmt: skip
+PROGPLANS = [
+    "UA-Coll of Arts & Sci - \n\nUndecided",
+    "UA-Coll of Arts & Sci - \n\nEconomics",
+    "UA-Coll of Arts & Sci - \n\nMathematics",
+    "UB-Stern Schl Business-Ugrd - \n\nBusiness",
+    "UB-Stern Schl Business-Ugrd - \n\nBusiness and Political Economy",
+    "UF-Global Liberal Studies - \n\nGlobal Liberal Studies - Core",
+    "UT-Tandon School of Engineering - \n\nComputer Science",
+    "UE-Steinhardt - \n\nMusic Business",
+]
+LEVELS = ["Freshman", "Sophomore", "Junior", "Senior"]
+
+COURSE = {
+    "code": "MATH-UA 122 - 005  (8070)",
+    "description": "Spring 2017 | Regular Academic Session"
+    " | New York University | Undergraduate",
+    "name": "Calculus II (Lecture)",
+    "schedule": "TuTh 11:00AM-12:50PM",
+    "room": "Bldg:WAVE&nbsp; Room:367 Loc: Washington Square",
+    "instructor": "Matthew P Leingang",
+    "dates": "01/23/2017 - 05/08/2017",
+}
+
+# A 1x1 baseline JPEG.  Larger photos get a comment segment of padding.
+JPEG_HEAD = bytes.fromhex(
+    "ffd8ffe000104a46494600010100000100010000ffdb004300080606070605080707070909"
+    "080a0c140d0c0b0b0c1912130f141d1a1f1e1d1a1c1c20242e2720222c231c1c2837292c30"
+    "313434341f27393d38323c2e333432ffc0000b080001000101011100ffc4001f0000010501"
+    "010101010100000000000000000102030405060708090a0bffc400b51000020103030204"
+    "03050504040000017d01020300041105122131410613516107227114328191a1082342b1"
+    "c11552d1f02433627282090a161718191a25262728292a3435363738393a434445464748"
+    "494a535455565758595a636465666768696a737475767778797a838485868788898a9293"
+    "9495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9cad2d3"
+    "d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8f9faffda0008010100003f"
+    "00d2cf20ffd9"
+)
+
+PAGE_HEAD = """<!DOCTYPE html>
+<html dir="ltr" lang="en"><head>
+<meta http-equiv="Content-Type" content="text/html; charset=UTF-8">
+<title>Access Class Rosters</title>
+<link rel="stylesheet" type="text/css" href="./PSSTYLEREQ_1.css">
+</head>
+<body class="PSPAGE" id="ptifrmtgtframe">
+<form name="win0" method="post" action="#" autocomplete="off">
+<table border="0" id="ACE_width" cellpadding="0" cellspacing="0" class="PSPAGECONTAINER">
+<tbody><tr>
+<td valign="top" align="left">
+<div id="win0divDERIVED_SSR_FC_SSS_PAGE_KEYDESCR2"><span class="SSSKEYTEXT" id="DERIVED_SSR_FC_SSS_PAGE_KEYDESCR2">{description}</span>
+</div></td>
+</tr>
+<tr>
+<td valign="top" align="left">
+<div id="win0divDERIVED_SSR_FC_SSR_CLASSNAME_LONG"><span id="DERIVED_SSR_FC_SSR_CLASSNAME_LONG$span" class="PALEVEL0SECONDARY" title="View Details"><a name="DERIVED_SSR_FC_SSR_CLASSNAME_LONG" id="DERIVED_SSR_FC_SSR_CLASSNAME_LONG" ptlinktgt="pt_peoplecode" tabindex="30" href="javascript:submitAction_win0(document.win0,&#39;DERIVED_SSR_FC_SSR_CLASSNAME_LONG&#39;);" class="PALEVEL0SECONDARY">{code}</a></span>
+</div></td>
+</tr>
+<tr>
+<td valign="top" align="left">
+<div id="win0divDERIVED_SSR_FC_DESCR254"><span class="PSEDITBOX_DISPONLY" id="DERIVED_SSR_FC_DESCR254">{name}</span>
+</div></td>
+</tr>
+<tr id="trCLASS_MTG_NBR$0_row1" valign="center">
+<td align="left" class="PSLEVEL3GRIDODDROW">
+<div id="win0divMTG_SCHED$0"><span class="PSLONGEDITBOX" id="MTG_SCHED$0">{schedule}</span>
+</div></td>
+<td align="left" class="PSLEVEL3GRIDODDROW">
+<div id="win0divMTG_LOC$0"><span class="PSLONGEDITBOX" id="MTG_LOC$0">{room}</span>
+</div></td>
+<td align="left" class="PSLEVEL3GRIDODDROW">
+<div id="win0divMTG_INSTR$0"><span class="PSLONGEDITBOX" id="MTG_INSTR$0">{instructor}</span>
+</div></td>
+<td align="left" class="PSLEVEL3GRIDODDROW">
+<div id="win0divMTG_DATE$0"><span class="PSLONGEDITBOX" id="MTG_DATE$0">{dates}</span>
+</div></td>
+</tr>
+<tr>
+<td valign="top" align="left">
+<table border="0" id="ACE_CLASS_ROSTER_VW$0" cellpadding="0" cellspacing="0" cols="7" width="653" class="PSLEVEL1SCROLLAREABODY" style="border-style:none">
+<tbody>
+"""
+
+STUDENT_ROW = """<tr>
+<td height="27" colspan="4"></td>
+<td rowspan="4" valign="top" align="left">
+<div id="win0divDERIVED_AA2_$228${i}"><table border="0" id="ACE_DERIVED_AA2_$228${i}" cellpadding="0" cellspacing="0" cols="8" width="495" class="PABACKGROUNDINVISIBLE" style="border-style:none">
+<tbody><tr>
+<td height="24"></td>
+<td colspan="7" nowrap="nowrap" valign="top" align="left">
+<div id="win0divDERIVED_AA2_SELECT${i}"><input type="hidden" name="DERIVED_AA2_SELECT$chk${i}" id="DERIVED_AA2_SELECT$chk${i}" value="">
+<input type="checkbox" name="DERIVED_AA2_SELECT${i}" id="DERIVED_AA2_SELECT${i}" class="PSCHECKBOX" tabindex="85" value="Y" onclick="setupTimeout2();	this.form.DERIVED_AA2_SELECT$chk${i}.value=(this.checked?&#39;Y&#39;:&#39;N&#39;);doFocus_win0(this,false,true);"><label for="DERIVED_AA2_SELECT${i}" id="DERIVED_AA2_SELECT_LBL${i}" class="PSCHECKBOX">Notify</label>
+</div></td>
+</tr>
+<tr>
+<td height="1" colspan="2"></td>
+<td colspan="3" rowspan="2" valign="top" align="left">
+<div id="win0divCLASS_ROSTER_VW_EMPLIDlbl${i}"><span class="PSEDITBOXLABEL">ID</span> </div></td>
+</tr>
+<tr>
+<td height="19" colspan="2"></td>
+<td colspan="3" rowspan="2" valign="top" align="left">
+<div id="win0divCLASS_ROSTER_VW_EMPLID${i}"><span class="PSEDITBOX_DISPONLY" id="CLASS_ROSTER_VW_EMPLID${i}">{emplid}</span>
+</div></td>
+</tr>
+<tr>
+<td height="20" colspan="2"></td>
+<td colspan="3" valign="top" align="left">
+<div id="win0divSCC_PRFPRIMNMVW_NAME${i}"><span class="PSEDITBOX_DISPONLY" id="SCC_PRFPRIMNMVW_NAME${i}">{name}</span>
+</div></td>
+</tr>
+<tr>
+<td height="3" colspan="4"></td>
+<td colspan="4" rowspan="2" nowrap="nowrap" valign="top" align="left">
+<div id="win0divDERIVED_SSSMAIL_EMAIL_ADDR${i}"><span id="DERIVED_SSSMAIL_EMAIL_ADDR$span${i}" class="PSHYPERLINK" title="Send E-mail"><a name="DERIVED_SSSMAIL_EMAIL_ADDR${i}" id="DERIVED_SSSMAIL_EMAIL_ADDR${i}" ptlinktgt="pt_replace" tabindex="87" onfocus="doFocus_win0(this,false,true);" href="mailto:{email}" class="PSHYPERLINK">{email}</a></span>
+</div></td>
+</tr>
+<tr>
+<td height="19" colspan="2"></td>
+<td colspan="3" rowspan="2" valign="top" align="left">
+<div id="win0divSCC_PREF_PHN_VW_PHONE${i}"><span class="PSEDITBOX_DISPONLY" id="SCC_PREF_PHN_VW_PHONE${i}">{phone}</span>
+</div></td>
+</tr>
+<tr>
+<td height="19" colspan="2"></td>
+<td colspan="3" valign="top" align="right">
+<div id="win0divCLASS_ROSTER_VW_UNT_TAKEN${i}"><span class="PSEDITBOX_DISPONLY" id="CLASS_ROSTER_VW_UNT_TAKEN${i}">4.00</span>
+</div></td>
+</tr>
+<tr>
+<td height="19" colspan="2"></td>
+<td colspan="3" rowspan="2" valign="top" align="left">
+<div id="win0divPROGPLAN${i}"><span class="PSEDITBOX_DISPONLY" id="PROGPLAN${i}">{progplan}</span>
+</div></td>
+</tr>
+<tr>
+<td height="19" colspan="2"></td>
+<td colspan="3" valign="top" align="left">
+<div id="win0divPROGPLAN1${i}"><span class="PSEDITBOX_DISPONLY" id="PROGPLAN1${i}">{level}</span>
+</div></td>
+</tr>
+<tr>
+<td height="11" colspan="2"></td>
+<td colspan="2" valign="top" align="left">
+<div id="win0divPSXLATITEM_XLATLONGNAME${i}"><span class="PSEDITBOX_DISPONLY" id="PSXLATITEM_XLATLONGNAME${i}">Enrolled</span>
+</div></td>
+</tr>
+</tbody></table>
+</div></td>
+</tr>
+<tr>
+<td height="102" colspan="2"></td>
+<td rowspan="2" valign="top" align="left">
+<div id="win0divDERIVED_AA2_$227${i}"><table cellpadding="2" cellspacing="0" cols="1" class="PSGROUPBOXWBO" width="119">
+<tbody><tr><td width="117">
+{photo}
+</td></tr>
+</tbody></table>
+</div></td>
+</tr>
+"""
+
+PHOTO_CELL = """<div id="{photo_key}${i}"><img src="{src}" width="110" height="110" alt="" title="" class="PSIMAGE">
+</div>"""
+
+NO_PHOTO_CELL = """<div id="win0divDERIVED_SSS_ADV_DESCR$14"><span class="PSEDITBOX_DISPONLY" id="DERIVED_SSS_ADV_DESCR$14">No Photo On File</span>
+</div>"""
+
+PAGE_TAIL = """</tbody></table>
+</td>
+</tr>
+</tbody></table>
+</form>
+</body></html>
+"""
+
+XLS_HEAD = """<html dir='ltr' lang='en'>
+<!-- Copyright (c) 2000, 2013, Oracle and/or its affiliates. All rights reserved. -->
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8" /><body><table border='1' cellpadding='3' cellspacing='0'>
+<tr>
+<th>Notify</th><th>Photo</th><th>Campus ID</th><th>Name</th><th>Email Address</th><th>Telephone</th><th>Units</th><th>Program and Plan</th><th>Level</th><th>Subject</th><th>Catalog</th><th>Section</th><th>Advising Alert</th></tr>
+"""
+
+# Albert leaves the rows of the export unclosed.
+XLS_ROW = """<tr>
+<td></td>
+<td>Photo</td>
+<td>{Campus ID}</td>
+<td>{Name}</td>
+<td>{Email Address}</td>
+<td>&quot;{Telephone}&quot;</td>
+<td>{Units}.00</td>
+<td>{Program and Plan}</td>
+<td>{Level}</td>
+<td>{Subject}</td>
+<td> {Catalog}</td>
+<td>{Section:0>3}</td>
+<td>Alert Advisor</td>
+"""
+
+XLS_TAIL = """</table></body></html>
+"""
+
+CSV_COLUMNS = [
+    "Notify", "Photo", "Campus ID", "Name", "Email Address", "Telephone",
+    "Units", "Program and Plan", "Level", "Subject", "Catalog", "Section",
+    "Advising Alert",
+]  # fmt: skip
+
+FRAMESET = """<html dir="ltr"><head><meta http-equiv="Content-Type" content="text/html; charset=UTF-8">
+<title>Faculty Center</title>
+</head>
+<frameset rows="144,*">
+<frame title="UniversalHeader" name="UniversalHeader" frameborder="no" noresize="" src="./{files}/WEBLIB_PORTAL.PORTAL_HEADER.FieldFormula.html">
+<frame title="TargetContent" name="TargetContent" frameborder="no" noresize="" src="./{files}/{roster}">
+<noframes>
+&lt;body bgcolor="#FFFFFF"&gt;
+&lt;/body&gt;
+</noframes>
+</frameset>
+</html>
+"""
+FRAMESET_HEADER = """<html><head><title>Faculty Center</title></head>
+<body class="PSPAGE"></body></html>
+"""
+FRAMESET_ROSTER = "SA_LEARNING_MANAGEMENT.SS_FACULTY.html"
+
+KINDS = ["html", "frameset", "xls", "csv"]
+
+
+def make_students(count, seed=0):
+    """Return a list of `count` random student dictionaries.
+
+    The keys are those of `tests/data/mock.csv`.
+    """
+    rng = random.Random(seed)
+    students = []
+    for index in range(count):
+        given = rng.choice(GIVEN_NAMES)
+        family = rng.choice(FAMILY_NAMES)
+        netid = "%s%s%d" % (given[0].lower(), family[0].lower(), 100 + index)
+        students.append(
+            {
+                "id": "%08d" % rng.randrange(10 ** 8),
+                "Campus ID": "N%08d" % (10 ** 7 + index),
+                "first_name": given,
+                "last_name": family,
+                "Name": "%s,%s" % (family, given),
+                "Email Address": netid + "@nyu.edu",
+                "Telephone": "%d-(%03d)%03d-%04d"
+                % (
+                    rng.randrange(1, 999),
+                    rng.randrange(1000),
+                    rng.randrange(1000),
+                    rng.randrange(10000),
+                ),
+                "Units": "4",
+                "Program and Plan": rng.choice(PROGPLANS),
+                "Level": rng.choice(LEVELS),
+                "Subject": "MATH-UA",
+                "Catalog": "122",
+                "Section": "5",
+            }
+        )
+    return students
+
+
+def make_photo(size=0):
+    """Return the bytes of a JPEG image of roughly `size` bytes."""
+    padding = max(0, min(size - len(JPEG_HEAD) - 4, 0xFFFD))
+    if not padding:
+        return JPEG_HEAD
+    segment = b"\xff\xfe" + (padding + 2).to_bytes(2, "big") + b"\0" * padding
+    return JPEG_HEAD[:2] + segment + JPEG_HEAD[2:]
+
+
+def write_html_roster(path, students, photo_size=None, files_dir=None):
+    """Write an Albert roster HTML page for `students` to `path`.
+
+    If `photo_size` is given, each student gets a photo of about that many
+    bytes, saved in a `_files` directory next to `path` the way a browser
+    saves a complete web page, or in `files_dir`.
+    """
+    from ps2vcard.parsers.html import AlbertRosterHtmlParser
+
+    photo_key = AlbertRosterHtmlParser.photo_key
+    if photo_size is not None:
+        if files_dir is None:
+            files_dir = os.path.splitext(path)[0] + "_files"
+        relative_dir = os.path.relpath(files_dir, os.path.dirname(path) or ".")
+        os.makedirs(files_dir, exist_ok=True)
+        photo = make_photo(photo_size)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(PAGE_HEAD.format(**COURSE))
+        for index, student in enumerate(students):
+            if photo_size is None:
+                cell = NO_PHOTO_CELL
+            else:
+                filename = "photo%d.jpg" % index
+                with open(os.path.join(files_dir, filename), "wb") as g:
+                    g.write(photo)
+                src = "./" + os.path.normpath(os.path.join(relative_dir, filename))
+                cell = PHOTO_CELL.format(photo_key=photo_key, i=index, src=src)
+            f.write(
+                STUDENT_ROW.format(
+                    i=index,
+                    emplid=student["id"],
+                    name=escape(student["Name"]),
+                    email=student["Email Address"],
+                    phone=student["Telephone"],
+                    progplan=escape(student["Program and Plan"]),
+                    level=student["Level"],
+                    photo=cell,
+                )
+            )
+        f.write(PAGE_TAIL)
+    return path
+
+
+def write_xls_roster(path, students):
+    """Write an Albert `ps.xls` spreadsheet export for `students` to `path`.
+
+    Like the real thing, it is an HTML table in disguise.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(XLS_HEAD)
+        for student in students:
+            fields = {key: escape(value) for (key, value) in student.items()}
+            fields["Program and Plan"] = fields["Program and Plan"].replace(
+                " - \n\n", " - \n\r", 1
+            )
+            f.write(XLS_ROW.format(**fields))
+        f.write(XLS_TAIL)
+    return path
+
+
+def write_frameset(path, students, photo_size=None):
+    """Write a Faculty Center frameset for `students` to `path`.
+
+    The roster page and the photos are saved in a `_files` directory next
+    to `path`, as a browser saves the frames of a complete web page.
+    """
+    files_dir = os.path.splitext(path)[0] + "_files"
+    os.makedirs(files_dir, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            FRAMESET.format(files=os.path.basename(files_dir), roster=FRAMESET_ROSTER)
+        )
+    header_path = os.path.join(files_dir, "WEBLIB_PORTAL.PORTAL_HEADER.FieldFormula.html")
+    with open(header_path, "w", encoding="utf-8") as f:
+        f.write(FRAMESET_HEADER)
+    write_html_roster(
+        os.path.join(files_dir, FRAMESET_ROSTER),
+        students,
+        photo_size=photo_size,
+        files_dir=files_dir,
+    )
+    return path
+
+
+def write_csv_roster(path, students):
+    """Write a `ps.xls` export for `students` saved as CSV to `path`.
+
+    Line breaks in a cell are written as `\\n` escapes, as in
+    `tests/data/ps.csv`.
+    """
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for student in students:
+            row = dict(student, Notify="", Photo="Photo")
+            row["Advising Alert"] = "Alert Advisor"
+            row["Program and Plan"] = row["Program and Plan"].replace("\n", "\\n")
+            writer.writerow([row[column] for column in CSV_COLUMNS])
+    return path
+
+
+def write_roster(kind, path, students, photo_size=None):
+    """Write a roster of `kind` (one of `KINDS`) for `students` to `path`.
+
+    Only the roster page and the frameset have photos.
+    """
+    if kind == "html":
+        return write_html_roster(path, students, photo_size=photo_size)
+    if kind == "frameset":
+        return write_frameset(path, students, photo_size=photo_size)
+    if kind == "xls":
+        return write_xls_roster(path, students)
+    if kind == "csv":
+        return write_csv_roster(path, students)
+    raise ValueError("unknown roster kind: %s" % kind)
+
+
+@click.command()
+@click.option(
+    "--kind",
+    type=click.Choice(KINDS),
+    default="html",
+    show_default=True,
+    help="kind of roster to write",
+)
+@click.option(
+    "--photo-size",
+    type=int,
+    default=None,
+    metavar="BYTES",
+    help="give each student a photo of about BYTES bytes (html and frameset)",
+)
+@click.option("--seed", type=int, default=0, show_default=True, help="random seed")
+@click.argument("count", type=click.IntRange(min=0))
+@click.argument("path", type=click.Path(dir_okay=False))
+def main(kind, photo_size, seed, count, path):
+    """Write a synthetic Albert roster of COUNT students to PATH."""
+    write_roster(kind, path, make_students(count, seed=seed), photo_size=photo_size)
+
+
+if __name__ == "__main__":
+    main()
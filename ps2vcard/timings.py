@@ -0,0 +1,224 @@
+"""
+Timing the stages of a conversion
+
+A conversion reads a file, tokenizes HTML, runs the roster state machine,
+reads photos, builds vCards, serializes them and writes them out.  The
+parsers, writers and photo code mark each of those stages with `stage`,
+`timed` or `timed_iter`.  Nothing is measured unless a `Timings` collector
+is active (see `collecting`), and then every stage records its wall time,
+its number of calls and the bytes it handled.
+
+Stages nest: the time of a stage does not include the time of the stages
+inside it, so the photo reads done while a card is serialized count as
+"photos", not as "serialize".  Each thread keeps its own stack of stages.
+"""
+
+from contextlib import contextmanager
+import functools
+import json
+import threading
+import time
+
+
+class Timer(object):
+    """A stage being timed; use it as a context manager."""
+
+    __slots__ = ("timings", "name", "calls", "bytes", "start", "inner")
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+        self.calls = 1
+        self.bytes = 0
+
+    def add_bytes(self, count):
+        self.bytes += count
+
+    def __enter__(self):
+        stack = self.timings.stack()
+        stack.append(self)
+        self.inner = 0.0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        stack = self.timings.stack()
+        stack.pop()
+        if stack:
+            stack[-1].inner += elapsed
+        self.timings.add(self.name, elapsed - self.inner, self.calls, self.bytes)
+        return False
+
+
+class NullTimer(object):
+    """Stands in for a `Timer` when nothing is being timed."""
+
+    __slots__ = ()
+
+    def add_bytes(self, count):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Timings(object):
+    """Wall time, calls and bytes of each stage, in order of first use."""
+
+    def __init__(self):
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def stack(self):
+        try:
+            return self.local.stack
+        except AttributeError:
+            self.local.stack = []
+            return self.local.stack
+
+    def stage(self, name):
+        return Timer(self, name)
+
+    def add(self, name, seconds, calls=1, nbytes=0):
+        with self.lock:
+            totals = self.stages.setdefault(name, [0.0, 0, 0])
+            totals[0] += seconds
+            totals[1] += calls
+            totals[2] += nbytes
+
+    def merge(self, stages):
+        """Add the stages of `as_dict()["stages"]` of another collector."""
+        for (name, totals) in stages.items():
+            self.add(name, totals["seconds"], totals["calls"], totals["bytes"])
+
+    def wall(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            "wall": self.wall(),
+            "stages": {
+                name: {"seconds": seconds, "calls": calls, "bytes": nbytes}
+                for (name, (seconds, calls, nbytes)) in self.stages.items()
+            },
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def table(self):
+        """Return the stages as a table, with the time outside any stage
+        as "other"."""
+        wall = self.wall()
+        rows = [(name,) + tuple(totals) for (name, totals) in self.stages.items()]
+        staged = sum(row[1] for row in rows)
+        rows.append(("other", max(wall - staged, 0.0), 0, 0))
+        lines = ["%-18s %10s %6s %10s %14s" % ("stage", "seconds", "%", "calls", "bytes")]
+        for (name, seconds, calls, nbytes) in rows:
+            lines.append(
+                "%-18s %10.3f %6.1f %10s %14s"
+                % (
+                    name,
+                    seconds,
+                    100 * seconds / wall if wall else 0,
+                    calls or "",
+                    nbytes or "",
+                )
+            )
+        lines.append("%-18s %10.3f %6.1f" % ("total", wall, 100.0))
+        return "\n".join(lines)
+
+
+_current = None
+
+
+def current():
+    """Return the active `Timings` collector, or None."""
+    return _current
+
+
+@contextmanager
+def collecting():
+    """Activate a new `Timings` collector for the duration of the block."""
+    global _current
+    previous = _current
+    _current = Timings()
+    try:
+        yield _current
+    finally:
+        _current = previous
+
+
+def stage(name):
+    """Return a context manager that times the stage `name`."""
+    timings = _current
+    if timings is None:
+        return NULL_TIMER
+    return Timer(timings, name)
+
+
+def timed(name, size=None):
+    """Decorate a function so that its calls count as the stage `name`.
+
+    If `size` is given, `size(result)` is the number of bytes handled.
+    """
+
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            timings = _current
+            if timings is None:
+                return function(*args, **kwargs)
+            with Timer(timings, name) as timer:
+                result = function(*args, **kwargs)
+                if size is not None:
+                    timer.add_bytes(size(result))
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+def timed_iter(name, iterable, size=None):
+    """Return `iterable`, with the time spent producing each item counted
+    as the stage `name`.
+
+    If `size` is given, `size(item)` is the number of bytes of each item.
+    """
+    timings = _current
+    if timings is None:
+        return iterable
+    return _timed_iter(timings, name, iter(iterable), size)
+
+
+def _timed_iter(timings, name, iterator, size):
+    while True:
+        with Timer(timings, name) as timer:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                # the time is counted, but not as an item
+                timer.calls = 0
+                return
+            if size is not None:
+                timer.add_bytes(size(item))
+        yield item
+
+
+def instrument(obj, method_names, name):
+    """Time the calls of the methods `method_names` of `obj` as the stage
+    `name`, if a collector is active."""
+    if _current is None:
+        return
+    for method_name in method_names:
+        setattr(obj, method_name, timed(name)(getattr(obj, method_name)))
@@ -0,0 +1,410 @@
+"""
+Converting rosters as they are saved
+
+At the start of a term, the rosters of many sections are saved into one
+downloads folder, a few at a time.  `RosterWatch` watches the folder and
+converts each roster that is added or changed, once it has stopped
+changing, and no other: adding one section does not rebuild the others.
+It runs in one process, so the imports of the parsers, and the state
+machine table they compile, stay warm from one roster to the next.  The
+parsers themselves are not kept: a parser holds the course and students
+of the roster it read, and has no way to forget them, so each roster gets
+a new one.
+
+Changes are reported by the kernel's inotify_ interface, called through
+`ctypes`, or, where that is not available (or with `poll=True`), found by
+comparing the sizes and times of the files every `POLL_INTERVAL` seconds.
+Saving a page with its photos takes a browser many writes, so a roster is
+converted only after nothing has happened to it (or to its `_files`
+directory) for `settle` seconds.
+
+The stamps of the rosters converted are kept in the output directory, in
+the file named by `STATE_NAME`, so that a watch started later converts
+only the rosters that changed in the meantime.
+
+.. _inotify: https://man7.org/linux/man-pages/man7/inotify.7.html
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import json
+import logging
+import os
+import select
+import struct
+import time
+
+from ps2vcard.batch import (
+    ROSTER_EXTENSIONS,
+    convert_roster,
+    find_rosters,
+    roster_outdir,
+)
+from ps2vcard.sniff import make_parser, sniff
+
+logger = logging.getLogger(__name__)
+
+SETTLE = 2.0
+POLL_INTERVAL = 1.0
+STATE_NAME = ".ps2vcard-watch.json"
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_ONLYDIR
+)  # fmt: skip
+EVENT = struct.Struct("iIII")
+
+
+def walk_dirs(dirname):
+    """Yield `dirname` and every directory under it."""
+    for root, subdirs, filenames in os.walk(dirname):
+        subdirs.sort()
+        yield root
+
+
+def walk_files(dirname):
+    """Yield the path of every file under `dirname`."""
+    for root, subdirs, filenames in os.walk(dirname):
+        subdirs.sort()
+        for filename in sorted(filenames):
+            yield os.path.join(root, filename)
+
+
+class InotifyWatcher(object):
+    """Report the files changed under some directory trees, with inotify.
+
+    Raises OSError if inotify is not available.
+    """
+
+    def __init__(self, dirnames):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError(errno.ENOSYS, "no C library")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except AttributeError:
+            raise OSError(errno.ENOSYS, "no inotify in %s" % libc_name) from None
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, "inotify_init1: %s" % os.strerror(error))
+        self.dirnames = list(dirnames)
+        self.watches = {}
+        try:
+            for dirname in self.dirnames:
+                self.add_tree(dirname)
+        except OSError:
+            self.close()
+            raise
+
+    def add_tree(self, dirname):
+        """Watch `dirname` and the directories under it."""
+        for path in walk_dirs(dirname):
+            wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error in (errno.ENOENT, errno.ENOTDIR):
+                    # gone already
+                    continue
+                raise OSError(error, "inotify_add_watch: %s" % os.strerror(error), path)
+            self.watches[wd] = path
+
+    def changes(self, timeout):
+        """Wait at most `timeout` seconds for changes, and return the paths
+        of the files changed."""
+        (ready, _, _) = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(data):
+            (wd, mask, cookie, length) = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # events were lost: every file may have changed
+                for dirname in self.dirnames:
+                    paths.extend(walk_files(dirname))
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            dirname = self.watches.get(wd)
+            if dirname is None:
+                continue
+            path = os.path.join(dirname, name) if name else dirname
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # files may have been written before the watch was added
+                    self.add_tree(path)
+                    paths.extend(walk_files(path))
+                continue
+            paths.append(path)
+        return paths
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher(object):
+    """Report the files changed under some directory trees, by comparing
+    their sizes and times every `interval` seconds."""
+
+    def __init__(self, dirnames, interval=POLL_INTERVAL):
+        self.dirnames = list(dirnames)
+        self.interval = interval
+        self.snapshot = self.scan()
+        self.next_scan = time.monotonic() + interval
+
+    def scan(self):
+        snapshot = {}
+        for dirname in self.dirnames:
+            for path in walk_files(dirname):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def changes(self, timeout):
+        """Wait at most `timeout` seconds for changes, and return the paths
+        of the files changed."""
+        wait = self.next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        if wait > 0:
+            time.sleep(wait)
+        self.next_scan = time.monotonic() + self.interval
+        (previous, self.snapshot) = (self.snapshot, self.scan())
+        return [
+            path
+            for (path, stamp) in self.snapshot.items()
+            if previous.get(path) != stamp
+        ]
+
+    def close(self):
+        pass
+
+
+def make_watcher(dirnames, poll=False):
+    """Return an `InotifyWatcher` of `dirnames`, or a `PollingWatcher` if
+    `poll` is true or inotify is not available."""
+    if not poll:
+        try:
+            return InotifyWatcher(dirnames)
+        except OSError as e:
+            logger.warning("cannot use inotify (%s); polling instead", e)
+    return PollingWatcher(dirnames)
+
+
+def source_stamp(path):
+    """Return the stamp of the roster at `path`: the time and size of the
+    file, and the time of its `_files` directory, if it has one."""
+    stat = os.stat(path)
+    files_dir = os.path.splitext(path)[0] + "_files"
+    try:
+        files_mtime = os.stat(files_dir).st_mtime_ns
+    except OSError:
+        files_mtime = 0
+    return [stat.st_mtime_ns, stat.st_size, files_mtime]
+
+
+class RosterWatch(object):
+    """Convert the rosters under the directories `dirnames` whenever they
+    are saved or changed, as `ps2vcard batch` would, into `outdir`.
+
+    Each roster is converted after it has not changed for `settle`
+    seconds.  `engine`, `prescan` and `tokenizer` are those of the HTML
+    parsers, and `photo_mode` and `photo_store` those of
+    `ps2vcard.batch.write_cards`.  With `poll`, changes are found by
+    polling even where inotify is available.
+    """
+
+    def __init__(
+        self,
+        dirnames,
+        outdir,
+        engine="table",
+        prescan=False,
+        tokenizer="stdlib",
+        settle=SETTLE,
+        poll=False,
+        photo_mode="embed",
+        photo_store=None,
+    ):
+        self.trees = [os.path.abspath(dirname) for dirname in dirnames]
+        self.outdir = os.path.abspath(outdir)
+        self.options = dict(engine=engine, prescan=prescan, tokenizer=tokenizer)
+        self.photo_options = dict(photo_mode=photo_mode, photo_store=photo_store)
+        self.settle = settle
+        self.pending = {}
+        self.state_path = os.path.join(self.outdir, STATE_NAME)
+        self.state = self.load_state()
+        # the output directories of the rosters, whose files are never
+        # rosters themselves
+        self.outdirs = set(self.roster_outdir(relpath) for relpath in self.state)
+        # Compile the state machine and import the tokenizer now, rather
+        # than when the first roster turns up; the parser itself is dropped.
+        make_parser("html", **self.options)
+        self.watcher = make_watcher(self.trees, poll=poll)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self):
+        os.makedirs(self.outdir, exist_ok=True)
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.state, f, indent=0, sort_keys=True)
+        os.replace(temp_path, self.state_path)
+
+    def tree_of(self, path):
+        """Return the watched tree that holds `path`, or None."""
+        trees = [
+            tree
+            for tree in self.trees
+            if path == tree or path.startswith(tree + os.sep)
+        ]
+        return max(trees, key=len) if trees else None
+
+    def roster_for(self, path):
+        """Return the path of the roster a change of the file at `path`
+        may concern, or None.
+
+        A file in the `_files` directory of a saved page concerns the page.
+        """
+        path = os.path.abspath(path)
+        if self.tree_of(path) is None:
+            return None
+        if any(path.startswith(outdir + os.sep) for outdir in self.outdirs):
+            return None
+        parts = path.split(os.sep)
+        for i, part in enumerate(parts[:-1]):
+            if part.endswith("_files"):
+                stem = os.sep.join(parts[:i] + [part[: -len("_files")]])
+                for extension in (".html", ".htm"):
+                    if os.path.exists(stem + extension):
+                        return stem + extension
+                return None
+        if os.path.splitext(path)[1].lower() not in ROSTER_EXTENSIONS:
+            return None
+        return path
+
+    def roster_outdir(self, relpath):
+        """Return the output directory of the roster named `relpath`."""
+        return roster_outdir(self.outdir, relpath)
+
+    def relpath(self, path):
+        """Name the roster at `path` the way `find_rosters` does."""
+        return os.path.relpath(path, os.path.dirname(self.tree_of(path)))
+
+    def outdated(self):
+        """Return the rosters under the trees that have changed since they
+        were last converted, as `(path, kind, relpath)` tuples."""
+        rosters = []
+        for (path, kind, relpath) in find_rosters(self.trees):
+            if self.state.get(relpath) != source_stamp(path):
+                rosters.append((path, kind, relpath))
+        return rosters
+
+    def convert(self, path, kind=None):
+        """Convert the roster at `path` and return its `RosterResult`, or
+        None if it is gone or is not a roster."""
+        try:
+            if kind is None:
+                kind = sniff(path)
+            stamp = source_stamp(path)
+        except OSError:
+            return None
+        if kind is None:
+            logger.info("%s is not a roster", path)
+            return None
+        relpath = self.relpath(path)
+        outdir = self.roster_outdir(relpath)
+        self.outdirs.add(outdir)
+        result = convert_roster(
+            path, kind, outdir, **self.options, **self.photo_options
+        )
+        if result.error is None:
+            self.state[relpath] = stamp
+            self.save_state()
+        return result
+
+    def catch_up(self):
+        """Convert the rosters that changed while nobody was watching, and
+        yield their `RosterResult`s."""
+        for (path, kind, relpath) in self.outdated():
+            result = self.convert(path, kind)
+            if result is not None:
+                yield result
+
+    def poll(self, timeout):
+        """Wait at most `timeout` seconds for changes, convert the rosters
+        that have settled, and return their `RosterResult`s."""
+        if self.pending:
+            timeout = min(timeout, self.settle)
+        for path in self.watcher.changes(timeout):
+            roster = self.roster_for(path)
+            if roster is not None:
+                logger.debug("%s changed", roster)
+                self.pending[roster] = time.monotonic()
+        now = time.monotonic()
+        results = []
+        for (roster, changed) in sorted(self.pending.items()):
+            if now - changed < self.settle:
+                continue
+            del self.pending[roster]
+            result = self.convert(roster)
+            if result is not None:
+                results.append(result)
+        return results
+
+    def run(self, report, stop=None, timeout=0.5):
+        """Catch up, then convert rosters as they change, until `stop` (a
+        `threading.Event`) is set or the process is interrupted.
+
+        `report` is called with the `RosterResult` of each conversion.
+        """
+        for result in self.catch_up():
+            report(result)
+        while stop is None or not stop.is_set():
+            for result in self.poll(timeout):
+                report(result)
+
+    def close(self):
+        self.watcher.close()
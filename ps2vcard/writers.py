@@ -1,30 +1,171 @@
 import os
 import csv
+import hashlib
+import io
+import json
 import logging
+import tempfile
+import threading
+
+from ps2vcard import timings
+
+# The vCard writers import `serialize_vcard`, and with it vobject, when they
+# write their first card; the CSV writers never need it.
 
 
 class VcardWriter(object):
-    """Class to write a vCard to a file"""
+    """Class to write vCards to files in a directory
+
+    The writer keeps a manifest of the SHA-256 hash of every file it wrote,
+    in the file named by `manifest_name`.  Cards whose serialization has not
+    changed since the last run are not written again, so that tools
+    watching the directory only see the cards that changed.  A file that
+    is missing, or whose size is no longer that of its card, was changed by
+    something else, and is hashed again.  Files are written to a temporary
+    file first and renamed into place, so a reader never sees a
+    half-written card.
+
+    The `counts` attribute tallies the cards `"created"`, `"updated"` and
+    `"unchanged"`.  Call `close` (or use the writer as a context manager)
+    to save the manifest.
+
+    Several threads may write cards at once, as long as they write
+    different files.
+    """
 
     _name = "VcardWriter"
 
+    manifest_name = ".ps2vcard-manifest.json"
+
     def __init__(self, dirname=None):
         if dirname is None:
             dirname = os.getcwd()
         self.dirname = dirname
+        self.counts = {"created": 0, "updated": 0, "unchanged": 0}
+        self._manifest = None
+        self._dirty = False
+        self._made_dir = False
+        self._lock = threading.Lock()
+        # files are created with the permissions `open` would give them
+        self._mode = 0o666 & ~self.umask()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def manifest(self):
+        """The mapping of file names to content hashes, loaded on demand."""
+        with self._lock:
+            return self._load_manifest()
+
+    def _load_manifest(self):
+        if self._manifest is None:
+            self._manifest = {}
+            try:
+                with open(os.path.join(self.dirname, self.manifest_name)) as f:
+                    self._manifest = json.load(f)
+            except FileNotFoundError:
+                pass
+            except ValueError:
+                logging.getLogger(self._name).warning(
+                    "ignoring unreadable manifest in %s", self.dirname
+                )
+        return self._manifest
 
     def write(self, card, filename=None):
         """write a vcard to a file.
 
-        If no `filename` is given, use the `card_file_name` method
+        If no `filename` is given, use the `card_file_name` method.
+        Return `"created"`, `"updated"` or `"unchanged"`.
         """
-        if not os.path.exists(self.dirname):
-            os.mkdir(self.dirname)
+        from ps2vcard.serializer import serialize_vcard
+
         if filename is None:
             filename = self.card_file_name(card)
-        logging.getLogger(self._name + ".write").info("Saving %s", filename)
-        with open(os.path.join(self.dirname, filename), "w") as f:
-            f.write(card.serialize())
+        return self.write_data(filename, serialize_vcard(card).encode())
+
+    def write_data(self, filename, data):
+        """write the serialized vcard `data` to the file `filename`.
+
+        Return `"created"`, `"updated"` or `"unchanged"`.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.dirname, filename)
+        current = self.manifest.get(filename)
+        if current is None or (
+            current == digest and self.file_size(path) != len(data)
+        ):
+            # a file written before there was a manifest, or deleted,
+            # truncated or edited since
+            current = self.file_digest(path)
+        if current == digest:
+            status = "unchanged"
+        else:
+            status = "created" if current is None else "updated"
+            logging.getLogger(self._name + ".write").info("Saving %s", filename)
+            self.write_atomic(path, data)
+        with self._lock:
+            manifest = self._load_manifest()
+            if manifest.get(filename) != digest:
+                manifest[filename] = digest
+                self._dirty = True
+            self.counts[status] += 1
+        return status
+
+    def write_atomic(self, path, data):
+        """write `data` to `path` through a temporary file in the same
+        directory."""
+        with timings.stage("write") as timer:
+            if not self._made_dir:
+                os.makedirs(self.dirname, exist_ok=True)
+                self._made_dir = True
+            (fd, temp_path) = tempfile.mkstemp(dir=self.dirname, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.chmod(temp_path, self._mode)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            timer.add_bytes(len(data))
+
+    def close(self):
+        """save the manifest, if it changed."""
+        if self._dirty:
+            data = json.dumps(self.manifest, indent=0, sort_keys=True)
+            self.write_atomic(
+                os.path.join(self.dirname, self.manifest_name), data.encode()
+            )
+            self._dirty = False
+
+    def summary(self):
+        """describe the counts, e.g. `"3 created, 0 updated, 37 unchanged"`."""
+        return ", ".join("%d %s" % (n, status) for (status, n) in self.counts.items())
+
+    @staticmethod
+    def file_digest(path):
+        try:
+            with open(path, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def file_size(path):
+        try:
+            return os.stat(path).st_size
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def umask():
+        mask = os.umask(0)
+        os.umask(mask)
+        return mask
 
     def card_file_name(self, card):
         """construct a file name for a vCard.
@@ -35,9 +176,57 @@ class VcardWriter(object):
         return "%s.vcf" % card.fn.value.replace(" ", "_")
 
 
+class VcardBundleWriter(object):
+    """Class to write many vCards to a single stream
+
+    A `.vcf` file may hold any number of cards, one after the other.
+    Address books import such a bundle in one go, and writing it costs one
+    buffered handle instead of one file per card.  `stream` must be a
+    binary file object, and is buffered if it is not already; cards are
+    written in UTF-8.
+    """
+
+    _name = "VcardBundleWriter"
+
+    def __init__(self, stream):
+        if isinstance(stream, io.RawIOBase):
+            stream = io.BufferedWriter(stream)
+        self.stream = stream
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, card):
+        """append a vcard to the bundle."""
+        from ps2vcard.serializer import serialize_vcard
+
+        self.write_data(serialize_vcard(card).encode())
+
+    def write_data(self, data):
+        """append the serialized vcard `data` to the bundle."""
+        with timings.stage("write") as timer:
+            self.stream.write(data)
+            timer.add_bytes(len(data))
+        self.count += 1
+
+    def close(self):
+        """flush the stream, which is left open for its owner to close."""
+        logging.getLogger(self._name + ".close").info(
+            "Wrote %d cards to %s", self.count, getattr(self.stream, "name", "bundle")
+        )
+        self.stream.flush()
+
+
 class AmcCsvWriter(csv.DictWriter):
     """Class to write a list of students to a CSV file suitable for importing
     into auto-multiple-choice
+
+    The students are the row dictionaries of the roster parsers (or of a
+    CSV export with the same columns); no vCards are built.
     """
 
     fieldnames = [
@@ -54,26 +243,35 @@ class AmcCsvWriter(csv.DictWriter):
     ):
         # don't know how to pass the other keyword arguments...
         super().__init__(csvfile, fieldnames=self.fieldnames)
+        # rows are written as tuples, in the order of `fieldnames`, without
+        # a dict per row
+        self.row_writer = csv.writer(csvfile, dialect=dialect)
 
     def write(self, students):
-        self.writeheader()
-        for student in students:
-            (email_localpart, domain) = student["Email Address"].split("@")
+        with timings.stage("write"):
+            self.writeheader()
+            self.row_writer.writerows(map(self.amc_row, students))
+
+    @staticmethod
+    def amc_row(student):
+        """return the AMC row of a student record, as a tuple."""
+        try:
+            email = student["Email Address"]
+            (email_localpart, domain) = email.split("@")
             (family_name, given_names) = student["Name"].split(",")
-            try:
-                row = {
-                    "Campus ID": student["Campus ID"],
-                    "surname": family_name,
-                    "name": given_names,
-                    "NetID": email_localpart,
-                    "email": student["Email Address"],
-                    "id": student["Campus ID"].replace("N", ""),
-                }
-            except:
-                # debugging
-                logging.error("student: %s", repr(student))
-                raise
-            self.writerow(row)
+            campus_id = student["Campus ID"]
+        except:
+            # debugging
+            logging.error("student: %s", repr(student))
+            raise
+        return (
+            campus_id,
+            family_name,
+            given_names,
+            email_localpart,
+            email,
+            campus_id.replace("N", ""),
+        )
 
 
 class VcardAmcCsvWriter(csv.DictWriter):
@@ -7,10 +7,11 @@ setup(
     version='0.1',
     py_modules=['ps2vcard'],
     install_requires=['Click', 'vobject', 'transitions','bs4','lxml','logdecorator'],
+    extras_require={'photos': ['Pillow'], 'frames': ['pandas>=1.5', 'pyarrow']},
     tests_require=['pytest','jinja2'],
     entry_points="""
         [console_scripts]
-        ps2vcard=ps2vcard.cli:convert_all
+        ps2vcard=ps2vcard.cli:main
         ps2vcard-old=ps2vcard.cli:convert_all_from_frameset
         ps2anki=ps2vcard.cli:convert_to_anki
         ps2amc=ps2vcard.cli:convert_to_amccsv
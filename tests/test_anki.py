@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+import json
+import os.path
+import sqlite3
+from subprocess import PIPE, run
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+import zipfile
+
+from ps2vcard.anki import AnkiPackageWriter, FIELDS, MODEL_ID, deck_id
+from ps2vcard.parsers.html import AlbertRosterHtmlParser
+from ps2vcard.photos import copy_file
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+class TestAnki(unittest.TestCase):
+    """Test the Anki package writer and the ps2anki command."""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.roster_path = write_html_roster(
+            os.path.join(self.tempdir.name, 'roster.html'), make_students(5),
+            photo_size=500)
+        parser = AlbertRosterHtmlParser()
+        (course, students) = parser.parse_records(self.roster_path)
+        self.records = [parser.student_record(student, course)
+                        for student in students]
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def read_package(self, path):
+        with zipfile.ZipFile(path) as archive:
+            media = json.loads(archive.read('media'))
+            photos = {name: archive.read(number)
+                      for (number, name) in media.items()}
+            db_path = os.path.join(self.tempdir.name, 'collection.anki2')
+            with open(db_path, 'wb') as f:
+                f.write(archive.read('collection.anki2'))
+        db = sqlite3.connect(db_path)
+        try:
+            notes = db.execute('SELECT guid, mid, flds FROM notes ORDER BY id')
+            notes = notes.fetchall()
+            cards = db.execute('SELECT did FROM cards').fetchall()
+            (models, decks) = db.execute('SELECT models, decks FROM col').fetchone()
+        finally:
+            db.close()
+        return photos, notes, cards, json.loads(models), json.loads(decks)
+
+    def test_package(self):
+        path = os.path.join(self.tempdir.name, 'roster.apkg')
+        with AnkiPackageWriter(path, 'Faces') as writer:
+            for record in self.records:
+                writer.write(record)
+        self.assertEqual(writer.counts, {'added': 5, 'skipped': 0})
+        (photos, notes, cards, models, decks) = self.read_package(path)
+        self.assertEqual(len(notes), 5)
+        self.assertEqual(cards, [(deck_id('Faces'),)] * 5)
+        self.assertEqual([f['name'] for f in models[str(MODEL_ID)]['flds']],
+                         FIELDS)
+        self.assertEqual(decks[str(deck_id('Faces'))]['name'], 'Faces')
+        record = self.records[0]
+        fields = notes[0][2].split('\x1f')
+        self.assertEqual(fields[0], '%s %s' % (record.given_names,
+                                                record.family_name))
+        media_name = record.email.split('@')[0] + '.jpg'
+        self.assertEqual(fields[1], '<img src="%s">' % media_name)
+        with open(record.photo, 'rb') as f:
+            self.assertEqual(photos[media_name], f.read())
+        # the same student gets the same note in every package
+        again = os.path.join(self.tempdir.name, 'again.apkg')
+        with AnkiPackageWriter(again, 'Faces') as writer:
+            writer.write(record)
+        self.assertEqual(self.read_package(again)[1][0][0], notes[0][0])
+
+    def test_no_photo(self):
+        path = os.path.join(self.tempdir.name, 'roster.apkg')
+        with AnkiPackageWriter(path, 'Faces') as writer:
+            self.assertFalse(writer.write(self.records[0], photo=''))
+            self.assertTrue(writer.write(self.records[1]))
+        self.assertEqual(writer.counts, {'added': 1, 'skipped': 1})
+
+    def test_failure(self):
+        path = os.path.join(self.tempdir.name, 'roster.apkg')
+        with self.assertRaises(FileNotFoundError):
+            with AnkiPackageWriter(path, 'Faces') as writer:
+                writer.write(self.records[0], photo='missing.jpg')
+        self.assertEqual(sorted(os.listdir(self.tempdir.name)),
+                         ['roster.html', 'roster_files'])
+
+    def test_copy_file(self):
+        source = self.records[0].photo
+        with open(source, 'rb') as f:
+            data = f.read()
+        linked = os.path.join(self.tempdir.name, 'linked.jpg')
+        self.assertEqual(copy_file(source, linked), len(data))
+        self.assertTrue(os.path.samefile(source, linked))
+        # again, onto itself
+        self.assertEqual(copy_file(source, linked), len(data))
+        copied = os.path.join(self.tempdir.name, 'copied.jpg')
+        with open(copied, 'w') as f:
+            f.write('an older photo, longer than the new one' * 100)
+        for patches in [[], ['copy_file_range']]:
+            with self.subTest(without=patches):
+                with mock.patch('os.link', side_effect=OSError):
+                    with mock.patch.dict(os.__dict__):
+                        for name in patches:
+                            del os.__dict__[name]
+                        copy_file(source, copied)
+                self.assertFalse(os.path.samefile(source, copied))
+                with open(copied, 'rb') as f:
+                    self.assertEqual(f.read(), data)
+
+    def run_anki(self, *args):
+        process = run(['ps2anki', '--no-cache'] + list(args) + [self.roster_path],
+                      stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        return process
+
+    def test_cli_apkg(self):
+        path = os.path.join(self.tempdir.name, 'roster.apkg')
+        process = self.run_anki('--apkg', path)
+        self.assertIn('5 added', process.stderr)
+        (photos, notes, cards, models, decks) = self.read_package(path)
+        self.assertEqual(len(photos), 5)
+        self.assertIn(self.records[0].course,
+                      [deck['name'] for deck in decks.values()])
+
+    def test_cli_files(self):
+        save_dir = os.path.join(self.tempdir.name, 'anki')
+        self.run_anki('--save-dir', save_dir)
+        record = self.records[0]
+        path = os.path.join(save_dir, '%s %s.jpg' % (record.given_names,
+                                                     record.family_name))
+        self.assertTrue(os.path.samefile(path, record.photo))
+        self.assertEqual(len(os.listdir(save_dir)), 5)
+
+    def test_cli_no_photos(self):
+        self.roster_path = write_html_roster(
+            os.path.join(self.tempdir.name, 'nophotos.html'), make_students(3))
+        save_dir = os.path.join(self.tempdir.name, 'anki')
+        process = self.run_anki('--save-dir', save_dir)
+        self.assertIn('No photo found', process.stderr)
+        self.assertEqual(os.listdir(save_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+import filecmp
+from glob import glob
+import os.path
+import shutil
+from subprocess import PIPE, run
+from tempfile import TemporaryDirectory
+import unittest
+
+from ps2vcard.batch import find_rosters
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+def tree_differences(left, right):
+    """list the files that differ between two directory trees"""
+    comparison = filecmp.dircmp(left, right)
+    differences = (comparison.left_only + comparison.right_only
+                   + comparison.diff_files + comparison.funny_files)
+    for subdir in comparison.common_dirs:
+        differences += tree_differences(os.path.join(left, subdir),
+                                        os.path.join(right, subdir))
+    return differences
+
+
+class TestBatch(unittest.TestCase):
+    """Test the `ps2vcard batch` command."""
+
+    def setUp(self):
+        self._dir = os.path.dirname(__file__)
+        self.data_path = os.path.join(self._dir, 'data')
+        self.tempdir = TemporaryDirectory()
+        self.input_path = os.path.join(self.tempdir.name, 'downloads')
+        for (index, section) in enumerate(['fall/001', 'fall/002', 'spring']):
+            dirname = os.path.join(self.input_path, section)
+            os.makedirs(dirname)
+            write_html_roster(
+                os.path.join(dirname, 'Access Class Rosters.html'),
+                make_students(30, seed=index), photo_size=100)
+        shutil.copy(os.path.join(self.data_path, 'ps.xls'),
+                    os.path.join(self.input_path, 'spring'))
+        shutil.copy(os.path.join(self.data_path, 'Faculty Center.html'),
+                    self.input_path)
+        shutil.copytree(os.path.join(self.data_path, 'Faculty Center_files'),
+                        os.path.join(self.input_path, 'Faculty Center_files'))
+        with open(os.path.join(self.input_path, 'notes.html'), 'w') as f:
+            f.write('<html><body>not a roster</body></html>')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def batch(self, *args):
+        return run(['ps2vcard', 'batch'] + list(args), stdout=PIPE,
+                   universal_newlines=True)
+
+    def test_find_rosters(self):
+        rosters = [(kind, relpath)
+                   for (path, kind, relpath) in find_rosters([self.input_path])]
+        self.assertEqual(rosters, [
+            ('frameset', os.path.join('downloads', 'Faculty Center.html')),
+            ('html', os.path.join('downloads', 'fall', '001',
+                                  'Access Class Rosters.html')),
+            ('html', os.path.join('downloads', 'fall', '002',
+                                  'Access Class Rosters.html')),
+            ('html', os.path.join('downloads', 'spring',
+                                  'Access Class Rosters.html')),
+            ('xls', os.path.join('downloads', 'spring', 'ps.xls')),
+        ])
+
+    def test_deterministic_output(self):
+        outputs = []
+        for jobs in ['1', '3']:
+            output_dir = os.path.join(self.tempdir.name, 'jobs' + jobs)
+            result = self.batch('--jobs', jobs, '--output-dir', output_dir,
+                                self.input_path)
+            self.assertEqual(result.returncode, 0)
+            self.assertIn('5 rosters, 0 failed, 170 students', result.stdout)
+            outputs.append(output_dir)
+        self.assertEqual(tree_differences(*outputs), [])
+        spring = os.path.join(outputs[0], 'downloads', 'spring')
+        self.assertEqual(
+            len(glob(os.path.join(spring, 'Access Class Rosters.html',
+                                 '*.vcf'))),
+            30)
+        with open(os.path.join(spring, 'ps.xls', 'amc.csv')) as f, \
+                open(os.path.join(self._dir, 'golden', 'amc.csv')) as g:
+            self.assertEqual(f.read(), g.read())
+
+    def test_same_name(self):
+        # rosters that differ only by their extension
+        input_path = os.path.join(self.tempdir.name, 'sections')
+        os.makedirs(input_path)
+        for filename in ['ps.xls', 'ps.csv']:
+            shutil.copy(os.path.join(self.data_path, filename), input_path)
+        output_dir = os.path.join(self.tempdir.name, 'output')
+        result = self.batch('--jobs', '2', '--output-dir', output_dir,
+                            input_path)
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout.count('40 created, 0 updated'), 2)
+        for filename in ['ps.xls', 'ps.csv']:
+            outdir = os.path.join(output_dir, 'sections', filename)
+            self.assertEqual(len(glob(os.path.join(outdir, '*.vcf'))), 40)
+            self.assertTrue(os.path.exists(os.path.join(outdir, 'amc.csv')))
+
+    def test_failure(self):
+        os.remove(os.path.join(self.input_path, 'Faculty Center_files',
+                               'SA_LEARNING_MANAGEMENT.SS_FACULTY.html'))
+        output_dir = os.path.join(self.tempdir.name, 'output')
+        result = self.batch('--jobs', '2', '--output-dir', output_dir,
+                            self.input_path)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('FAILED', result.stdout)
+        self.assertIn('5 rosters, 1 failed, 130 students', result.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
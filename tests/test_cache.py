@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+import os
+import os.path
+from subprocess import PIPE, check_call, run
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+
+from ps2vcard.cache import ParseCache
+from ps2vcard.parsers.html import (
+    AlbertRosterFramesetParser,
+    AlbertRosterHtmlParser,
+    AlbertRosterXlsParser,
+)
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+class TestParseCache(unittest.TestCase):
+    """Test the content-addressed parse cache."""
+
+    def setUp(self):
+        self._dir = os.path.dirname(__file__)
+        self.data_path = os.path.join(self._dir, 'data')
+        self.tempdir = TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tempdir.name, 'cache')
+        self.cache = ParseCache(self.cache_dir)
+        self.roster_path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(self.roster_path, make_students(25), photo_size=100)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def cached_parse(self, parser, path):
+        """parse through the cache, and build the cards as the commands do"""
+        (course, students) = self.cache.parse(parser, path)
+        return (course, [parser.student_to_vcard(student, course)
+                         for student in students])
+
+    def warm_parse(self, parser_class, path):
+        """parse with a parser that must not be asked to parse"""
+        parser = parser_class()
+
+        def fail(*args):
+            raise AssertionError('parsed on a warm cache')
+        parser.parse_records = parser.iter_students = fail
+        return self.cached_parse(parser, path)
+
+    def assertSameCards(self, first, second):
+        self.assertEqual(dict(first[0] or {}), dict(second[0] or {}))
+        self.assertEqual([card.serialize() for card in first[1]],
+                         [card.serialize() for card in second[1]])
+
+    def test_warm_parse(self):
+        for (parser_class, path) in [
+                (AlbertRosterHtmlParser, self.roster_path),
+                (AlbertRosterFramesetParser,
+                 os.path.join(self.data_path, 'Faculty Center.html')),
+                (AlbertRosterXlsParser, os.path.join(self.data_path, 'ps.xls'))]:
+            with self.subTest(parser=parser_class.__name__):
+                expected = parser_class().parse(path)
+                cold = self.cached_parse(parser_class(), path)
+                self.assertSameCards(cold, expected)
+                self.assertSameCards(self.warm_parse(parser_class, path),
+                                     expected)
+
+    def test_iter_records(self):
+        parser = AlbertRosterHtmlParser()
+        cold = list(self.cache.iter_records(parser, self.roster_path))
+        warm_parser = AlbertRosterHtmlParser()
+        warm = list(self.cache.iter_records(warm_parser, self.roster_path))
+        self.assertEqual(len(warm), 25)
+        self.assertEqual(warm, cold)
+        self.assertEqual(warm_parser.course_data, parser.course_data)
+
+    def test_changed_photo(self):
+        self.cached_parse(AlbertRosterHtmlParser(), self.roster_path)
+        photo = os.path.join(self.tempdir.name, 'roster_files', 'photo3.jpg')
+        with open(photo, 'ab') as f:
+            f.write(b'\0')
+        with self.assertRaises(AssertionError):
+            self.warm_parse(AlbertRosterHtmlParser, self.roster_path)
+
+    def test_changed_roster(self):
+        self.cached_parse(AlbertRosterHtmlParser(), self.roster_path)
+        write_html_roster(self.roster_path, make_students(26), photo_size=100)
+        (course, cards) = self.cached_parse(AlbertRosterHtmlParser(),
+                                            self.roster_path)
+        self.assertEqual(len(cards), 26)
+        self.assertEqual(len(self.cache.entries()), 2)
+
+    def test_eviction(self):
+        paths = []
+        for count in range(1, 5):
+            path = os.path.join(self.tempdir.name, 'roster%d.html' % count)
+            write_html_roster(path, make_students(count))
+            self.cached_parse(AlbertRosterHtmlParser(), path)
+            paths.append(path)
+        size = max(size for (path, size, mtime) in self.cache.entries())
+        # touch the first roster, so the second is least recently used
+        os.utime(self.cache.entry_path(
+            self.cache.key(AlbertRosterHtmlParser(), paths[1])), (0, 0))
+        self.cache.max_bytes = 3 * size
+        self.cache.evict()
+        self.assertEqual(len(self.cache.entries()), 3)
+        self.assertIsNone(self.cache.load(AlbertRosterHtmlParser(), paths[1]))
+        self.assertIsNotNone(self.cache.load(AlbertRosterHtmlParser(), paths[0]))
+
+    def test_key(self):
+        key = self.cache.key(AlbertRosterHtmlParser(), self.roster_path)
+        self.assertEqual(
+            self.cache.key(AlbertRosterHtmlParser(), self.roster_path), key)
+        # the options of the parser, and the directory the photo paths of
+        # the records start with, are part of the key
+        for parser in [AlbertRosterHtmlParser(prescan=True),
+                       AlbertRosterHtmlParser(engine='machine'),
+                       AlbertRosterFramesetParser()]:
+            with self.subTest(parser=parser.options):
+                self.assertNotEqual(self.cache.key(parser, self.roster_path), key)
+        cwd = os.getcwd()
+        os.chdir(self.tempdir.name)
+        try:
+            self.assertNotEqual(
+                self.cache.key(AlbertRosterHtmlParser(), 'roster.html'), key)
+        finally:
+            os.chdir(cwd)
+        self.assertNotEqual(
+            self.cache.key(AlbertRosterXlsParser(),
+                           os.path.join(self.data_path, 'ps.xls')),
+            self.cache.key(AlbertRosterXlsParser(engine='soup'),
+                           os.path.join(self.data_path, 'ps.xls')))
+        # records cached by an older parser are not reused
+        with mock.patch('ps2vcard.cache.PARSER_VERSION', 1):
+            self.assertNotEqual(
+                self.cache.key(AlbertRosterHtmlParser(), self.roster_path), key)
+
+    def test_cli(self):
+        env = dict(os.environ, PS2VCARD_CACHE_DIR=self.cache_dir)
+        # the cache is off unless asked for
+        check_call(['ps2vcard', '--no-print', self.roster_path], env=env)
+        self.assertEqual(self.cache.entries(), [])
+        check_call(['ps2vcard', '--no-print', '--cache', self.roster_path],
+                   env=env)
+        self.assertEqual(len(self.cache.entries()), 1)
+        result = run(['ps2vcard', 'cache', 'clear'], env=env, stdout=PIPE,
+                     universal_newlines=True)
+        self.assertIn('removed 1 entries', result.stdout)
+        self.assertEqual(self.cache.entries(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
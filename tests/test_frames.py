@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+import os.path
+from subprocess import check_call
+from tempfile import TemporaryDirectory
+import unittest
+
+from ps2vcard.parsers.csv import AlbertRosterCsvParser
+from ps2vcard.parsers.html import (
+    AlbertRosterFramesetParser,
+    AlbertRosterHtmlParser,
+    AlbertRosterXlsParser,
+)
+from ps2vcard.synthetic import make_students, write_html_roster
+
+try:
+    import pandas
+    import pyarrow
+except ImportError:
+    pandas = pyarrow = None
+
+if pandas is not None:
+    from ps2vcard.frames import FRAME_COLUMNS, read_frame, write_frame
+
+
+@unittest.skipIf(pandas is None or pyarrow is None, 'needs pandas and pyarrow')
+class TestFrames(unittest.TestCase):
+    """Test the data frames of the roster parsers."""
+
+    def setUp(self):
+        self._dir = os.path.dirname(__file__)
+        self.data_path = os.path.join(self._dir, 'data')
+        self.tempdir = TemporaryDirectory()
+        self.frameset_path = os.path.join(self.data_path, 'Faculty Center.html')
+        self.xls_path = os.path.join(self.data_path, 'ps.xls')
+        self.csv_path = os.path.join(self.data_path, 'ps.csv')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def assertFrameMatchesRecords(self, parser_class, path):
+        frame = parser_class().to_frame(path)
+        (course, records) = parser_class().parse_students(path)
+        self.assertEqual(list(frame.columns), FRAME_COLUMNS)
+        self.assertEqual(len(frame), len(records))
+        for (row, record) in zip(frame.itertuples(index=False), records):
+            for column in FRAME_COLUMNS:
+                if column == 'netid':
+                    expected = record.email.split('@')[0]
+                elif column == 'level':
+                    continue
+                else:
+                    expected = getattr(record, column) or None
+                value = getattr(row, column)
+                self.assertEqual(None if pandas.isna(value) else value, expected,
+                                 column)
+
+    def test_matches_records(self):
+        roster_path = write_html_roster(
+            os.path.join(self.tempdir.name, 'roster.html'), make_students(50),
+            photo_size=100)
+        for (parser_class, path) in [
+                (AlbertRosterFramesetParser, self.frameset_path),
+                (AlbertRosterHtmlParser, roster_path),
+                (AlbertRosterXlsParser, self.xls_path),
+                (AlbertRosterCsvParser, self.csv_path)]:
+            with self.subTest(parser=parser_class.__name__):
+                self.assertFrameMatchesRecords(parser_class, path)
+
+    def test_categories(self):
+        frame = AlbertRosterXlsParser().to_frame(self.xls_path)
+        self.assertEqual(frame['course'].dtype, 'category')
+        self.assertEqual(list(frame['course'].cat.categories),
+                         ['MATH-UA 122 - 005'])
+
+    def test_empty(self):
+        frame = AlbertRosterXlsParser().student_frame(None, [])
+        self.assertEqual(list(frame.columns), FRAME_COLUMNS)
+        self.assertEqual(len(frame), 0)
+
+    def test_round_trip(self):
+        frame = AlbertRosterFramesetParser().to_frame(self.frameset_path)
+        for name in ['roster.parquet', 'roster.feather']:
+            with self.subTest(file=name):
+                path = os.path.join(self.tempdir.name, name)
+                write_frame(frame, path)
+                pandas.testing.assert_frame_equal(read_frame(path), frame)
+        with self.assertRaises(ValueError):
+            write_frame(frame, os.path.join(self.tempdir.name, 'roster.csv'))
+
+    def test_cli(self):
+        path = os.path.join(self.tempdir.name, 'ps.parquet')
+        check_call(['ps2vcard', 'auto', '--no-print', '--no-cache',
+                    '--frame', path, self.xls_path])
+        frame = read_frame(path)
+        self.assertEqual(list(frame['nnumber'][:2]), ['N30244832', 'N74156012'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+import filecmp
+import os.path
+from subprocess import check_call
+from tempfile import TemporaryDirectory
+import unittest
+
+from transitions.core import MachineError
+
+from ps2vcard.parsers.html import AlbertRosterHtmlParser
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+def parse_records(path, engine):
+    """Parse a roster with the given engine and return plain records."""
+    parser = AlbertRosterHtmlParser(engine=engine)
+    (course, students) = parser.parse(path)
+    records = {index: dict(record) for index, record in parser.student_records.items()}
+    return (dict(course), records, [card.serialize() for card in students])
+
+
+class TestFsmEngine(unittest.TestCase):
+    """The table engine must reproduce the records of `transitions.Machine`."""
+
+    def setUp(self):
+        self._dir = os.path.dirname(__file__)
+        self.data_path = os.path.join(self._dir, 'data')
+        self.tempdir = TemporaryDirectory()
+        self.frameset_path = os.path.join(self.data_path, 'Faculty Center.html')
+        self.roster_path = os.path.join(
+            self.data_path, 'Faculty Center_files',
+            'SA_LEARNING_MANAGEMENT.SS_FACULTY.html')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_fixture_records(self):
+        machine = parse_records(self.roster_path, 'machine')
+        table = parse_records(self.roster_path, 'table')
+        self.assertEqual(len(table[1]), 40)
+        self.assertEqual(machine, table)
+
+    def test_fixture_photos(self):
+        # the fixture numbers its photo cells "win0div", not "win10div", and
+        # 36 of its 40 students have one
+        for engine in AlbertRosterHtmlParser.engines:
+            for prescan in (False, True):
+                with self.subTest(engine=engine, prescan=prescan):
+                    parser = AlbertRosterHtmlParser(engine=engine,
+                                                    prescan=prescan)
+                    (course, students) = parser.parse_records(self.roster_path)
+                    photos = [student['photo'] for student in students
+                              if student.get('photo')]
+                    self.assertEqual(len(photos), 36)
+                    self.assertTrue(all(os.path.exists(photo)
+                                        for photo in photos))
+
+    def test_synthetic_records(self):
+        path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(path, make_students(200), photo_size=200)
+        machine = parse_records(path, 'machine')
+        table = parse_records(path, 'table')
+        self.assertEqual(len(table[1]), 200)
+        self.assertTrue(all('photo' in record for record in table[1].values()))
+        self.assertEqual(machine, table)
+
+    def test_invalid_trigger(self):
+        html = '<span id="CLASS_ROSTER_VW_EMPLID$0"><b>N1</b></span>'
+        for engine in AlbertRosterHtmlParser.engines:
+            with self.subTest(engine=engine):
+                parser = AlbertRosterHtmlParser(engine=engine)
+                with self.assertRaises(MachineError):
+                    parser.feed(html)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            AlbertRosterHtmlParser(engine='nonesuch')
+
+    def test_cli_engines(self):
+        outdirs = []
+        for engine in AlbertRosterHtmlParser.engines:
+            outdir = os.path.join(self.tempdir.name, engine)
+            check_call([
+                'ps2vcard-old', self.frameset_path, '--no-print', '--save',
+                '--save-dir=%s' % outdir, '--engine=%s' % engine, '--no-cache'
+            ])
+            outdirs.append(outdir)
+        comparison = filecmp.dircmp(*outdirs)
+        cards = [name for name in comparison.common_files
+                 if name.endswith('.vcf')]
+        self.assertEqual(len(cards), 40)
+        self.assertEqual(comparison.diff_files, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
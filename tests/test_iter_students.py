@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+import os.path
+from tempfile import TemporaryDirectory
+import unittest
+
+from ps2vcard.parsers.html import AlbertRosterHtmlParser
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+class TestIterStudents(unittest.TestCase):
+    """Test the streaming interface of `AlbertRosterHtmlParser`."""
+
+    def setUp(self):
+        self._dir = os.path.dirname(__file__)
+        self.data_path = os.path.join(self._dir, 'data')
+        self.tempdir = TemporaryDirectory()
+        self.roster_path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(self.roster_path, make_students(300), photo_size=100)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_records_match_parse(self):
+        parser = AlbertRosterHtmlParser()
+        parser.parse(self.roster_path)
+        expected = [dict(record) for record in parser.student_records.values()]
+        streamed = [dict(record) for record in
+                    AlbertRosterHtmlParser().iter_students(
+                        self.roster_path, vcards=False)]
+        self.assertEqual(streamed, expected)
+
+    def test_vcards_match_parse(self):
+        (course, cards) = AlbertRosterHtmlParser().parse(self.roster_path)
+        parser = AlbertRosterHtmlParser()
+        streamed = list(parser.iter_students(self.roster_path))
+        self.assertEqual(parser.course_data, course)
+        self.assertEqual([card.serialize() for card in streamed],
+                         [card.serialize() for card in cards])
+
+    def test_bounded_records(self):
+        parser = AlbertRosterHtmlParser()
+        parser.chunk_size = 4096
+        in_flight = []
+        for record in parser.iter_students(self.roster_path, vcards=False):
+            in_flight.append(len(parser.student_records))
+        self.assertEqual(len(in_flight), 300)
+        # the current student, plus those finished in the last chunk
+        self.assertLessEqual(max(in_flight), 3)
+
+    def test_fixture(self):
+        roster_path = os.path.join(
+            self.data_path, 'Faculty Center_files',
+            'SA_LEARNING_MANAGEMENT.SS_FACULTY.html')
+        (course, cards) = AlbertRosterHtmlParser().parse(roster_path)
+        streamed = list(AlbertRosterHtmlParser().iter_students(roster_path))
+        self.assertEqual([card.serialize() for card in streamed],
+                         [card.serialize() for card in cards])
+
+
+if __name__ == '__main__':
+    unittest.main()
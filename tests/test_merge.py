@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+import os.path
+from subprocess import run, PIPE
+from tempfile import TemporaryDirectory
+import unittest
+
+import vobject
+
+from ps2vcard.batch import find_rosters, merge_batch
+from ps2vcard.merge import StudentIndex
+from ps2vcard.records import StudentRecord
+from ps2vcard.synthetic import make_students, write_roster
+
+
+def course_names(card):
+    """Return the courses listed on `card`."""
+    return [line.value for line in card.getChildren()
+            if line.name == 'X-ABRELATEDNAMES']
+
+
+class TestMerge(unittest.TestCase):
+    """Test merging the rosters of several courses."""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.downloads = os.path.join(self.tempdir.name, 'Downloads')
+        self.outdir = os.path.join(self.tempdir.name, 'out')
+        self.students = make_students(9)
+        for dirname in ['a', 'b', 'c']:
+            os.makedirs(os.path.join(self.downloads, dirname))
+        # two sections of a course, sharing students 3 to 5, and the roster
+        # page of a third course with students 0 to 2
+        write_roster('xls', os.path.join(self.downloads, 'a', 'ps.xls'),
+                     self.students[:6])
+        second = [dict(student, Section='7') for student in self.students[3:]]
+        write_roster('xls', os.path.join(self.downloads, 'b', 'ps.xls'), second)
+        write_roster('html', os.path.join(self.downloads, 'c', 'roster.html'),
+                     self.students[:3], photo_size=100)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def read_cards(self):
+        cards = {}
+        for filename in os.listdir(self.outdir):
+            if filename.endswith('.vcf'):
+                with open(os.path.join(self.outdir, filename)) as f:
+                    card = vobject.readOne(f.read())
+                cards[card.email.value] = card
+        return cards
+
+    def test_merge_batch(self):
+        rosters = find_rosters([self.downloads])
+        for jobs in [1, 2]:
+            with self.subTest(jobs=jobs):
+                (results, index, summary) = merge_batch(
+                    rosters, self.outdir, jobs=jobs)
+                self.assertEqual([result.students for result in results],
+                                 [6, 6, 3])
+                self.assertEqual(index.records, 15)
+                self.assertEqual(len(index), 9)
+                cards = self.read_cards()
+                self.assertEqual(len(cards), 9)
+                courses = [course_names(cards[student['Email Address']])
+                           for student in self.students]
+                self.assertEqual(courses[0], ['MATH-UA 122 - 005', courses[0][1]])
+                self.assertEqual(courses[4], ['MATH-UA 122 - 005',
+                                              'MATH-UA 122 - 007'])
+                self.assertEqual(courses[8], ['MATH-UA 122 - 007'])
+                # the page gives the photo, the spreadsheet the N-number
+                card = cards[self.students[1]['Email Address']]
+                self.assertEqual(card.x_nyu_nnumber.value,
+                                 self.students[1]['Campus ID'])
+                self.assertTrue(card.photo.value)
+
+    def test_keys(self):
+        index = StudentIndex()
+        record = StudentRecord('N10000000', 'Doe', 'Jane', 'jd1@nyu.edu', 'NYU',
+                               'CAS', 'Math', 'MATH-UA 122 - 005')
+        index.add(record)
+        # by EMPLID, then by email
+        index.add(StudentRecord(None, 'Doe', 'Jane', 'JD1@nyu.edu', 'NYU',
+                                'CAS', 'Math', 'MATH-UA 9, Fall 2016',
+                                emplid='12345678'))
+        index.add(StudentRecord(None, 'Doe', 'Jane', None, 'NYU', 'CAS',
+                                'Math', 'MATH-UA 10, Fall 2016',
+                                emplid='12345678'))
+        index.add(StudentRecord('N10000001', 'Doe', 'John', 'jd2@nyu.edu',
+                                'NYU', 'CAS', 'Math', 'MATH-UA 122 - 005'))
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.records, 4)
+        (jane, john) = index.students
+        self.assertEqual(jane.courses, ['MATH-UA 122 - 005',
+                                        'MATH-UA 9, Fall 2016',
+                                        'MATH-UA 10, Fall 2016'])
+        self.assertEqual(jane.record.emplid, '12345678')
+        # the first record is not changed
+        self.assertIsNone(record.emplid)
+        card = vobject.readOne(jane.card().serialize())
+        self.assertEqual(course_names(card), jane.courses)
+
+    def test_cli(self):
+        process = run(['ps2vcard', 'batch', '--merge', '--output-dir',
+                       self.outdir, self.downloads],
+                      stdout=PIPE, universal_newlines=True, check=True)
+        self.assertIn('15 records of 9 students', process.stdout)
+        self.assertEqual(len(self.read_cards()), 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
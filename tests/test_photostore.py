@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+from glob import glob
+import os.path
+from subprocess import check_call
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+
+import vobject
+
+from ps2vcard.batch import find_rosters, run_batch
+from ps2vcard.parsers.html import AlbertRosterHtmlParser
+from ps2vcard.photos import StoredPhoto, photo_bytes
+from ps2vcard.photostore import PhotoStore, apply_photo_mode
+from ps2vcard.serializer import serialize_vcard
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+class TestPhotoStore(unittest.TestCase):
+    """Test the content-addressed photo store and the photo modes."""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.store_dir = os.path.join(self.tempdir.name, 'store')
+        self.roster_path = os.path.join(self.tempdir.name, 'term', 'roster.html')
+        os.makedirs(os.path.dirname(self.roster_path))
+        # every student gets the same placeholder image
+        write_html_roster(self.roster_path, make_students(20), photo_size=3000)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def cards(self):
+        return AlbertRosterHtmlParser().parse(self.roster_path)[1]
+
+    def test_embed(self):
+        expected = [card.serialize() for card in self.cards()]
+        with PhotoStore(self.store_dir) as store:
+            cards = [apply_photo_mode(card, 'embed', store)
+                     for card in self.cards()]
+            self.assertIsInstance(cards[0].photo.value, StoredPhoto)
+            self.assertEqual([serialize_vcard(card) for card in cards], expected)
+            self.assertEqual([card.serialize() for card in cards], expected)
+            self.assertEqual(store.added, 1)
+        self.assertEqual(len(glob(os.path.join(self.store_dir, '*', '*.jpg'))), 1)
+        # the encoding is kept for later runs
+        (encoded_path,) = glob(os.path.join(self.store_dir, '*', '*.b64'))
+        with open(encoded_path) as f:
+            self.assertEqual(f.read(), cards[0].photo.value.base64())
+        self.assertEqual(photo_bytes(cards[0]), photo_bytes(self.cards()[0]))
+
+    def test_encodings_bounded(self):
+        photos = []
+        for i in range(5):
+            photos.append(os.path.join(self.tempdir.name, 'photo%d.jpg' % i))
+            with open(photos[-1], 'wb') as f:
+                f.write(b'photo %d' % i)
+        with PhotoStore(self.store_dir) as store:
+            store.encodings_cached = 2
+            digests = [store.add(photo) for photo in photos]
+            for digest in digests:
+                store.base64(digest, store.path(digest))
+                self.assertLessEqual(len(store._encodings), 2)
+            self.assertEqual(list(store._encodings), digests[-2:])
+            # the encodings dropped are read back from their files
+            self.assertEqual(store.base64(digests[0], store.path(digests[0])),
+                             'cGhvdG8gMA==')
+
+    def test_index(self):
+        photo = os.path.join(self.tempdir.name, 'term', 'roster_files',
+                             'photo0.jpg')
+        with PhotoStore(self.store_dir) as store:
+            digest = store.add(photo)
+        with PhotoStore(self.store_dir) as store:
+            with mock.patch('hashlib.sha256') as sha256:
+                self.assertEqual(store.add(photo), digest)
+            sha256.assert_not_called()
+            # a changed photo is hashed again
+            with open(photo, 'ab') as f:
+                f.write(b'\0')
+            self.assertNotEqual(store.add(photo), digest)
+            self.assertEqual(store.added, 1)
+
+    def test_index_shared(self):
+        photos = glob(os.path.join(self.tempdir.name, 'term', 'roster_files',
+                                   '*.jpg'))[:2]
+        # as two processes of a batch would use the store
+        first = PhotoStore(self.store_dir)
+        second = PhotoStore(self.store_dir)
+        first.add(photos[0])
+        second.add(photos[1])
+        second.close()
+        first.close()
+        with PhotoStore(self.store_dir) as store:
+            self.assertEqual(sorted(store.index),
+                             sorted(os.path.abspath(photo) for photo in photos))
+
+    def test_uri(self):
+        with PhotoStore(self.store_dir) as store:
+            cards = [apply_photo_mode(card, 'uri', store)
+                     for card in self.cards()]
+        data = serialize_vcard(cards[0])
+        self.assertEqual(data, cards[0].serialize())
+        self.assertEqual(vobject.readOne(data).photo.value,
+                         cards[0].photo.value)
+        (photo_line,) = [line for line in data.splitlines()
+                         if line.startswith('PHOTO')]
+        (stored,) = glob(os.path.join(self.store_dir, '*', '*.jpg'))
+        self.assertEqual(photo_line, 'PHOTO;TYPE=JPEG;VALUE=uri:file://' + stored)
+        with self.assertRaises(ValueError):
+            apply_photo_mode(self.cards()[0], 'uri')
+
+    def test_none(self):
+        card = apply_photo_mode(self.cards()[0], 'none')
+        self.assertNotIn('photo', card.contents)
+        self.assertEqual(serialize_vcard(card), card.serialize())
+
+    def test_batch(self):
+        rosters = find_rosters([os.path.dirname(self.roster_path)])
+        sizes = {}
+        for mode in ['embed', 'uri', 'none']:
+            outdir = os.path.join(self.tempdir.name, mode)
+            (result,) = run_batch(rosters, outdir, photo_mode=mode,
+                                  photo_store=self.store_dir)
+            self.assertIsNone(result.error)
+            sizes[mode] = sum(os.path.getsize(path) for path in
+                              glob(os.path.join(outdir, '**', '*.vcf'),
+                                   recursive=True))
+        self.assertLess(sizes['none'], sizes['uri'])
+        self.assertLess(sizes['uri'] * 3, sizes['embed'])
+
+    def test_cli(self):
+        outdir = os.path.join(self.tempdir.name, 'out')
+        os.makedirs(outdir)
+        check_call(['ps2vcard', 'roster', self.roster_path, '--no-print',
+                    '--save', '--no-cache', '--photo-mode=uri',
+                    '--photo-store', self.store_dir], cwd=outdir)
+        paths = glob(os.path.join(outdir, '*.vcf'))
+        self.assertTrue(paths)
+        for path in paths:
+            with open(path) as f:
+                card = vobject.readOne(f.read())
+            self.assertTrue(card.photo.value.startswith('file://'))
+            self.assertTrue(os.path.exists(card.photo.value[len('file://'):]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+from concurrent.futures import ThreadPoolExecutor
+import os.path
+import random
+from subprocess import check_call
+from tempfile import TemporaryDirectory
+import threading
+import time
+import unittest
+
+from ps2vcard.parsers.html import AlbertRosterHtmlParser
+from ps2vcard.pipeline import CardPipeline, ordered_map, threaded_iter
+from ps2vcard.synthetic import make_students, write_html_roster
+from ps2vcard.writers import VcardWriter
+
+
+class TestPipeline(unittest.TestCase):
+    """Test the pipelined conversion."""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        students = make_students(30)
+        # two students with the same name, saved to the same file
+        students[20]['Name'] = students[3]['Name']
+        self.roster_path = write_html_roster(
+            os.path.join(self.tempdir.name, 'roster.html'), students,
+            photo_size=200)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_threaded_iter(self):
+        self.assertEqual(list(threaded_iter(range(100), maxsize=3)),
+                         list(range(100)))
+
+        def failing():
+            yield 1
+            raise ValueError('bad roster')
+
+        with self.assertRaises(ValueError):
+            list(threaded_iter(failing()))
+
+    def test_backpressure(self):
+        produced = []
+
+        def items():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+
+        before = threading.active_count()
+        iterator = threaded_iter(items(), maxsize=5)
+        next(iterator)
+        time.sleep(0.2)
+        # the queue, the item being put and the one yielded
+        self.assertLessEqual(len(produced), 7)
+        iterator.close()
+        self.assertEqual(threading.active_count(), before)
+
+    def test_ordered_map(self):
+        def slow(i):
+            time.sleep(random.random() / 100)
+            return i * i
+
+        with ThreadPoolExecutor(4) as executor:
+            self.assertEqual(list(ordered_map(slow, range(50), executor, 8)),
+                             [i * i for i in range(50)])
+
+    def convert(self, jobs):
+        outdir = os.path.join(self.tempdir.name, 'jobs%d' % jobs)
+        parser = AlbertRosterHtmlParser()
+        (course, students) = parser.parse_records(self.roster_path)
+        with VcardWriter(outdir) as writer:
+            pipeline = CardPipeline(
+                lambda student: parser.student_to_vcard(student, course),
+                writer=writer, jobs=jobs)
+            data = [data for (card, data) in pipeline.run(students)]
+        files = {}
+        for name in os.listdir(outdir):
+            with open(os.path.join(outdir, name), 'rb') as f:
+                files[name] = f.read()
+        return data, files, writer.counts
+
+    def test_deterministic(self):
+        (data, files, counts) = self.convert(1)
+        self.assertEqual(counts, {'created': 29, 'updated': 1, 'unchanged': 0})
+        # the later of the two students with the same name wins
+        self.assertIn(data[20], files.values())
+        self.assertNotIn(data[3], files.values())
+        for jobs in [2, 8]:
+            with self.subTest(jobs=jobs):
+                self.assertEqual(self.convert(jobs), (data, files, counts))
+
+    def test_cli(self):
+        bundles = []
+        for jobs in ['1', '4']:
+            path = os.path.join(self.tempdir.name, 'bundle%s.vcf' % jobs)
+            check_call(['ps2vcard', 'roster', '--no-print', '--no-cache',
+                        '--jobs', jobs, '--bundle', path, self.roster_path])
+            with open(path, 'rb') as f:
+                bundles.append(f.read())
+        self.assertEqual(bundles[0].count(b'BEGIN:VCARD'), 30)
+        self.assertEqual(bundles[0], bundles[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+import codecs
+import filecmp
+import os.path
+from subprocess import check_call
+from tempfile import TemporaryDirectory
+import unittest
+
+from ps2vcard.parsers.html import AlbertRosterHtmlParser
+from ps2vcard.parsers.prescan import declared_encoding, key_regions
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+def parse_records(path, prescan):
+    """Parse a roster with or without the prescan and return plain records."""
+    parser = AlbertRosterHtmlParser(prescan=prescan)
+    (course, students) = parser.parse_records(path)
+    return (dict(course), [dict(student) for student in students])
+
+
+class TestPrescan(unittest.TestCase):
+    """Tokenizing only the key regions must give the records of a full parse."""
+
+    def setUp(self):
+        self._dir = os.path.dirname(__file__)
+        self.data_path = os.path.join(self._dir, 'data')
+        self.tempdir = TemporaryDirectory()
+        self.frameset_path = os.path.join(self.data_path, 'Faculty Center.html')
+        self.roster_path = os.path.join(
+            self.data_path, 'Faculty Center_files',
+            'SA_LEARNING_MANAGEMENT.SS_FACULTY.html')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_fixture_records(self):
+        full = parse_records(self.roster_path, False)
+        prescanned = parse_records(self.roster_path, True)
+        self.assertEqual(len(prescanned[1]), 40)
+        self.assertEqual(prescanned, full)
+
+    def test_synthetic_records(self):
+        path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(path, make_students(200), photo_size=200)
+        full = parse_records(path, False)
+        prescanned = parse_records(path, True)
+        self.assertEqual(len(prescanned[1]), 200)
+        self.assertTrue(all('photo' in student for student in prescanned[1]))
+        self.assertEqual(prescanned, full)
+
+    def test_iter_students(self):
+        path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(path, make_students(300), photo_size=100)
+        parser = AlbertRosterHtmlParser(prescan=True)
+        parser.chunk_size = 4096
+        streamed = [dict(student) for student in
+                    parser.iter_students(path, vcards=False)]
+        self.assertEqual(streamed, parse_records(path, False)[1])
+
+    def test_regions_are_small(self):
+        with open(self.roster_path, 'rb') as f:
+            page = f.read()
+        parser = AlbertRosterHtmlParser()
+        regions = key_regions(page, parser.key_markers(), parser.key_kind)
+        self.assertLess(sum(end - start for (start, end) in regions),
+                        len(page) / 5)
+        for (start, end) in regions:
+            self.assertEqual(page[start:start + 1], b'<')
+            self.assertEqual(page[end - 1:end], b'>')
+
+    def test_keys_in_scripts_and_comments(self):
+        path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(path, make_students(2))
+        with open(path, encoding='utf-8') as f:
+            page = f.read()
+        decoy = '<span class="x" id="CLASS_ROSTER_VW_EMPLID$0">N0</span>'
+        page = page.replace(
+            '</head>',
+            '<script>var s = \'%s\';</script>\n<!-- %s -->\n'
+            '<style>/* %s */</style>\n</head>' % (decoy, decoy, decoy))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(page)
+        prescanned = parse_records(path, True)
+        self.assertEqual(prescanned, parse_records(path, False))
+        self.assertNotEqual(prescanned[1][0]['id'], 'N0')
+
+    def test_declared_encoding(self):
+        self.assertEqual(declared_encoding(
+            b'<meta http-equiv="Content-Type" '
+            b'content="text/html; charset=ISO-8859-1">'), 'iso8859-1')
+        self.assertEqual(declared_encoding(b'<meta charset="utf-8">'), 'utf-8')
+        self.assertEqual(declared_encoding(b"<META CHARSET='windows-1252'>"),
+                         'cp1252')
+        self.assertEqual(declared_encoding(codecs.BOM_UTF8 + b'<html>'),
+                         'utf-8-sig')
+        self.assertEqual(declared_encoding(b'<meta charset="nonesuch">'),
+                         'utf-8')
+        self.assertEqual(declared_encoding(b'<html>', default='ascii'), 'ascii')
+
+    def test_declared_charset(self):
+        students = make_students(3)
+        students[1]['Name'] = 'Müller,José'
+        path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(path, students)
+        with open(path, encoding='utf-8') as f:
+            page = f.read()
+        latin_path = os.path.join(self.tempdir.name, 'latin.html')
+        with open(latin_path, 'w', encoding='cp1252') as f:
+            f.write(page.replace('charset=UTF-8', 'charset=windows-1252'))
+        expected = parse_records(path, False)
+        self.assertEqual(expected[1][1]['name'], 'Müller,José')
+        for prescan in [False, True]:
+            with self.subTest(prescan=prescan):
+                self.assertEqual(parse_records(latin_path, prescan), expected)
+                self.assertEqual(parse_records(path, prescan), expected)
+
+    def test_empty_file(self):
+        path = os.path.join(self.tempdir.name, 'empty.html')
+        open(path, 'w').close()
+        self.assertEqual(parse_records(path, True), ({}, []))
+
+    def test_cli(self):
+        outdirs = []
+        for flags in [[], ['--prescan']]:
+            outdir = os.path.join(self.tempdir.name, 'out%d' % len(flags))
+            check_call([
+                'ps2vcard', 'frameset', self.frameset_path, '--no-print',
+                '--save', '--save-dir=%s' % outdir, '--no-cache'
+            ] + flags)
+            outdirs.append(outdir)
+        comparison = filecmp.dircmp(*outdirs)
+        cards = [name for name in comparison.common_files
+                 if name.endswith('.vcf')]
+        self.assertEqual(len(cards), 40)
+        self.assertEqual(comparison.diff_files, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,18 @@
 #!/usr/bin/env python
 
 import csv
+import io
 import os.path
-from subprocess import Popen, PIPE
+from subprocess import Popen, PIPE, check_call
+from tempfile import TemporaryDirectory
 import unittest
 
 from jinja2 import Template
 
+from ps2vcard.parsers.html import AlbertRosterXlsParser
+from ps2vcard.synthetic import make_students, write_xls_roster
+from ps2vcard.writers import AmcCsvWriter, VcardAmcCsvWriter
+
 
 class TestPs2Amc(unittest.TestCase):
 
@@ -82,6 +88,28 @@ class TestPs2Amc(unittest.TestCase):
                 line = output.readline()
                 self.assertEqual(line, expected_line)
 
+    def test_psxls2amc_output(self):
+        with TemporaryDirectory() as tempdir:
+            outpath = os.path.join(tempdir, 'amc.csv')
+            check_call(['psxls2amc', '--no-cache', '--output', outpath,
+                        self.inxlspath])
+            with open(outpath, newline='') as output, \
+                    open(self.expected_outfile, newline='') as expected:
+                self.assertEqual(output.read(), expected.read())
+
+    def test_records_match_vcards(self):
+        with TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'ps.xls')
+            write_xls_roster(path, make_students(300))
+            parser = AlbertRosterXlsParser()
+            (_, rows) = parser.parse_records(path)
+            from_rows = io.StringIO()
+            AmcCsvWriter(from_rows).write(rows)
+            from_cards = io.StringIO()
+            VcardAmcCsvWriter(from_cards).write(
+                [parser.student_to_vcard(row) for row in rows])
+            self.assertEqual(from_rows.getvalue(), from_cards.getvalue())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+import csv
+import os.path
+import pickle
+from tempfile import TemporaryDirectory
+import unittest
+
+from ps2vcard.parsers import unpack_progplan
+from ps2vcard.parsers.csv import AlbertRosterCsvParser
+from ps2vcard.parsers.html import (
+    AlbertRosterFramesetParser,
+    AlbertRosterHtmlParser,
+    AlbertRosterXlsParser,
+)
+from ps2vcard.records import StudentRecord, student_card
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+class TestStudentRecord(unittest.TestCase):
+    """Test the records shared by the roster parsers."""
+
+    def setUp(self):
+        self._dir = os.path.dirname(__file__)
+        self.data_path = os.path.join(self._dir, 'data')
+        self.frameset_path = os.path.join(self.data_path, 'Faculty Center.html')
+        self.xls_path = os.path.join(self.data_path, 'ps.xls')
+        self.csv_path = os.path.join(self.data_path, 'ps.csv')
+
+    def test_cards_match_parse(self):
+        for (parser_class, path) in [
+                (AlbertRosterFramesetParser, self.frameset_path),
+                (AlbertRosterXlsParser, self.xls_path)]:
+            with self.subTest(parser=parser_class.__name__):
+                (course, cards) = parser_class().parse(path)
+                (course, records) = parser_class().parse_students(path)
+                self.assertEqual(len(records), 40)
+                self.assertEqual(
+                    [student_card(record).serialize() for record in records],
+                    [card.serialize() for card in cards])
+
+    def test_fields(self):
+        (course, records) = AlbertRosterXlsParser().parse_students(self.xls_path)
+        record = records[0]
+        self.assertEqual(record.nnumber, 'N30244832')
+        self.assertEqual(record.family_name, 'Lawson')
+        self.assertEqual(record.program, 'UB-Stern Schl Business-Ugrd')
+        self.assertEqual(record.course, 'MATH-UA 122 - 005')
+        self.assertIsNone(record.photo)
+        (course, records) = AlbertRosterFramesetParser().parse_students(
+            self.frameset_path)
+        self.assertIsNone(records[0].nnumber)
+        self.assertEqual(records[0].photo, '')
+        with TemporaryDirectory() as tempdir:
+            path = write_html_roster(os.path.join(tempdir, 'roster.html'),
+                                     make_students(2), photo_size=100)
+            (course, records) = AlbertRosterHtmlParser().parse_students(path)
+            self.assertTrue(records[1].photo.endswith('photo1.jpg'))
+
+    def test_csv_email(self):
+        # ps.csv has the columns of ps.xls: the address is in "Email Address"
+        with open(self.csv_path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        (course, cards) = AlbertRosterCsvParser().parse(self.csv_path)
+        self.assertEqual(len(cards), len(rows))
+        for (row, card) in zip(rows, cards):
+            self.assertEqual(card.email.value, row['Email Address'])
+            self.assertIn('EMAIL;TYPE=INTERNET:' + row['Email Address'],
+                          card.serialize())
+
+    def test_shared_values(self):
+        (course, records) = AlbertRosterXlsParser().parse_students(self.xls_path)
+        programs = {}
+        for record in records:
+            self.assertIs(programs.setdefault(record.program, record.program),
+                          record.program)
+            self.assertIs(record.course, records[0].course)
+
+    def test_compact(self):
+        record = StudentRecord('N1', 'Lawson', 'Bonnie', 'bl1@nyu.edu',
+                               'New York University', 'UA', 'Math', 'MATH-UA')
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+
+    def test_unpack_progplan(self):
+        unpack_progplan.cache_clear()
+        for i in range(3):
+            self.assertEqual(
+                unpack_progplan("UA-Coll of Arts & Sci - \n\nUndecided"),
+                ('UA-Coll of Arts & Sci', 'Undecided'))
+        self.assertEqual(unpack_progplan.cache_info().misses, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
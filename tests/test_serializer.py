@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+from glob import glob
+import os.path
+import random
+from tempfile import TemporaryDirectory
+import unittest
+
+import vobject
+
+from ps2vcard.parsers.html import (
+    AlbertRosterFramesetParser,
+    AlbertRosterHtmlParser,
+    AlbertRosterXlsParser,
+)
+from ps2vcard.photos import add_photo
+from ps2vcard.serializer import serialize_vcard
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+class TestSerializeVcard(unittest.TestCase):
+    """`serialize_vcard` must match `card.serialize()` byte for byte."""
+
+    def setUp(self):
+        self._dir = os.path.dirname(__file__)
+        self.data_path = os.path.join(self._dir, 'data')
+        self.golden_path = os.path.join(self._dir, 'golden')
+        self.tempdir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def assertSerializesLike(self, cards):
+        for card in cards:
+            self.assertEqual(serialize_vcard(card), card.serialize())
+
+    def test_fixture_cards(self):
+        (course, cards) = AlbertRosterFramesetParser().parse(
+            os.path.join(self.data_path, 'Faculty Center.html'))
+        self.assertEqual(len(cards), 40)
+        self.assertSerializesLike(cards)
+        (course, cards) = AlbertRosterXlsParser().parse(
+            os.path.join(self.data_path, 'ps.xls'))
+        self.assertSerializesLike(cards)
+
+    def test_synthetic_cards(self):
+        path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(path, make_students(50), photo_size=3000)
+        (course, cards) = AlbertRosterHtmlParser().parse(path)
+        self.assertTrue(all(card.photo.value for card in cards))
+        self.assertSerializesLike(cards)
+
+    def test_golden(self):
+        for path in glob(os.path.join(self.golden_path, '*', '*.vcf')):
+            with open(path, newline='') as f:
+                card = vobject.readOne(f.read())
+            self.assertEqual(serialize_vcard(card), card.serialize())
+        with open(os.path.join(self.golden_path, 'felix.vcf'), newline='') as f:
+            gold = f.read()
+        card = vobject.vCard()
+        card.add('n').value = vobject.vcard.Name(family="Thecat", given="Felix")
+        card.add('fn').value = "Felix Thecat"
+        add_photo(card, os.path.join(self.data_path, 'felix-229.png'), 'PNG')
+        self.assertEqual(serialize_vcard(card), gold)
+
+    def test_escaping_and_folding(self):
+        rng = random.Random(0)
+        alphabet = 'ab ,;:\\\n"é漢\U0001f600'
+
+        def text(length):
+            return ''.join(rng.choice(alphabet) for _ in range(length))
+        cards = []
+        for length in range(60, 160):
+            card = vobject.vCard()
+            card.add('n').value = vobject.vcard.Name(
+                family=text(length // 4), given=text(length // 3),
+                additional=[text(3), text(3)])
+            card.add('fn').value = text(length)
+            card.add('email').value = text(length // 2)
+            card.email.type_param = rng.choice(['INTERNET', 'a,b', 'c:d'])
+            card.add('org').value = [text(length // 2), text(length // 2)]
+            card.add('item1.X-ABRELATEDNAMES').value = 'x' * length
+            cards.append(card)
+        self.assertSerializesLike(cards)
+
+    def test_fallback(self):
+        card = vobject.vCard()
+        card.add('fn').value = 'Felix Thecat'
+        card.add('adr').value = vobject.vcard.Address(street='1 Main St')
+        self.assertSerializesLike([card])
+        del card.contents['fn']
+        with self.assertRaises(vobject.base.ValidateError):
+            serialize_vcard(card)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+
+import csv
+import http.client
+import io
+import json
+import multiprocessing
+import os.path
+from tempfile import TemporaryDirectory
+import threading
+import time
+import unittest
+from unittest import mock
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+import zipfile
+
+import vobject
+
+from ps2vcard.serve import ConversionServer
+from ps2vcard.synthetic import make_students, write_roster
+
+
+def stuck_conversion(*args):
+    """A conversion that never ends."""
+    while True:
+        time.sleep(60)
+
+
+def zip_directory(dirname, root):
+    """Return a zip archive of the files under `dirname`, named relative to
+    `root`."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for (path, subdirs, filenames) in os.walk(dirname):
+            for filename in filenames:
+                full_path = os.path.join(path, filename)
+                archive.write(full_path, os.path.relpath(full_path, root))
+    return buffer.getvalue()
+
+
+def multipart(fields):
+    """Return the content type and body of a form of `(filename, bytes)`
+    fields."""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for (name, (filename, data)) in fields.items():
+        body.write(b'--%s\r\n' % boundary.encode())
+        body.write(b'Content-Disposition: form-data; name="%s"; filename="%s"\r\n'
+                   % (name.encode(), filename.encode()))
+        body.write(b'Content-Type: application/octet-stream\r\n\r\n')
+        body.write(data + b'\r\n')
+    body.write(b'--%s--\r\n' % boundary.encode())
+    return ('multipart/form-data; boundary=%s' % boundary, body.getvalue())
+
+
+class TestServe(unittest.TestCase):
+    """Test the conversion server, on the loopback interface."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ConversionServer(('127.0.0.1', 0), workers=2,
+                                      max_upload=1024 * 1024)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.thread.join()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.students = make_students(6)
+        self.page_path = os.path.join(self.tempdir.name, 'roster.html')
+        write_roster('html', self.page_path, self.students, photo_size=500)
+        self.xls_path = os.path.join(self.tempdir.name, 'ps.xls')
+        write_roster('xls', self.xls_path, self.students)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def request(self, path, data=None, content_type=None):
+        """Return the status, headers and body of a request."""
+        request = urllib.request.Request(self.server.url + path, data=data)
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return (response.status, response.headers, response.read())
+        except urllib.error.HTTPError as e:
+            with e:
+                return (e.code, e.headers, e.read())
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_health(self):
+        (status, headers, body) = self.request('health')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), {'status': 'ok', 'workers': 2})
+
+    def test_page_and_photos(self):
+        photos = zip_directory(os.path.join(self.tempdir.name, 'roster_files'),
+                               self.tempdir.name)
+        (content_type, body) = multipart({
+            'roster': ('roster.html', self.read(self.page_path)),
+            'photos': ('photos.zip', photos),
+        })
+        (status, headers, body) = self.request('convert', body, content_type)
+        self.assertEqual(status, 200, body)
+        self.assertEqual(headers['Content-Type'], 'text/vcard; charset=utf-8')
+        self.assertEqual(headers['X-Students'], '6')
+        self.assertIn('total;dur=', headers['Server-Timing'])
+        cards = list(vobject.readComponents(body.decode()))
+        self.assertEqual(len(cards), 6)
+        self.assertTrue(all(len(card.photo.value) > 400 for card in cards))
+
+    def test_photos_keep_roster(self):
+        # a photos archive with a file named like the roster
+        files_dir = os.path.join(self.tempdir.name, 'roster_files')
+        with open(os.path.join(files_dir, 'roster.html'), 'w') as f:
+            f.write('<p>not the roster</p>')
+        photos = io.BytesIO()
+        with zipfile.ZipFile(photos, 'w') as archive:
+            for name in os.listdir(files_dir):
+                archive.write(os.path.join(files_dir, name),
+                              os.path.join('roster_files', name))
+            archive.write(os.path.join(files_dir, 'roster.html'), 'roster.html')
+        (content_type, body) = multipart({
+            'roster': ('roster.html', self.read(self.page_path)),
+            'photos': ('photos.zip', photos.getvalue()),
+        })
+        (status, headers, body) = self.request('convert', body, content_type)
+        self.assertEqual(status, 200, body)
+        self.assertEqual(headers['X-Students'], '6')
+
+    def test_zipped_page_with_photos(self):
+        archive = zip_directory(self.tempdir.name, self.tempdir.name)
+        (content_type, body) = multipart({
+            'roster': ('roster.zip', archive),
+            'photos': ('photos.zip', archive),
+        })
+        (status, headers, body) = self.request('convert', body, content_type)
+        self.assertEqual(status, 422)
+        self.assertIn('no photos field', json.loads(body)['error'])
+
+    def test_zipped_page(self):
+        (status, headers, body) = self.request(
+            'convert?format=zip', zip_directory(self.tempdir.name,
+                                                self.tempdir.name))
+        self.assertEqual(status, 200, body)
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            names = archive.namelist()
+        self.assertEqual(len(names), 6)
+        self.assertTrue(all(name.endswith('.vcf') for name in names))
+
+    def test_amc(self):
+        (status, headers, body) = self.request(
+            'convert?format=amc&filename=ps.xls', self.read(self.xls_path))
+        self.assertEqual(status, 200, body)
+        self.assertEqual(headers['Content-Disposition'],
+                         'attachment; filename="amc.csv"')
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual([row['Campus ID'] for row in rows],
+                         [student['Campus ID'] for student in self.students])
+        (status, headers, body) = self.request(
+            'convert?format=amc', self.read(self.page_path))
+        self.assertEqual(status, 422)
+        self.assertIn('spreadsheet', json.loads(body)['error'])
+
+    def test_download_name(self):
+        name = urllib.parse.quote('sec "1"\r\nX-Injected: yes\r\n.xls')
+        (status, headers, body) = self.request(
+            'convert?filename=' + name, self.read(self.xls_path))
+        self.assertEqual(status, 200, body)
+        self.assertNotIn('X-Injected', headers)
+        self.assertEqual(
+            headers['Content-Disposition'],
+            'attachment; filename="sec _1___X-Injected_ yes__.vcf"; '
+            "filename*=UTF-8''sec%20%221%22%0D%0AX-Injected%3A%20yes%0D%0A.vcf")
+
+    def test_errors(self):
+        (status, headers, body) = self.request('convert', b'<p>hello</p>')
+        self.assertEqual(status, 422)
+        self.assertIn('cannot tell', json.loads(body)['error'])
+        self.assertEqual(self.request('convert?format=pdf', b'x')[0], 400)
+        # refused before the body is sent
+        connection = http.client.HTTPConnection(*self.server.server_address)
+        connection.putrequest('POST', '/convert')
+        connection.putheader('Content-Length', str(1024 * 1024 + 1))
+        connection.endheaders()
+        with connection.getresponse() as response:
+            self.assertEqual(response.status, 413)
+        connection.close()
+        self.assertEqual(self.request('nonesuch')[0], 404)
+        timeout = self.server.timeout
+        self.server.timeout = 1e-6
+        try:
+            status = self.request('convert', self.read(self.xls_path))[0]
+        finally:
+            self.server.timeout = timeout
+        self.assertEqual(status, 504)
+
+    def post_with_length(self, length):
+        """Return the status of a conversion request whose Content-Length
+        header is `length`; the connection stays open, and nothing is sent
+        after the headers."""
+        connection = http.client.HTTPConnection(*self.server.server_address,
+                                                timeout=30)
+        try:
+            connection.putrequest('POST', '/convert')
+            connection.putheader('Content-Length', length)
+            connection.endheaders()
+            with connection.getresponse() as response:
+                return response.status
+        finally:
+            connection.close()
+
+    def free_slots(self):
+        count = 0
+        while self.server.slots.acquire(blocking=False):
+            count += 1
+        for _ in range(count):
+            self.server.slots.release()
+        return count
+
+    def test_non_numeric_length(self):
+        self.assertEqual(self.post_with_length('lots'), 400)
+        self.assertEqual(self.free_slots(), self.server.max_concurrent)
+
+    def test_negative_length(self):
+        self.assertEqual(self.post_with_length('-1'), 400)
+        self.assertEqual(self.free_slots(), self.server.max_concurrent)
+
+    def test_rosters_in_sequence(self):
+        # each worker gets both sizes of roster, one after the other
+        rosters = {}
+        for count in [30, 10]:
+            path = os.path.join(self.tempdir.name, 'roster%d.html' % count)
+            write_roster('html', path, make_students(count))
+            rosters[count] = self.read(path)
+        for count in [30, 10] * 4:
+            with self.subTest(count=count):
+                (status, headers, body) = self.request('convert',
+                                                       rosters[count])
+                self.assertEqual(status, 200, body)
+                self.assertEqual(headers['X-Students'], str(count))
+                self.assertEqual(body.count(b'BEGIN:VCARD'), count)
+
+    def test_timeout_holds_slot(self):
+        class StuckTask(object):
+            """A conversion that goes on until `done` is set."""
+            done = threading.Event()
+
+            def get(self, timeout=None):
+                raise multiprocessing.TimeoutError
+
+            def wait(self, timeout=None):
+                self.done.wait(timeout)
+
+            def ready(self):
+                return self.done.is_set()
+
+        with mock.patch.object(self.server.pool, 'apply_async',
+                               return_value=StuckTask()):
+            try:
+                status = self.request('convert', self.read(self.xls_path))[0]
+                self.assertEqual(status, 504)
+                # the worker is still busy, so its slot is still taken
+                self.assertEqual(self.free_slots(), self.server.max_concurrent - 1)
+            finally:
+                StuckTask.done.set()
+        deadline = time.monotonic() + 10
+        while (self.server.metrics.in_flight
+               and time.monotonic() < deadline):
+            time.sleep(0.01)
+        self.assertEqual(self.free_slots(), self.server.max_concurrent)
+
+    def test_stuck_worker(self):
+        # the worker is forked with the stuck conversion, and the one that
+        # replaces it without
+        with mock.patch('ps2vcard.serve._convert_upload', stuck_conversion):
+            server = ConversionServer(('127.0.0.1', 0), workers=1,
+                                      max_concurrent=1, timeout=0.2,
+                                      kill_after=0.2)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            def convert():
+                request = urllib.request.Request(server.url + 'convert',
+                                                 data=self.read(self.xls_path))
+                try:
+                    with urllib.request.urlopen(request, timeout=30) as response:
+                        return response.status
+                except urllib.error.HTTPError as e:
+                    with e:
+                        return e.code
+
+            self.assertEqual(convert(), 504)
+            # the stuck worker is killed, and the pool starts another
+            deadline = time.monotonic() + 10
+            status = convert()
+            while status == 503 and time.monotonic() < deadline:
+                time.sleep(0.05)
+                status = convert()
+            self.assertEqual(status, 200)
+        finally:
+            server.shutdown()
+            thread.join()
+            server.server_close()
+
+    def test_concurrency_limit(self):
+        for _ in range(self.server.max_concurrent):
+            self.server.slots.acquire()
+        try:
+            (status, headers, body) = self.request(
+                'convert', self.read(self.xls_path))
+        finally:
+            for _ in range(self.server.max_concurrent):
+                self.server.slots.release()
+        self.assertEqual(status, 503)
+        self.assertEqual(headers['Retry-After'], '1')
+        self.assertEqual(self.request('convert', self.read(self.xls_path))[0], 200)
+
+    def test_metrics(self):
+        before = json.loads(self.request('metrics')[2])
+        for _ in range(3):
+            self.request('convert', self.read(self.xls_path))
+        metrics = json.loads(self.request('metrics')[2])
+        self.assertEqual(metrics['requests'] - before['requests'], 4)
+        self.assertEqual(metrics['students'] - before['students'], 18)
+        self.assertGreaterEqual(metrics['latency']['count'], 3)
+        self.assertLessEqual(metrics['latency']['p50'], metrics['latency']['max'])
+        self.assertIn('serialize', metrics['stages'])
+        self.assertEqual(metrics['in_flight'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+import builtins
+import os.path
+import shutil
+from subprocess import PIPE, run
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+
+from ps2vcard.parsers.html import AlbertRosterFramesetParser
+from ps2vcard.sniff import MAX_READ, sniff
+from ps2vcard.synthetic import make_students, write_html_roster, write_xls_roster
+
+
+class TestSniff(unittest.TestCase):
+    """Test recognizing rosters from the head of the file."""
+
+    def setUp(self):
+        self._dir = os.path.dirname(__file__)
+        self.data_path = os.path.join(self._dir, 'data')
+        self.golden_path = os.path.join(self._dir, 'golden')
+        self.tempdir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def sniff_reading(self, path):
+        """sniff `path`, returning the kind and the number of bytes read"""
+        read = []
+        real_open = builtins.open
+
+        def tracking_open(*args, **kwargs):
+            f = real_open(*args, **kwargs)
+            real_read = f.read
+
+            def read_some(size=-1):
+                data = real_read(size)
+                read.append(len(data))
+                return data
+            f.read = read_some
+            return f
+        with mock.patch('ps2vcard.sniff.open', tracking_open, create=True):
+            kind = sniff(path)
+        return (kind, sum(read))
+
+    def test_fixtures(self):
+        for (filename, kind) in [
+                ('Faculty Center.html', 'frameset'),
+                ('Access Class Rosters.html', 'frameset'),
+                (os.path.join('Faculty Center_files',
+                              'SA_LEARNING_MANAGEMENT.SS_FACULTY.html'), 'html'),
+                ('ps.xls', 'xls'),
+                ('ps.csv', 'csv'),
+                ('felix-229.png', None)]:
+            with self.subTest(filename=filename):
+                self.assertEqual(sniff(os.path.join(self.data_path, filename)),
+                                 kind)
+
+    def test_reads_head_only(self):
+        html_path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(html_path, make_students(2000))
+        xls_path = os.path.join(self.tempdir.name, 'ps.xls')
+        write_xls_roster(xls_path, make_students(2000))
+        for (path, kind) in [(html_path, 'html'), (xls_path, 'xls')]:
+            (sniffed, read) = self.sniff_reading(path)
+            self.assertEqual(sniffed, kind)
+            self.assertLessEqual(read, 8 * 1024)
+            self.assertGreater(os.path.getsize(path), 100 * read)
+        path = os.path.join(self.tempdir.name, 'page.html')
+        with open(path, 'w') as f:
+            f.write('<html>' + ' ' * MAX_READ + '<table><tr><th>Notify</th>')
+        (sniffed, read) = self.sniff_reading(path)
+        self.assertIsNone(sniffed)
+        self.assertEqual(read, MAX_READ)
+
+    def test_frameset_stops_at_frame(self):
+        shutil.copytree(os.path.join(self.data_path, 'Faculty Center_files'),
+                        os.path.join(self.tempdir.name, 'Faculty Center_files'))
+        path = os.path.join(self.tempdir.name, 'Faculty Center.html')
+        with open(os.path.join(self.data_path, 'Faculty Center.html'),
+                  'rb') as f:
+            frameset = f.read()
+        # anything well past the frame would fail to decode if it were read
+        with open(path, 'wb') as f:
+            f.write(frameset + b' ' * (1 << 15) + b'<!--' + b'\xff' * (1 << 17)
+                    + b'-->')
+        (course, students) = AlbertRosterFramesetParser().parse_records(path)
+        self.assertEqual(len(students), 40)
+
+    def test_cli(self):
+        for filename in ['Faculty Center.html', 'ps.xls', 'ps.csv']:
+            result = run(['ps2vcard', 'auto', '--no-cache', '--bundle', '-',
+                          os.path.join(self.data_path, filename)],
+                         stdout=PIPE, universal_newlines=True)
+            self.assertEqual(result.returncode, 0)
+            self.assertEqual(result.stdout.count('BEGIN:VCARD'), 40)
+        result = run(['ps2vcard', 'auto', '--no-cache', '--no-print',
+                      '--amc', '-', os.path.join(self.data_path, 'ps.xls')],
+                     stdout=PIPE, universal_newlines=True)
+        with open(os.path.join(self.golden_path, 'amc.csv')) as f:
+            self.assertEqual(result.stdout, f.read())
+        result = run(['ps2vcard', 'auto',
+                      os.path.join(self.data_path, 'felix-229.png')],
+                     stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        self.assertEqual(result.returncode, 2)
+        self.assertIn('cannot tell', result.stderr)
+
+    def test_roster_frameset(self):
+        # `roster` reads a page saved with its frames, as `frameset` does
+        path = os.path.join(self.data_path, 'Faculty Center.html')
+        bundles = []
+        for command in ['roster', 'frameset']:
+            result = run(['ps2vcard', command, '--no-cache', '--bundle', '-',
+                          path], stdout=PIPE, universal_newlines=True)
+            self.assertEqual(result.returncode, 0)
+            bundles.append(result.stdout)
+        self.assertEqual(bundles[0].count('BEGIN:VCARD'), 40)
+        self.assertEqual(bundles[0], bundles[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+import os.path
+from subprocess import PIPE, run
+import sys
+import unittest
+
+# modules that only the parsers, writers and batch runner that use them
+# should import
+HEAVY_MODULES = ['bs4', 'lxml', 'transitions', 'vobject', 'PIL', 'pandas',
+                 'concurrent.futures.process']
+
+# modules of ps2vcard that only the commands that use them should import
+# (the import time is measured by benchmarks/bench_startup.py)
+COMMAND_MODULES = ['ps2vcard.cache', 'ps2vcard.frames', 'ps2vcard.photostore',
+                   'ps2vcard.sniff', 'ps2vcard.writers', 'pickle']
+
+
+def import_times(code, *args):
+    """Run `code` with `python -X importtime`; return the cumulative import
+    time of each module, in microseconds."""
+    process = run([sys.executable, '-X', 'importtime', '-c', code] + list(args),
+                  stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        fields = line.split('|')
+        if line.startswith('import time:') and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1])
+    return times
+
+
+class TestStartup(unittest.TestCase):
+    """Test that the commands start without importing what they do not
+    use."""
+
+    def assertNotImported(self, times):
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, times)
+
+    def test_import(self):
+        times = import_times('import ps2vcard.cli')
+        self.assertNotImported(times)
+        for module in COMMAND_MODULES:
+            self.assertNotIn(module, times)
+
+    def test_ps2amc(self):
+        path = os.path.join(os.path.dirname(__file__), 'data', 'ps.csv')
+        times = import_times(
+            'import sys; from ps2vcard.cli import main; main(sys.argv[1:])',
+            'amc', '--output', os.devnull, path)
+        self.assertIn('ps2vcard.cli', times)
+        self.assertNotImported(times)
+
+    def test_logging(self):
+        process = run(
+            [sys.executable, '-c', 'import logging, ps2vcard.cli; '
+             'print(len(logging.getLogger().handlers))'],
+            stdout=PIPE, universal_newlines=True)
+        self.assertEqual(process.stdout.strip(), '0')
+
+
+if __name__ == '__main__':
+    unittest.main()
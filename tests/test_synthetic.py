@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+import os.path
+from subprocess import check_call
+import sys
+from tempfile import TemporaryDirectory
+import unittest
+
+from ps2vcard.sniff import make_parser, sniff
+from ps2vcard.synthetic import KINDS, make_students, write_roster
+
+
+class TestSynthetic(unittest.TestCase):
+    """Test the synthetic rosters of every kind."""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.students = make_students(25)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_kinds(self):
+        for kind in KINDS:
+            with self.subTest(kind=kind):
+                dirname = os.path.join(self.tempdir.name, kind)
+                os.makedirs(dirname)
+                path = write_roster(kind, os.path.join(dirname, 'roster'),
+                                    self.students, photo_size=100)
+                self.assertEqual(sniff(path), kind)
+                (course, records) = make_parser(kind).parse_students(path)
+                self.assertEqual(
+                    [record.email for record in records],
+                    [student['Email Address'] for student in self.students])
+                self.assertEqual(records[0].program,
+                                 self.students[0]['Program and Plan'].split(' - ')[0])
+                if kind in ('html', 'frameset'):
+                    self.assertTrue(all(os.path.exists(record.photo)
+                                        for record in records))
+
+    def test_frameset_layout(self):
+        path = write_roster('frameset',
+                            os.path.join(self.tempdir.name, 'Faculty Center.html'),
+                            self.students, photo_size=100)
+        files_dir = os.path.join(self.tempdir.name, 'Faculty Center_files')
+        self.assertTrue(os.path.exists(os.path.join(
+            files_dir, 'SA_LEARNING_MANAGEMENT.SS_FACULTY.html')))
+        self.assertTrue(os.path.exists(os.path.join(files_dir, 'photo24.jpg')))
+        self.assertEqual(sniff(path), 'frameset')
+
+    def test_command_line(self):
+        path = os.path.join(self.tempdir.name, 'ps.csv')
+        check_call([sys.executable, '-m', 'ps2vcard.synthetic', '--kind', 'csv',
+                    '40', path])
+        (course, records) = make_parser('csv').parse_students(path)
+        self.assertEqual(len(records), 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
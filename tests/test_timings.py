@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import json
+import os.path
+import pstats
+import shutil
+from subprocess import PIPE, run
+from tempfile import TemporaryDirectory
+import time
+import unittest
+
+from ps2vcard import timings
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+class TestTimings(unittest.TestCase):
+    """Test the stage timings."""
+
+    def test_inactive(self):
+        self.assertIsNone(timings.current())
+        self.assertIs(timings.stage('read'), timings.NULL_TIMER)
+        items = [1, 2, 3]
+        self.assertIs(timings.timed_iter('rows', items), items)
+
+    def test_self_time(self):
+        with timings.collecting() as collector:
+            with timings.stage('outer'):
+                with timings.stage('inner') as timer:
+                    time.sleep(0.05)
+                    timer.add_bytes(10)
+        stages = collector.as_dict()['stages']
+        self.assertGreaterEqual(stages['inner']['seconds'], 0.05)
+        self.assertLess(stages['outer']['seconds'], 0.05)
+        self.assertEqual(stages['inner']['bytes'], 10)
+        self.assertIsNone(timings.current())
+
+    def test_timed_iter_and_merge(self):
+        with timings.collecting() as collector:
+            self.assertEqual(list(timings.timed_iter('rows', 'abc', size=len)),
+                             ['a', 'b', 'c'])
+        with timings.collecting() as total:
+            total.merge(collector.as_dict()['stages'])
+            total.merge(collector.as_dict()['stages'])
+        rows = total.as_dict()['stages']['rows']
+        self.assertEqual((rows['calls'], rows['bytes']), (6, 6))
+        self.assertIn('other', total.table())
+
+
+class TestTimingsCli(unittest.TestCase):
+    """Test the timing options of the commands."""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.data_path = os.path.join(os.path.dirname(__file__), 'data')
+        self.roster_path = write_html_roster(
+            os.path.join(self.tempdir.name, 'roster.html'), make_students(10),
+            photo_size=100)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def run_command(self, *args):
+        process = run(list(args), stdout=PIPE, stderr=PIPE,
+                      universal_newlines=True, cwd=self.tempdir.name)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        return process
+
+    def test_table(self):
+        process = self.run_command(
+            'ps2vcard', 'roster', '--no-print', '--no-cache', '--timings',
+            self.roster_path)
+        for stage in ['read', 'tokenize', 'fsm', 'build', 'total']:
+            self.assertIn(stage, process.stderr)
+
+    def test_json(self):
+        process = self.run_command(
+            'ps2vcard-old', '--no-print', '--save', '--no-cache',
+            '--save-dir', self.tempdir.name, '--timings-json', '-',
+            os.path.join(self.data_path, 'Faculty Center.html'))
+        stages = json.loads(process.stdout)['stages']
+        for stage in ['read', 'tokenize', 'fsm', 'build', 'serialize', 'write']:
+            self.assertIn(stage, stages)
+        self.assertEqual(stages['build']['calls'], 40)
+
+    def test_profile(self):
+        path = os.path.join(self.tempdir.name, 'profile.out')
+        self.run_command('psxls2amc', '--no-cache', '--output', os.devnull,
+                         '--profile-out', path,
+                         os.path.join(self.data_path, 'ps.xls'))
+        self.assertGreater(pstats.Stats(path).total_calls, 0)
+
+    def test_batch(self):
+        path = os.path.join(self.tempdir.name, 'timings.json')
+        rosters = os.path.join(self.tempdir.name, 'rosters')
+        os.makedirs(rosters)
+        shutil.copy(os.path.join(self.data_path, 'ps.xls'), rosters)
+        write_html_roster(os.path.join(rosters, 'roster.html'),
+                          make_students(10), photo_size=100)
+        self.run_command(
+            'ps2vcard', 'batch', '--jobs', '2', '--timings-json', path,
+            '--output-dir', os.path.join(self.tempdir.name, 'out'), rosters)
+        with open(path) as f:
+            stages = json.load(f)['stages']
+        self.assertIn('sniff', stages)
+        self.assertGreater(stages['build']['calls'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+import filecmp
+import os.path
+from subprocess import check_call
+import sys
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+
+from ps2vcard.parsers import HTML_TOKENIZERS
+from ps2vcard.parsers.html import AlbertRosterHtmlParser
+from ps2vcard.parsers.tokenizers import LxmlTokenizer
+from ps2vcard.synthetic import make_students, write_html_roster
+
+
+def parse_records(path, **kwargs):
+    """Parse a roster and return plain records."""
+    parser = AlbertRosterHtmlParser(**kwargs)
+    (course, students) = parser.parse_records(path)
+    return (dict(course), [dict(student) for student in students])
+
+
+class TestTokenizers(unittest.TestCase):
+    """The lxml tokenizer must give the records of `HTMLParser`."""
+
+    def setUp(self):
+        self._dir = os.path.dirname(__file__)
+        self.data_path = os.path.join(self._dir, 'data')
+        self.tempdir = TemporaryDirectory()
+        self.frameset_path = os.path.join(self.data_path, 'Faculty Center.html')
+        self.roster_path = os.path.join(
+            self.data_path, 'Faculty Center_files',
+            'SA_LEARNING_MANAGEMENT.SS_FACULTY.html')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_fixture_records(self):
+        expected = parse_records(self.roster_path)
+        self.assertEqual(len(expected[1]), 40)
+        for tokenizer in HTML_TOKENIZERS:
+            for engine in AlbertRosterHtmlParser.engines:
+                with self.subTest(tokenizer=tokenizer, engine=engine):
+                    self.assertEqual(parse_records(
+                        self.roster_path, engine=engine, tokenizer=tokenizer),
+                        expected)
+
+    def test_synthetic_records(self):
+        path = os.path.join(self.tempdir.name, 'roster.html')
+        students = make_students(200)
+        students[3]['Name'] = 'Müller & Søn,José'
+        write_html_roster(path, students, photo_size=200)
+        expected = parse_records(path)
+        self.assertEqual(expected[1][3]['name'], 'Müller & Søn,José')
+        for prescan in [False, True]:
+            with self.subTest(prescan=prescan):
+                self.assertEqual(parse_records(
+                    path, tokenizer='lxml', prescan=prescan), expected)
+
+    def test_iter_students(self):
+        path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(path, make_students(300), photo_size=100)
+        parser = AlbertRosterHtmlParser(tokenizer='lxml')
+        parser.chunk_size = 4096
+        streamed = [dict(student) for student in
+                    parser.iter_students(path, vcards=False)]
+        self.assertEqual(streamed, parse_records(path)[1])
+
+    def test_nothing_fed(self):
+        for prescan in [False, True]:
+            with self.subTest(prescan=prescan):
+                self.assertEqual(parse_records(
+                    os.path.join(self.data_path, 'psxlst.html'),
+                    tokenizer='lxml', prescan=prescan), ({}, []))
+
+    def test_fallback(self):
+        with mock.patch.dict(sys.modules, {'lxml': None, 'lxml.etree': None}):
+            with self.assertLogs('ps2vcard.parsers.tokenizers', 'WARNING'):
+                parser = AlbertRosterHtmlParser(tokenizer='lxml')
+        self.assertIsNone(parser.tokenizer)
+        self.assertEqual(len(parser.parse_records(self.roster_path)[1]), 40)
+        self.assertIsInstance(
+            AlbertRosterHtmlParser(tokenizer='lxml').tokenizer, LxmlTokenizer)
+
+    def test_unknown_tokenizer(self):
+        with self.assertRaises(ValueError):
+            AlbertRosterHtmlParser(tokenizer='nonesuch')
+
+    def test_cli(self):
+        outdirs = []
+        for tokenizer in HTML_TOKENIZERS:
+            outdir = os.path.join(self.tempdir.name, tokenizer)
+            check_call([
+                'ps2vcard', 'frameset', self.frameset_path, '--no-print',
+                '--save', '--save-dir=%s' % outdir, '--no-cache',
+                '--tokenizer=%s' % tokenizer
+            ])
+            outdirs.append(outdir)
+        comparison = filecmp.dircmp(*outdirs)
+        cards = [name for name in comparison.common_files
+                 if name.endswith('.vcf')]
+        self.assertEqual(len(cards), 40)
+        self.assertEqual(comparison.diff_files, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,25 @@
 #!/usr/bin/env python
 
+from glob import glob
+import io
 import os
 import os.path
+from subprocess import PIPE, run
+from tempfile import TemporaryDirectory
 import unittest
 import urllib.request
 
 import vobject
 
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from ps2vcard.parsers.html import AlbertRosterHtmlParser
+from ps2vcard.photos import LazyPhoto, PhotoProcessor, add_photo, photo_bytes
+from ps2vcard.synthetic import make_students, write_html_roster
+
 
 class TestVcardPhotoSerialize(unittest.TestCase):
 
@@ -45,5 +58,117 @@ class TestVcardPhotoSerialize(unittest.TestCase):
         self.assertMultiLineEqual(output, expected_output)
 
 
+class TestLazyPhoto(unittest.TestCase):
+    """Photos should be read only when a card is serialized."""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.roster_path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(self.roster_path, make_students(20), photo_size=5000)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def eager_serialize(self, card):
+        """serialize `card` after reading its photo the old way"""
+        photo = card.photo.value
+        card.photo.behavior = vobject.vcard.Photo
+        card.photo.value = photo.read()
+        output = card.serialize()
+        add_photo(card, photo.path)
+        return output
+
+    def test_parse_is_lazy(self):
+        (course, cards) = AlbertRosterHtmlParser().parse(self.roster_path)
+        for card in cards:
+            self.assertIsInstance(card.photo.value, LazyPhoto)
+            self.assertEqual(len(photo_bytes(card)), 5000)
+
+    def test_serialize(self):
+        (course, cards) = AlbertRosterHtmlParser().parse(self.roster_path)
+        for card in cards:
+            expected = self.eager_serialize(card)
+            self.assertIn('PHOTO;ENCODING=b;TYPE=JPEG:/9j/', expected)
+            self.assertEqual(card.serialize(), expected)
+            # the bytes are not kept once the card is written
+            self.assertIsInstance(card.photo.value, LazyPhoto)
+            self.assertEqual(card.serialize(), expected)
+
+    def test_missing_photo(self):
+        card = vobject.vCard()
+        card.add('fn').value = 'Felix Thecat'
+        card.add('photo')
+        self.assertEqual(photo_bytes(card), b'')
+        self.assertIn('PHOTO:\r\n', card.serialize())
+
+
+@unittest.skipIf(Image is None, 'needs Pillow')
+class TestPhotoProcessor(unittest.TestCase):
+    """Test shrinking and recompressing photos."""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.roster_path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(self.roster_path, make_students(12), photo_size=100)
+        self.photo_paths = sorted(glob(os.path.join(
+            self.tempdir.name, 'roster_files', '*.jpg')))
+        for (index, path) in enumerate(self.photo_paths):
+            image = Image.effect_noise((400 + index, 600), 50).convert('RGB')
+            image.save(path, quality=95)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_process_students(self):
+        students = [{'Name': 'Student %d' % index, 'photo': path}
+                    for (index, path) in enumerate(self.photo_paths)]
+        students.insert(3, {'Name': 'Nophoto'})
+        with PhotoProcessor(max_size=100, quality=70, jobs=3) as processor:
+            processed = list(processor.process_students(students, window=2))
+            self.assertEqual([s['Name'] for s in processed],
+                             [s['Name'] for s in students])
+            self.assertNotIn('photo', processed[3])
+            for (student, new) in zip(students, processed):
+                if 'photo' not in student:
+                    continue
+                image = Image.open(new['photo'])
+                self.assertLessEqual(max(image.size), 100)
+                self.assertLess(os.path.getsize(new['photo']),
+                                os.path.getsize(student['photo']))
+            # the totals of all the threads
+            self.assertEqual(processor.originals, sum(
+                os.path.getsize(path) for path in self.photo_paths))
+            self.assertEqual(processor.processed, sum(
+                os.path.getsize(new['photo']) for new in processed
+                if 'photo' in new))
+        self.assertFalse(os.path.exists(processor.tempdir.name))
+
+    def test_keep_original(self):
+        small_path = os.path.join(self.tempdir.name, 'small.jpg')
+        Image.effect_noise((50, 50), 50).convert('RGB').save(
+            small_path, quality=20)
+        broken_path = os.path.join(self.tempdir.name, 'broken.jpg')
+        with open(broken_path, 'wb') as f:
+            f.write(b'not a jpeg')
+        with PhotoProcessor(max_size=100, quality=95) as processor:
+            self.assertEqual(processor.process(small_path), small_path)
+            self.assertEqual(processor.process(broken_path), broken_path)
+
+    def test_cli(self):
+        sizes = []
+        for options in [[], ['--photo-size', '64']]:
+            result = run(['ps2vcard', '--no-cache', '--bundle', '-']
+                         + options + [self.roster_path],
+                         stdout=PIPE, stderr=PIPE)
+            self.assertEqual(result.returncode, 0)
+            cards = list(vobject.readComponents(result.stdout.decode()))
+            self.assertEqual(len(cards), 12)
+            sizes.append(len(result.stdout))
+        self.assertIn(b'photos:', result.stderr)
+        image = Image.open(io.BytesIO(cards[0].photo.value))
+        self.assertLessEqual(max(image.size), 64)
+        self.assertLess(sizes[1], sizes[0] / 4)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+import os.path
+from tempfile import TemporaryDirectory
+import threading
+import time
+import unittest
+from unittest import mock
+
+from ps2vcard.synthetic import make_students, write_roster
+from ps2vcard.watch import (
+    InotifyWatcher,
+    PollingWatcher,
+    RosterWatch,
+    make_watcher,
+)
+
+
+class TestWatch(unittest.TestCase):
+    """Test converting rosters as they are saved."""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.downloads = os.path.join(self.tempdir.name, 'Downloads')
+        self.outdir = os.path.join(self.tempdir.name, 'out')
+        os.makedirs(self.downloads)
+        self.students = make_students(6)
+        write_roster('html', os.path.join(self.downloads, 'a.html'),
+                     self.students[:3])
+        write_roster('xls', os.path.join(self.downloads, 'ps.xls'),
+                     self.students[3:])
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def roster_watch(self, **kwargs):
+        return RosterWatch([self.downloads], self.outdir, **kwargs)
+
+    def test_catch_up(self):
+        with self.roster_watch(poll=True) as roster_watch:
+            results = list(roster_watch.catch_up())
+        self.assertEqual(sorted(os.path.basename(result.path)
+                                for result in results), ['a.html', 'ps.xls'])
+        self.assertTrue(all(result.error is None for result in results))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.outdir, 'Downloads', 'ps.xls', 'amc.csv')))
+        # a later watch converts only what changed in the meantime
+        with self.roster_watch(poll=True) as roster_watch:
+            self.assertEqual(list(roster_watch.catch_up()), [])
+        path = os.path.join(self.downloads, 'a.html')
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        with self.roster_watch(poll=True) as roster_watch:
+            self.assertEqual([result.path for result in roster_watch.catch_up()],
+                             [os.path.abspath(path)])
+
+    def test_same_name(self):
+        # a spreadsheet export, and later a CSV copy of another section
+        with self.roster_watch(poll=True) as roster_watch:
+            list(roster_watch.catch_up())
+            results = []
+            for (kind, students) in [('xls', self.students[:2]),
+                                     ('csv', self.students[2:])]:
+                path = os.path.join(self.downloads, 'sec1.' + kind)
+                write_roster(kind, path, students)
+                results.append(roster_watch.convert(path))
+        self.assertNotEqual(results[0].outdir, results[1].outdir)
+        for (result, count) in zip(results, [2, 4]):
+            self.assertIsNone(result.error)
+            with open(os.path.join(result.outdir, 'amc.csv')) as f:
+                self.assertEqual(len(f.readlines()), count + 1)
+
+    def test_roster_for(self):
+        with self.roster_watch(poll=True) as roster_watch:
+            page = os.path.abspath(os.path.join(self.downloads, 'a.html'))
+            photo = os.path.join(self.downloads, 'a_files', 'photo0.jpg')
+            self.assertEqual(roster_watch.roster_for(page), page)
+            self.assertEqual(roster_watch.roster_for(photo), page)
+            self.assertIsNone(roster_watch.roster_for(
+                os.path.join(self.downloads, 'b_files', 'photo0.jpg')))
+            self.assertIsNone(roster_watch.roster_for(
+                os.path.join(self.downloads, 'a.html.crdownload')))
+            self.assertIsNone(roster_watch.roster_for(
+                os.path.join(self.tempdir.name, 'elsewhere.html')))
+            list(roster_watch.catch_up())
+            self.assertIsNone(roster_watch.roster_for(
+                os.path.join(self.outdir, 'Downloads', 'ps.xls', 'amc.csv')))
+
+    def watch_changes(self, poll):
+        with self.roster_watch(poll=poll, settle=0.3) as roster_watch:
+            if poll:
+                self.assertIsInstance(roster_watch.watcher, PollingWatcher)
+                roster_watch.watcher.interval = 0.05
+            else:
+                self.assertIsInstance(roster_watch.watcher, InotifyWatcher)
+            results = []
+            stop = threading.Event()
+            thread = threading.Thread(
+                target=roster_watch.run, args=(results.append, stop, 0.05))
+            thread.start()
+            try:
+                self.wait_for(results, 2)
+                del results[:]
+                # a page saved in two goes, a little apart, with its photos
+                # in a new directory
+                path = os.path.join(self.downloads, 'Spring', 'b.html')
+                write_roster('html', path, self.students, photo_size=100)
+                with open(path) as f:
+                    page = f.read()
+                with open(path, 'w') as f:
+                    f.write(page[:len(page) // 2])
+                    f.flush()
+                    time.sleep(0.1)
+                    f.write(page[len(page) // 2:])
+                self.wait_for(results, 1)
+                time.sleep(0.5)
+            finally:
+                stop.set()
+                thread.join()
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].path, os.path.abspath(path))
+        self.assertEqual(results[0].students, 6)
+        self.assertEqual(results[0].outdir, os.path.join(
+            self.outdir, 'Downloads', 'Spring', 'b.html'))
+
+    def wait_for(self, results, count, timeout=10):
+        deadline = time.monotonic() + timeout
+        while len(results) < count:
+            self.assertLess(time.monotonic(), deadline, results)
+            time.sleep(0.02)
+
+    def test_inotify(self):
+        try:
+            InotifyWatcher([self.downloads]).close()
+        except OSError as e:
+            self.skipTest('no inotify: %s' % e)
+        self.watch_changes(poll=False)
+
+    def test_polling(self):
+        self.watch_changes(poll=True)
+
+    def test_fallback(self):
+        with mock.patch('ctypes.util.find_library', return_value=None):
+            with self.assertLogs('ps2vcard.watch', 'WARNING'):
+                watcher = make_watcher([self.downloads])
+        self.assertIsInstance(watcher, PollingWatcher)
+
+
+if __name__ == '__main__':
+    unittest.main()
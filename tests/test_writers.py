@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+from io import BytesIO
+import os
+import os.path
+from subprocess import PIPE, check_call, run
+from tempfile import TemporaryDirectory
+import unittest
+
+import vobject
+
+from ps2vcard.synthetic import make_students, write_html_roster
+from ps2vcard.writers import VcardBundleWriter, VcardWriter
+
+
+def make_card(name, email):
+    card = vobject.vCard()
+    card.add('fn').value = name
+    card.add('email').value = email
+    return card
+
+
+class TestVcardWriter(unittest.TestCase):
+    """Test that `VcardWriter` only writes cards that changed."""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.outdir = os.path.join(self.tempdir.name, 'cards')
+        self.cards = [make_card('Student %d' % i, 's%d@nyu.edu' % i)
+                      for i in range(5)]
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write_all(self, cards):
+        with VcardWriter(dirname=self.outdir) as writer:
+            statuses = [writer.write(card) for card in cards]
+        return (statuses, writer.counts)
+
+    def test_rewrite(self):
+        (statuses, counts) = self.write_all(self.cards)
+        self.assertEqual(statuses, ['created'] * 5)
+        path = os.path.join(self.outdir, 'Student_0.vcf')
+        os.utime(path, (0, 0))
+        self.cards[1].email.value = 'changed@nyu.edu'
+        (statuses, counts) = self.write_all(self.cards)
+        self.assertEqual(counts, {'created': 0, 'updated': 1, 'unchanged': 4})
+        self.assertEqual(statuses[1], 'updated')
+        self.assertEqual(os.stat(path).st_mtime, 0)
+        with open(os.path.join(self.outdir, 'Student_1.vcf')) as f:
+            self.assertIn('changed@nyu.edu', f.read())
+        self.assertEqual(sorted(os.listdir(self.outdir)), sorted(
+            ['.ps2vcard-manifest.json']
+            + ['Student_%d.vcf' % i for i in range(5)]))
+
+    def test_deleted_file(self):
+        self.write_all(self.cards)
+        os.remove(os.path.join(self.outdir, 'Student_2.vcf'))
+        (statuses, counts) = self.write_all(self.cards)
+        self.assertEqual(counts, {'created': 1, 'updated': 0, 'unchanged': 4})
+        self.assertTrue(os.path.exists(
+            os.path.join(self.outdir, 'Student_2.vcf')))
+
+    def test_edited_file(self):
+        self.write_all(self.cards)
+        path = os.path.join(self.outdir, 'Student_3.vcf')
+        with open(path, 'rb') as f:
+            original = f.read()
+        with open(path, 'wb') as f:
+            f.write(original.replace(b's3@', b'student3@'))
+        (statuses, counts) = self.write_all(self.cards)
+        self.assertEqual(counts, {'created': 0, 'updated': 1, 'unchanged': 4})
+        self.assertEqual(statuses[3], 'updated')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), original)
+
+    def test_truncated_file(self):
+        self.write_all(self.cards)
+        path = os.path.join(self.outdir, 'Student_4.vcf')
+        stat = os.stat(path)
+        with open(path, 'r+b') as f:
+            f.truncate(10)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        (statuses, counts) = self.write_all(self.cards)
+        self.assertEqual(statuses[4], 'updated')
+        self.assertEqual(os.stat(path).st_size, stat.st_size)
+
+    def test_without_manifest(self):
+        self.write_all(self.cards)
+        os.remove(os.path.join(self.outdir, VcardWriter.manifest_name))
+        (statuses, counts) = self.write_all(self.cards)
+        self.assertEqual(counts, {'created': 0, 'updated': 0, 'unchanged': 5})
+
+    def test_cli_summary(self):
+        roster_path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(roster_path, make_students(10))
+        command = ['ps2vcard', '--no-print', '--save', roster_path]
+        first = run(command, cwd=self.tempdir.name, stderr=PIPE,
+                    universal_newlines=True)
+        self.assertIn('10 created, 0 updated, 0 unchanged', first.stderr)
+        second = run(command, cwd=self.tempdir.name, stderr=PIPE,
+                     universal_newlines=True)
+        self.assertIn('0 created, 0 updated, 10 unchanged', second.stderr)
+
+
+class TestVcardBundleWriter(unittest.TestCase):
+    """Test writing all the cards of a roster to one file."""
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.roster_path = os.path.join(self.tempdir.name, 'roster.html')
+        write_html_roster(self.roster_path, make_students(10), photo_size=100)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_write(self):
+        cards = [make_card('Student %d' % i, 's%d@nyu.edu' % i)
+                 for i in range(3)]
+        stream = BytesIO()
+        with VcardBundleWriter(stream) as writer:
+            for card in cards:
+                writer.write(card)
+        self.assertEqual(writer.count, 3)
+        self.assertEqual(stream.getvalue().decode(),
+                         ''.join(card.serialize() for card in cards))
+
+    def test_cli_bundle(self):
+        bundle_path = os.path.join(self.tempdir.name, 'roster.vcf')
+        check_call(['ps2vcard', '--no-print', '--save', '--bundle',
+                    bundle_path, self.roster_path], cwd=self.tempdir.name)
+        with open(bundle_path) as f:
+            bundle = f.read()
+        cards = list(vobject.readComponents(bundle))
+        self.assertEqual(len(cards), 10)
+        for card in cards:
+            with open(os.path.join(self.tempdir.name,
+                                   VcardWriter().card_file_name(card))) as f:
+                self.assertIn(f.read(), bundle)
+        result = run(['ps2vcard', '--bundle', '-', self.roster_path],
+                     stdout=PIPE, universal_newlines=True)
+        self.assertEqual(result.stdout, bundle)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import os.path
+from subprocess import check_output
+from tempfile import TemporaryDirectory
+import unittest
+
+from ps2vcard.parsers.html import AlbertRosterXlsParser
+from ps2vcard.synthetic import make_students, write_xls_roster
+
+
+class TestXlsEngines(unittest.TestCase):
+    """The iterparse engine must give the records of the BeautifulSoup one."""
+
+    def setUp(self):
+        self._dir = os.path.dirname(__file__)
+        self.data_path = os.path.join(self._dir, 'data')
+        self.tempdir = TemporaryDirectory()
+        self.xls_path = os.path.join(self.data_path, 'ps.xls')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def assertSameRecords(self, path):
+        (_, soup) = AlbertRosterXlsParser(engine='soup').parse_records(path)
+        (_, rows) = AlbertRosterXlsParser(engine='iterparse').parse_records(path)
+        self.assertEqual(rows, soup)
+        return rows
+
+    def test_fixture(self):
+        rows = self.assertSameRecords(self.xls_path)
+        self.assertEqual(len(rows), 40)
+        self.assertEqual(rows[0]['Campus ID'], 'N30244832')
+
+    def test_synthetic(self):
+        path = os.path.join(self.tempdir.name, 'ps.xls')
+        students = make_students(500)
+        students[7]['Name'] = 'O\'Brien & Sons,Zoë'
+        write_xls_roster(path, students)
+        rows = self.assertSameRecords(path)
+        self.assertEqual(len(rows), 500)
+        self.assertEqual(rows[7]['Name'], 'O\'Brien & Sons,Zoë')
+
+    def test_cell_markup(self):
+        path = os.path.join(self.tempdir.name, 'ps.xls')
+        with open(path, 'w') as f:
+            f.write('<table><tr><th>Name</th><th>Email Address</th></tr>\n'
+                    '<tr><td>Doe,<b>bold</b>Jane</td>'
+                    '<td>jd1@nyu.edu<!-- note --></td>\n'
+                    '<tr><td>Roe,Rick</td><td></td>\n</table>')
+        rows = self.assertSameRecords(path)
+        self.assertEqual(rows[0]['Name'], 'Doe,Jane')
+
+    def test_declared_encoding(self):
+        path = os.path.join(self.tempdir.name, 'ps.xls')
+        with open(path, 'w', encoding='cp1252') as f:
+            f.write('<html><head><meta charset="windows-1252"></head><body>'
+                    '<table><tr><th>Name</th><th>Email Address</th></tr>\n'
+                    '<tr><td>Brontë,Zoë</td><td>zb1@nyu.edu</td>\n</table>')
+        rows = self.assertSameRecords(path)
+        self.assertEqual(rows[0]['Name'], 'Brontë,Zoë')
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            AlbertRosterXlsParser(engine='nonesuch')
+
+    def test_cli(self):
+        outputs = [
+            check_output(['psxls2amc', '--no-cache', '--engine', engine,
+                          self.xls_path])
+            for engine in AlbertRosterXlsParser.engines
+        ]
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(len(outputs[0].splitlines()), 41)
+
+
+if __name__ == '__main__':
+    unittest.main()